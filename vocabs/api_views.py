@@ -1,16 +1,23 @@
 from rest_framework import viewsets
 from rest_framework import pagination
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework_guardian import filters
 
+from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import SkosConceptScheme, SkosCollection, SkosConcept
+from .conditional import conditional_response, object_validators, scheme_validators, set_validators
+from .models import INVERSE_RELATIONS, SkosConceptScheme, SkosCollection, SkosConcept, inferred_relations
+from .permissions import inherits_scheme_permissions, objects_for_user
 from .serializers import (
+    ConceptResolveSerializer,
     SkosCollectionSerializer,
     SkosConceptSchemeSerializer,
     SkosConceptSerializer,
 )
 from rest_framework.settings import api_settings
-from rest_framework.permissions import DjangoObjectPermissions
+from rest_framework.permissions import DjangoObjectPermissions, IsAuthenticated
 
 
 class LargeResultsSetPagination(pagination.PageNumberPagination):
@@ -19,7 +26,44 @@ class LargeResultsSetPagination(pagination.PageNumberPagination):
     max_page_size = 10000
 
 
-class SkosConceptSchemeViewSet(viewsets.ModelViewSet):
+class SchemePermissionsFilter(filters.ObjectPermissionsFilter):
+    """Filters collections and concepts by their scheme if VOCABS_SCHEME_PERMISSIONS is set"""
+
+    def filter_queryset(self, request, queryset, view):
+        if not inherits_scheme_permissions(queryset.model):
+            return super().filter_queryset(request, queryset, view)
+        return objects_for_user(request.user, f"view_{queryset.model._meta.model_name}", klass=queryset)
+
+
+class ConditionalViewSetMixin(object):
+    """
+    ETag and Last-Modified for list and detail responses from the content versions
+    of the concept schemes, unchanged responses are answered with 304 before they are serialized
+    """
+
+    def public(self, request):
+        # the browsable API holds a CSRF token, only anonymous JSON may be stored by shared caches
+        return request.user.is_anonymous and request.accepted_renderer.format == "json"
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = object_validators(instance, request.user, request.accepted_renderer.format)
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return set_validators(response, etag, last_modified, public=self.public(request))
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = scheme_validators(
+            SkosConceptScheme.objects.all(), request.user.pk, request.accepted_renderer.format, request.get_full_path()
+        )
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified, public=self.public(request))
+
+
+class SkosConceptSchemeViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     queryset = SkosConceptScheme.objects.all()
     serializer_class = SkosConceptSchemeSerializer
     permission_classes = (DjangoObjectPermissions,)
@@ -27,21 +71,69 @@ class SkosConceptSchemeViewSet(viewsets.ModelViewSet):
     pagination_class = LargeResultsSetPagination
 
 
-class SkosCollectionViewSet(viewsets.ModelViewSet):
+class SkosCollectionViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     queryset = SkosCollection.objects.all()
     serializer_class = SkosCollectionSerializer
     permission_classes = (DjangoObjectPermissions,)
-    filter_backends = (filters.ObjectPermissionsFilter,)
+    filter_backends = (SchemePermissionsFilter,)
     pagination_class = LargeResultsSetPagination
 
 
-class SkosConceptViewSet(viewsets.ModelViewSet):
+class SkosConceptViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     queryset = SkosConcept.objects.all()
     serializer_class = SkosConceptSerializer
     filter_backends = (
         DjangoFilterBackend,
-        filters.ObjectPermissionsFilter,
+        SchemePermissionsFilter,
     )
     pagination_class = LargeResultsSetPagination
     renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
     permission_classes = (DjangoObjectPermissions,)
+
+    @action(detail=False, methods=["post"], permission_classes=(IsAuthenticated,))
+    def resolve(self, request):
+        """
+        Resolves lists of `uris`, `notations` and `legacy_ids` to the ids of the
+        concepts the user can view with one query, each value maps to a list of ids
+        """
+        serializer = ConceptResolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        values = serializer.validated_data
+        queryset = self.filter_queryset(self.get_queryset())
+        if "scheme" in values:
+            queryset = queryset.filter(scheme_id=values["scheme"])
+        rows = queryset.filter(
+            Q(uri__in=values["uris"]) | Q(notation__in=values["notations"]) | Q(legacy_id__in=values["legacy_ids"])
+        ).order_by("id")
+        resolved = {key: {value: [] for value in values[key]} for key in ("uris", "notations", "legacy_ids")}
+        for pk, uri, notation, legacy_id in rows.values_list("id", "uri", "notation", "legacy_id"):
+            for key, value in (("uris", uri), ("notations", notation), ("legacy_ids", legacy_id)):
+                if value in resolved[key]:
+                    resolved[key][value].append(pk)
+        return Response(resolved)
+
+    @action(detail=True)
+    def relations(self, request, pk=None):
+        """The skos:related and *Match relations of a concept and those inferred from other concepts"""
+        concept = self.get_object()
+        stated = {}
+        for relation, target in concept.has_relations.order_by("id").values_list("relation", "target"):
+            stated.setdefault(relation, []).append(target)
+        return Response({"relations": stated, "inferred": inferred_relations(concept)})
+
+    @action(detail=False)
+    def with_relation(self, request):
+        """
+        The concepts with the `relation` (e.g. exact_match) to `target`, with
+        `inferred=1` also those `target` has the inverse relation to
+        """
+        relation = request.query_params.get("relation", "")
+        target = request.query_params.get("target", "")
+        if relation not in INVERSE_RELATIONS or not target:
+            raise ValidationError({"relation": list(INVERSE_RELATIONS), "target": "A URI"})
+        queryset = SkosConcept.objects.with_relation(
+            relation, target, inferred=request.query_params.get("inferred") in ("1", "true")
+        )
+        queryset = self.filter_queryset(queryset.order_by("id"))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class VocabsConfig(AppConfig):
     name = "vocabs"
+
+    def ready(self):
+        from .utils import compile_predicate_plans
+
+        compile_predicate_plans(self.get_models())
@@ -0,0 +1,22 @@
+from .permissions import ACTIONS, has_scheme_permission, inherits_scheme_permissions
+
+
+class SchemePermissionBackend(object):
+    """
+    Grants the view, change and delete permissions on collections and concepts
+    to the creator and the curators of their concept scheme, if
+    VOCABS_SCHEME_PERMISSIONS is set. Authentication is left to the other backends.
+    """
+
+    def authenticate(self, request, **credentials):
+        return None
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if obj is None or not inherits_scheme_permissions(type(obj)):
+            return False
+        app_label, _, codename = perm.rpartition(".")
+        if app_label and app_label != obj._meta.app_label:
+            return False
+        if codename not in [f"{action}_{obj._meta.model_name}" for action in ACTIONS]:
+            return False
+        return has_scheme_permission(user_obj, obj)
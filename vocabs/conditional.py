@@ -0,0 +1,74 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import SkosConceptScheme
+
+# seconds a shared cache like nginx may serve a public response before it revalidates it
+MAX_AGE = getattr(settings, "VOCABS_HTTP_MAX_AGE", 300)
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def scheme_validators(schemes, *parts):
+    """
+    The ETag and Last-Modified date of a response built from the concept schemes
+    of the queryset `schemes` and the extra `parts`, one query on the schemes table
+    """
+    rows = list(schemes.order_by("pk").values_list("pk", "content_version", "content_modified"))
+    etag = make_etag(*parts, *(f"{pk}-{version}" for pk, version, _ in rows))
+    return etag, max((modified for _, _, modified in rows), default=None)
+
+
+def object_validators(obj, user, *parts):
+    """
+    The ETag and Last-Modified date of a page or API response of a concept
+    scheme, collection or concept for `user`, which change with the content version of the scheme
+    """
+    concept_scheme = obj if isinstance(obj, SkosConceptScheme) else obj.scheme
+    version, modified = concept_scheme.content_version, concept_scheme.content_modified
+    if concept_scheme is not obj:
+        modified = max(modified, obj.date_modified)
+    return make_etag(obj._meta.model_name, obj.pk, version, obj.date_modified, user.pk, *parts), modified
+
+
+def conditional_response(request, etag, last_modified):
+    """A 304 (or 412) response if the client has the current version, like django.views.decorators.http.condition"""
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified, public=False):
+    """
+    Sets ETag, Last-Modified and Cache-Control on `response`. Public responses
+    may be stored by shared caches for MAX_AGE seconds, the others only by the
+    browser of the user, and both are revalidated with the validators.
+    """
+    if response.status_code not in (200, 304):
+        return response
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    if public:
+        patch_cache_control(response, public=True, max_age=MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalDetailMixin(object):
+    """Answers conditional GET requests of detail views with 304 before the template is rendered"""
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        # the query string selects variants of the page, like the full hierarchy
+        etag, last_modified = object_validators(self.object, request.user, request.GET.urlencode())
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            context = self.get_context_data(object=self.object)
+            response = self.render_to_response(context)
+        return set_validators(response, etag, last_modified)
@@ -3,10 +3,10 @@ import json
 
 from dal import autocomplete
 from .models import SkosConcept, SkosConceptScheme, SkosCollection
-from guardian.shortcuts import get_objects_for_user
 from django.contrib.auth.models import User
 from mptt.settings import DEFAULT_LEVEL_INDICATOR
 from .endpoints import ENDPOINT, DbpediaAC
+from .permissions import objects_for_user
 
 
 ################ Global autocomplete for external concepts ################
@@ -47,7 +47,7 @@ class SkosConceptAC(autocomplete.Select2QuerySetView):
         return level_indicator + " " + str(item)
 
     def get_queryset(self):
-        qs = get_objects_for_user(self.request.user, "view_skosconcept", klass=SkosConcept)
+        qs = objects_for_user(self.request.user, "view_skosconcept", klass=SkosConcept)
         scheme = self.forwarded.get("scheme", None)
         if scheme:
             qs = qs.filter(scheme=scheme)
@@ -62,7 +62,7 @@ class SkosConceptExternalMatchAC(autocomplete.Select2QuerySetView):
         return level_indicator + " " + str(item)
 
     def get_queryset(self):
-        qs = get_objects_for_user(self.request.user, "view_skosconcept", klass=SkosConcept)
+        qs = objects_for_user(self.request.user, "view_skosconcept", klass=SkosConcept)
         scheme = self.forwarded.get("scheme", None)
         if scheme:
             qs = qs.exclude(scheme=scheme)
@@ -73,7 +73,7 @@ class SkosConceptExternalMatchAC(autocomplete.Select2QuerySetView):
 
 class SkosConceptSchemeAC(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = get_objects_for_user(self.request.user, "view_skosconceptscheme", klass=SkosConceptScheme)
+        qs = objects_for_user(self.request.user, "view_skosconceptscheme", klass=SkosConceptScheme)
         if self.q:
             qs = qs.filter(title__icontains=self.q)
 
@@ -82,7 +82,7 @@ class SkosConceptSchemeAC(autocomplete.Select2QuerySetView):
 
 class SkosCollectionAC(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = get_objects_for_user(self.request.user, "view_skoscollection", klass=SkosCollection)
+        qs = objects_for_user(self.request.user, "view_skoscollection", klass=SkosCollection)
         scheme = self.forwarded.get("scheme", None)
         if scheme:
             qs = qs.filter(scheme=scheme)
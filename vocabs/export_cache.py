@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+
+from .models import SkosConcept, SkosConceptScheme
+from .rdf_utils import RDF_FORMATS, serialize_qs
+
+# unfinished files of concurrent exports are kept this many seconds
+TEMP_FILE_AGE = 24 * 60 * 60
+
+
+def cache_enabled():
+    return getattr(settings, "VOCABS_EXPORT_CACHE", True)
+
+
+def cache_dir():
+    return getattr(settings, "VOCABS_EXPORT_CACHE_DIR", os.path.join(settings.MEDIA_ROOT, "export-cache"))
+
+
+def cache_path(concept_scheme, export_format):
+    """The file of the export of `concept_scheme` in `export_format` at its current content version"""
+    extension = RDF_FORMATS[export_format].lstrip(".")
+    file_name = f"{concept_scheme.content_version}-{export_format}.{extension}"
+    return os.path.join(cache_dir(), str(concept_scheme.pk), file_name)
+
+
+def cached_chunks(concept_scheme, export_format, progress=None):
+    """
+    Yields the serialized export of `concept_scheme` and stores it in the cache
+    while it is sent, the file is only moved into place once it is complete
+    """
+    path = cache_path(concept_scheme, export_format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    concepts = SkosConcept.objects.filter(scheme=concept_scheme)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path), prefix=".", delete=False) as f:
+        try:
+            for chunk in serialize_qs(concepts, export_format, progress=progress, fragments=True):
+                f.write(chunk)
+                yield chunk
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, path)
+    evict_stale(concept_scheme)
+
+
+def cached_export(concept_scheme, export_format, progress=None):
+    """Returns the path of the cached export of `concept_scheme`, exporting it first on a cache miss"""
+    path = cache_path(concept_scheme, export_format)
+    if not os.path.exists(path):
+        for _ in cached_chunks(concept_scheme, export_format, progress=progress):
+            pass
+    return path
+
+
+def evict_stale(concept_scheme):
+    """
+    Deletes the exports of `concept_scheme` at other content versions and
+    temporary files older than TEMP_FILE_AGE, returns the number of deleted files
+    """
+    directory = os.path.join(cache_dir(), str(concept_scheme.pk))
+    if not os.path.isdir(directory):
+        return 0
+    # the instance may be older than an export of a newer version, e.g. after a long export
+    content_version = (
+        SkosConceptScheme.objects.filter(pk=concept_scheme.pk).values_list("content_version", flat=True).first()
+    )
+    deleted = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith("."):
+            stale = time.time() - os.path.getmtime(path) > TEMP_FILE_AGE
+        else:
+            stale = content_version is None or not name.startswith(f"{content_version}-")
+        if stale:
+            os.remove(path)
+            deleted += 1
+    return deleted
+
+
+def prune_cache():
+    """Evicts the stale exports of all concept schemes and the exports of deleted ones"""
+    if not os.path.isdir(cache_dir()):
+        return 0
+    schemes = SkosConceptScheme.objects.only("pk").in_bulk()
+    deleted = 0
+    for name in os.listdir(cache_dir()):
+        concept_scheme = schemes.get(int(name)) if name.isdigit() else None
+        if concept_scheme is None:
+            directory = os.path.join(cache_dir(), name)
+            deleted += len(os.listdir(directory))
+            shutil.rmtree(directory)
+        else:
+            deleted += evict_stale(concept_scheme)
+    return deleted
@@ -6,6 +6,7 @@ from crispy_forms.layout import HTML, ButtonHolder, Div, Fieldset, Layout, Submi
 from dal import autocomplete
 from django import forms
 from django.forms.models import inlineformset_factory
+from guardian.shortcuts import get_objects_for_user
 from mptt.forms import TreeNodeChoiceField
 
 from .custom_layout_object import Formset
@@ -44,9 +45,21 @@ class UploadFileForm(forms.Form):
         help_text="Specify the main language of your vocabulary (in format ISO 639-1 or ISO 639-3)",
         widget=forms.TextInput(attrs={"placeholder": "e.g. en"}),
     )
+    concept_scheme = forms.ModelChoiceField(
+        queryset=SkosConceptScheme.objects.none(),
+        required=False,
+        label="Update concept scheme",
+        help_text="Update this concept scheme with the file instead of creating a new one, "
+        "only concepts which were added, changed or removed are written",
+    )
 
     def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user", None)
         super(UploadFileForm, self).__init__(*args, **kwargs)
+        if user is not None:
+            self.fields["concept_scheme"].queryset = get_objects_for_user(
+                user, "change_skosconceptscheme", klass=SkosConceptScheme
+            )
         self.helper = FormHelper()
         self.helper.form_tag = True
         self.helper.form_class = "form-horizontal"
@@ -0,0 +1,94 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .models import SkosConcept
+
+# seconds a rendered hierarchy is cached, those of former tree versions are not read again and expire
+TREE_CACHE_TIMEOUT = getattr(settings, "VOCABS_TREE_CACHE_TIMEOUT", 24 * 60 * 60)
+
+NODE_FIELDS = ("id", "pref_label", "needs_review", "broader_concept_id", "lft", "rght", "tree_id", "level")
+
+
+def children_condition(parent):
+    """The narrower concepts of `parent`, a dict or concept with the MPTT fields, as a range on its tree"""
+    if isinstance(parent, SkosConcept):
+        parent = {field: getattr(parent, field) for field in ("tree_id", "lft", "rght", "level")}
+    return Q(
+        tree_id=parent["tree_id"],
+        lft__gt=parent["lft"],
+        rght__lt=parent["rght"],
+        level=parent["level"] + 1,
+    )
+
+
+def tree_node(row):
+    return {
+        "id": row["id"],
+        "pref_label": row["pref_label"],
+        "needs_review": bool(row["needs_review"]),
+        "url": reverse("vocabs:skosconcept_detail", kwargs={"pk": row["id"]}),
+        # in a nested set a node without children has rght == lft + 1
+        "has_children": row["rght"] - row["lft"] > 1,
+    }
+
+
+def child_nodes(scheme_id, parent=None):
+    """The top concepts of a scheme, or the narrower concepts of `parent`, in tree order"""
+    condition = Q(broader_concept__isnull=True) if parent is None else children_condition(parent)
+    rows = SkosConcept.objects.filter(condition, scheme_id=scheme_id).order_by("tree_id", "lft").values(*NODE_FIELDS)
+    return [tree_node(row) for row in rows]
+
+
+def nest(rows, expanded=None):
+    """
+    The tree nodes of `rows`, in tree order, below their broader concepts.
+    Nodes with an id in `expanded`, or all if it is None, have their children in "children".
+    """
+    children = defaultdict(list)
+    for row in rows:
+        children[row["broader_concept_id"]].append(tree_node(row))
+    for nodes in children.values():
+        for node in nodes:
+            if expanded is None or node["id"] in expanded:
+                node["children"] = children.get(node["id"], [])
+    return children.get(None, [])
+
+
+def sidebar_nodes(scheme_id, current=None):
+    """
+    The top concepts of a scheme and, if `current` is given, the levels on the
+    path down to it and its narrower concepts, read in one query. Nodes on the
+    path have their children in "children", the others are expanded on demand.
+    """
+    path = list(current.get_ancestors(include_self=True).values(*NODE_FIELDS)) if current is not None else []
+    condition = reduce(or_, (children_condition(row) for row in path), Q(broader_concept__isnull=True))
+    rows = SkosConcept.objects.filter(condition, scheme_id=scheme_id).order_by("tree_id", "lft").values(*NODE_FIELDS)
+    return nest(rows, expanded={row["id"] for row in path})
+
+
+def tree_html(concept_scheme):
+    """
+    The rendered hierarchy of all concepts of `concept_scheme`, shared by all
+    readers and cached until the tree version of the scheme changes
+    """
+    key = f"vocabs-tree:{concept_scheme.pk}:{concept_scheme.tree_version}"
+    html = cache.get(key)
+    if html is None:
+        rows = SkosConcept.objects.filter(scheme_id=concept_scheme.pk).order_by("tree_id", "lft").values(*NODE_FIELDS)
+        html = render_to_string("vocabs/concept_tree.html", {"nodes": nest(rows), "scheme_id": concept_scheme.pk})
+        cache.set(key, html, TREE_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+
+def highlight(html, concept_id):
+    """Marks the concept `concept_id` in a rendered hierarchy, a copy so the cached one stays the same for everyone"""
+    marker = f'data-concept="{concept_id}"'
+    return mark_safe(html.replace(marker, f'{marker} class="fw-bold" aria-current="page"', 1))
@@ -1,16 +1,21 @@
+import json
+
+from django.conf import settings
 from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.views.generic.list import ListView
 from django_celery_results.models import TaskResult
 
 from vocabs.forms import UploadFileForm
-from vocabs.tasks import export_concept_schema, import_concept_schema
+from vocabs.rdf_utils import DEFAULT_EXPORT_FORMAT
+from vocabs.tasks import analyse_concept_schema, export_concept_schema
 from vocabs.utils import handle_uploaded_file
 
 
 def export_async(request):
-    get_format = request.GET.get("format", default="pretty-xml")
+    get_format = request.GET.get("format", default=DEFAULT_EXPORT_FORMAT)
     schema_id = request.GET.get("schema-id")
     export_concept_schema.delay(schema_id, get_format)
     return redirect("vocabs:job-status")
@@ -19,25 +24,35 @@ def export_async(request):
 @login_required
 def import_async(request):
     if request.method == "POST":
-        form = UploadFileForm(request.POST, request.FILES)
+        form = UploadFileForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             file = request.FILES["file"]
             file_format = file.name.split(".")[-1]
-            if file_format in ["ttl", "rdf"]:
+            if file_format in ["ttl", "rdf", "nt"]:
                 file_format = file.name.split(".")[-1]
                 full_path = handle_uploaded_file(file)
-                import_concept_schema.delay(
-                    full_path,
-                    request.user.username,
-                    file_format=file_format,
-                    language=form.cleaned_data["language"],
+                concept_scheme = form.cleaned_data["concept_scheme"]
+                # the import is started by the pre-flight task if the file can be imported
+                analyse_concept_schema.apply_async(
+                    args=[full_path, request.user.username],
+                    kwargs={
+                        "file_format": file_format,
+                        "language": form.cleaned_data["language"],
+                        # N-Triples dumps are streamed instead of being loaded into a graph
+                        "streaming": file_format == "nt",
+                        # and parsed in parallel if VOCABS_IMPORT_WORKERS is set
+                        "workers": getattr(settings, "VOCABS_IMPORT_WORKERS", None) if file_format == "nt" else None,
+                        "concept_scheme_id": concept_scheme.id if concept_scheme else None,
+                    },
+                    # RDF/XML is analysed in memory, away from the default queue if VOCABS_IMPORT_GRAPH_QUEUE is set
+                    queue=getattr(settings, "VOCABS_IMPORT_GRAPH_QUEUE", None) if file_format == "rdf" else None,
                 )
                 messages.info(request, f"Started Import of {file.name}")
             else:
-                messages.error(request, "Upload rdf or ttl file")
+                messages.error(request, "Upload rdf, ttl or nt file")
             return redirect("vocabs:job-status")
     else:
-        form = UploadFileForm()
+        form = UploadFileForm(user=request.user)
     return render(request, "vocabs/upload.html", {"form": form})
 
 
@@ -45,3 +60,28 @@ class TaskResultListView(ListView):
     model = TaskResult
     paginate_by = 100
     template_name = "vocabs/taskresult_list.j2"
+
+
+def task_progress(request, task_id):
+    """
+    Returns the state of a task as JSON, with the phase, done, total, rate and
+    eta of tasks which are in progress. Reads a single TaskResult row.
+    """
+    task = (
+        TaskResult.objects.filter(task_id=task_id)
+        .values("task_id", "task_name", "status", "result", "date_done")
+        .first()
+    )
+    if task is None:
+        return JsonResponse({"task_id": task_id, "status": "PENDING", "progress": None})
+    result = json.loads(task["result"]) if task["result"] else None
+    return JsonResponse(
+        {
+            "task_id": task["task_id"],
+            "task_name": task["task_name"],
+            "status": task["status"],
+            "progress": result if task["status"] == "PROGRESS" else None,
+            "result": result if task["status"] == "SUCCESS" else None,
+            "date_done": task["date_done"],
+        }
+    )
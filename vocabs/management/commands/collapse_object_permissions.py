@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from vocabs.models import SkosConceptScheme
+from vocabs.permissions import collapse_scheme_permissions
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the object permissions of scheme creators and curators on collections and concepts, "
+        "which are derived from the concept scheme with VOCABS_SCHEME_PERMISSIONS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scheme-id", type=int, help="Only collapse the permissions of this SKOSConceptScheme")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only print the number of rows that would be deleted",
+        )
+
+    def handle(self, *args, **kwargs):
+        """E.g. command: python manage.py collapse_object_permissions --dry-run"""
+        if not kwargs["dry_run"] and not getattr(settings, "VOCABS_SCHEME_PERMISSIONS", False):
+            raise CommandError("Set VOCABS_SCHEME_PERMISSIONS first, otherwise the collapsed permissions are lost")
+        schemes = SkosConceptScheme.objects.all()
+        if kwargs["scheme_id"]:
+            schemes = schemes.filter(id=kwargs["scheme_id"])
+        total = 0
+        for scheme in schemes.select_related("created_by"):
+            count = collapse_scheme_permissions(scheme, dry_run=kwargs["dry_run"])
+            self.stdout.write(f"{count} object permissions for SkosConceptScheme >>{scheme}<< with ID: {scheme.id}")
+            total += count
+        verb = "Would delete" if kwargs["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} object permissions"))
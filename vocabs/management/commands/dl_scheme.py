@@ -1,5 +1,8 @@
+import shutil
+
 from django.core.management.base import BaseCommand
-from vocabs.rdf_utils import graph_construct_qs
+from vocabs.export_cache import cache_enabled, cached_export
+from vocabs.rdf_utils import export_qs
 from vocabs.models import SkosConcept, SkosConceptScheme
 
 
@@ -36,8 +39,12 @@ class Command(BaseCommand):
         self.stdout.write(f"start writin to {file_name}")
         if export_format == "rdf":
             export_format = "xml"
-        g = graph_construct_qs(qs)
-        g.serialize(file_name, format=export_format)
+        elif export_format == "ttl":
+            export_format = "turtle"
+        if cache_enabled():
+            shutil.copyfile(cached_export(scheme, export_format), file_name)
+        else:
+            export_qs(qs, export_format, file_name)
         self.stdout.write(
             self.style.SUCCESS(
                 f"Successfully exported SkosConceptScheme >>{scheme}<< with ID: {scheme.id} to {file_name}"
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from vocabs.models import SkosConceptScheme
 from vocabs.skos_import import SkosImporter
 
 
@@ -6,21 +7,68 @@ class Command(BaseCommand):
     help = "Imports  the specified SKOS file to database"
 
     def add_arguments(self, parser):
-        parser.add_argument("file", type=str, help="The file name to import")
+        parser.add_argument("file", type=str, nargs="+", help="The file name(s) to import")
         parser.add_argument("lang", type=str, help="The main language of a vocabulary to be imported")
         parser.add_argument(
             "format",
             type=str,
-            help="The format of SKOS file: accepts only one of the two options - rdf or ttl",
+            help="The format of SKOS file: accepts one of the options - rdf, ttl or nt",
         )
         parser.add_argument("user", type=str, help="Username")
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Import subject sorted nt or ttl files without loading them into a graph",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Parse the files, and subject sorted nt files in chunks, in this many processes",
+        )
+        parser.add_argument(
+            "--update",
+            type=int,
+            metavar="SCHEME_ID",
+            help="Update the concept scheme with this id, writing only inserted, changed and removed concepts",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only parse the files and print statistics of what would be imported",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="Save the progress under this name, running the command again with it resumes the import",
+        )
 
     def handle(self, *args, **kwargs):
         """E.g. command: python manage.py import_skos_vocab test.ttl en ttl username"""
-        file = kwargs["file"]
+        file = kwargs["file"][0] if len(kwargs["file"]) == 1 else kwargs["file"]
         lang = kwargs["lang"]
         _format = kwargs["format"]
         user = kwargs["user"]
+        # only the parallel import reads several files, without --workers it runs in one process
+        workers = kwargs["workers"] or (1 if isinstance(file, list) else None)
         skos_vocab = SkosImporter(file=file, language=lang, file_format=_format)
-        skos_vocab.upload_data(user=user)
+        if kwargs["dry_run"]:
+            report = skos_vocab.analyse(streaming=kwargs["stream"], workers=workers)
+            for key, value in report.items():
+                self.stdout.write(f"{key}: {value}")
+            return
+        if kwargs["update"]:
+            concept_scheme = SkosConceptScheme.objects.get(id=kwargs["update"])
+            summary = skos_vocab.update_data(
+                user=user, concept_scheme=concept_scheme, streaming=kwargs["stream"], workers=workers
+            )
+            for key, value in summary.items():
+                self.stdout.write(f"{key}: {value}")
+        elif workers:
+            skos_vocab.parallel_data(user=user, workers=workers, task_id=kwargs["checkpoint"])
+        elif kwargs["stream"]:
+            skos_vocab.stream_data(user=user, task_id=kwargs["checkpoint"])
+        else:
+            skos_vocab.upload_data(user=user, task_id=kwargs["checkpoint"])
+        for legacy_id, broader in skos_vocab.unresolved_broader:
+            self.stdout.write(self.style.WARNING(f"Broader concept {broader} of {legacy_id} not found"))
         self.stdout.write(self.style.SUCCESS("Successfully imported SKOS vocabulary"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from vocabs.export_cache import prune_cache
+
+
+class Command(BaseCommand):
+    help = "Deletes cached exports of outdated content versions and of deleted SKOSConceptSchemes"
+
+    def handle(self, *args, **kwargs):
+        """E.g. command: python manage.py prune_export_cache"""
+        deleted = prune_cache()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached exports"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from vocabs.models import SkosConcept, SkosConceptScheme
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored URIs of SKOSConcepts, e.g. after VOCABS_SEPARATOR or notation_for_uri changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scheme-id", type=int, help="Only the concepts of this SKOSConceptScheme")
+
+    def handle(self, *args, **kwargs):
+        """E.g. command: python manage.py update_concept_uris --scheme-id 5"""
+        schemes = SkosConceptScheme.objects.all()
+        if kwargs["scheme_id"] is not None:
+            schemes = schemes.filter(pk=kwargs["scheme_id"])
+        changed = sum(SkosConcept.objects.update_uris(concept_scheme) for concept_scheme in schemes)
+        self.stdout.write(self.style.SUCCESS(f"Updated the URIs of {changed} concepts"))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0006_remove_skosconceptscheme_custom_prop_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID"),
+                ),
+                ("task_id", models.CharField(max_length=255, unique=True, verbose_name="Task id")),
+                (
+                    "position",
+                    models.PositiveIntegerField(default=0, help_text="Number of subjects written so far"),
+                ),
+                ("last_subject", models.TextField(blank=True, help_text="Last subject written")),
+                (
+                    "state",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Records and relations waiting for subjects after the checkpoint",
+                    ),
+                ),
+                ("date_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "concept_scheme",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_checkpoints",
+                        to="vocabs.skosconceptscheme",
+                    ),
+                ),
+            ],
+        ),
+    ]
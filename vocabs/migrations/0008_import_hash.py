@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0007_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="skoscollection",
+            name="import_hash",
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="skosconcept",
+            name="import_hash",
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0009_skosconceptscheme_content_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportFragment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID"),
+                ),
+                ("ntriples", models.TextField(blank=True)),
+                (
+                    "collection",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="export_fragment",
+                        to="vocabs.skoscollection",
+                    ),
+                ),
+                (
+                    "concept",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="export_fragment",
+                        to="vocabs.skosconcept",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0010_exportfragment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="skosconceptscheme",
+            name="content_modified",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
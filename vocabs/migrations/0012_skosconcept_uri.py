@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+import vocabs.models
+
+
+def fill_uris(apps, schema_editor):
+    SkosConcept = apps.get_model("vocabs", "SkosConcept")
+    rows = SkosConcept.objects.values_list("id", "legacy_id", "notation", "scheme__identifier")
+    concepts = [
+        SkosConcept(id=pk, uri=vocabs.models.concept_uri(identifier, legacy_id, pk, notation))
+        for pk, legacy_id, notation, identifier in rows.iterator(chunk_size=1000)
+    ]
+    SkosConcept.objects.bulk_update(concepts, ["uri"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0011_skosconceptscheme_content_modified"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="skosconcept",
+            name="uri",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=600),
+        ),
+        migrations.AddIndex(
+            model_name="skosconcept",
+            index=models.Index(fields=["notation"], name="vocabs_concept_notation_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="skosconcept",
+            index=models.Index(fields=["legacy_id"], name="vocabs_concept_legacy_id_idx"),
+        ),
+        migrations.RunPython(fill_uris, migrations.RunPython.noop),
+    ]
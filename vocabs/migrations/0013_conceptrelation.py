@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import vocabs.models
+
+
+def fill_relations(apps, schema_editor):
+    SkosConcept = apps.get_model("vocabs", "SkosConcept")
+    ConceptRelation = apps.get_model("vocabs", "ConceptRelation")
+    rows = SkosConcept.objects.values_list("id", *vocabs.models.RELATION_FIELDS)
+    relations = [
+        ConceptRelation(concept_id=pk, relation=relation, target=target)
+        for pk, *values in rows.iterator(chunk_size=1000)
+        for relation, value in zip(vocabs.models.RELATION_FIELDS, values)
+        for target in vocabs.models.relation_targets(value)
+    ]
+    ConceptRelation.objects.bulk_create(relations, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0012_skosconcept_uri"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConceptRelation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID"),
+                ),
+                (
+                    "relation",
+                    models.CharField(
+                        choices=[
+                            ("related", "related"),
+                            ("broad_match", "broadMatch"),
+                            ("narrow_match", "narrowMatch"),
+                            ("exact_match", "exactMatch"),
+                            ("related_match", "relatedMatch"),
+                            ("close_match", "closeMatch"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("target", models.TextField()),
+                (
+                    "concept",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="has_relations",
+                        to="vocabs.skosconcept",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["target", "relation"], name="vocabs_relation_target_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("concept", "relation", "target"), name="vocabs_unique_concept_relation"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_relations, migrations.RunPython.noop),
+    ]
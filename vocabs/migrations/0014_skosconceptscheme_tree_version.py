@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+import vocabs.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0013_conceptrelation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="skosconceptscheme",
+            name="tree_version",
+            field=models.CharField(default=vocabs.models.new_content_version, editable=False, max_length=32),
+        ),
+    ]
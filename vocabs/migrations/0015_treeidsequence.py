@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+def fill_sequence(apps, schema_editor):
+    SkosConcept = apps.get_model("vocabs", "SkosConcept")
+    TreeIdSequence = apps.get_model("vocabs", "TreeIdSequence")
+    highest = SkosConcept.objects.aggregate(models.Max("tree_id"))["tree_id__max"] or 0
+    TreeIdSequence.objects.create(pk=1, last_tree_id=highest)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0014_skosconceptscheme_tree_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TreeIdSequence",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("last_tree_id", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0015_treeidsequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="owner",
+            field=models.CharField(blank=True, help_text="Import run holding the checkpoint", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vocabs", "0016_importcheckpoint_owner_heartbeat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportPendingLink",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("broader", "Broader concept"), ("member", "Collection member")], max_length=10
+                    ),
+                ),
+                (
+                    "source",
+                    models.TextField(help_text="legacy_id of the concept (broader) or of the collection (member)"),
+                ),
+                ("target", models.TextField(help_text="URI of the broader concept or of the member")),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_links",
+                        to="vocabs.importcheckpoint",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["checkpoint", "kind"], name="vocabs_impo_checkpo_fe3344_idx")],
+            },
+        ),
+    ]
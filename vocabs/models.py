@@ -1,16 +1,27 @@
+import uuid
+from collections import defaultdict
+from itertools import islice
+
 import reversion
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import m2m_changed, post_save
-from django.dispatch import receiver
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
-from guardian.shortcuts import assign_perm, remove_perm
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
+from mptt.querysets import TreeQuerySet
 from rdflib import DC, DCTERMS, OWL, RDF, RDFS, SKOS, XSD, Graph, Literal, URIRef
 
+from .permissions import (
+    grant_object_permissions,
+    inherits_scheme_permissions,
+    revoke_permissions,
+    update_scheme_permissions,
+)
 from .utils import modelprops_to_graph
 
 
@@ -19,6 +30,34 @@ def set_extra(self, **kwargs):
     return self
 
 
+# sent after an instance is deleted with delete(). Unlike post_delete it is not sent
+# for the rows of cascades and queryset deletes, which keeps Django's fast delete for those,
+# the receivers invalidate what the cascade takes along and queryset deletes send queryset_deleted.
+instance_deleted = Signal()
+
+
+class InstanceDeletedMixin(object):
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        instance_deleted.send(sender=type(self), instance=self)
+        return result
+
+
+# sent with a queryset before its rows are deleted with QuerySet.delete(), e.g. by the "delete selected" admin action,
+# in the transaction of the delete, so receivers can invalidate versions and export fragments once for all rows.
+queryset_deleted = Signal()
+
+
+class ContentQuerySet(models.QuerySet):
+    def delete(self):
+        with transaction.atomic():
+            queryset_deleted.send(sender=self.model, queryset=self)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 models.Field.set_extra = set_extra
 
 
@@ -79,6 +118,10 @@ NOTE_TYPES = (
     ("example", "example"),
 )
 
+# the predicates of label and note types, unknown label types are exported as altLabel, unknown note types as note
+LABEL_PREDICATES = {label_type: SKOS[label_type] for label_type, _ in LABEL_TYPES}
+NOTE_PREDICATES = {note_type: SKOS[note_type] for note_type, _ in NOTE_TYPES}
+
 
 SKOS_RELATION_TYPES = [
     ("related", "related"),
@@ -88,9 +131,19 @@ SKOS_RELATION_TYPES = [
     ("relatedMatch", "related_match"),
     ("closeMatch", "close_match"),
 ]
-
-
-class CustomProperty(models.Model):
+RELATION_FIELDS = [rel_type[1] for rel_type in SKOS_RELATION_TYPES]
+# the relation that holds in the other direction, broad_match and narrow_match are inverse, the others symmetric
+INVERSE_RELATIONS = {
+    "related": "related",
+    "broad_match": "narrow_match",
+    "narrow_match": "broad_match",
+    "exact_match": "exact_match",
+    "related_match": "related_match",
+    "close_match": "close_match",
+}
+
+
+class CustomProperty(InstanceDeletedMixin, models.Model):
     prop_uri = models.CharField(
         max_length=300,
         verbose_name="Property",
@@ -116,6 +169,8 @@ class CustomProperty(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = ContentQuerySet.as_manager()
+
     class Meta:
         ordering = ["id"]
         verbose_name = "Custom property"
@@ -143,8 +198,12 @@ class CustomProperty(models.Model):
 ######################################################################
 
 
+def new_content_version():
+    return uuid.uuid4().hex
+
+
 @reversion.register()
-class SkosConceptScheme(models.Model):
+class SkosConceptScheme(InstanceDeletedMixin, models.Model):
     """
     A SKOS concept scheme can be viewed as an aggregation of one or more SKOS concepts.
     Semantic relationships (links) between those concepts
@@ -246,6 +305,14 @@ class SkosConceptScheme(models.Model):
         blank=True,
         help_text="The selected user(s) will be able to view and edit this Concept Scheme",
     )
+    # changes whenever the exported triples of the scheme change, keys the cached exports
+    content_version = models.CharField(max_length=32, default=new_content_version, editable=False)
+    # when the content version last changed, the Last-Modified date of the scheme and everything in it
+    content_modified = models.DateTimeField(default=timezone.now, editable=False)
+    # changes when concepts are added, moved, deleted or relabelled, keys the cached hierarchy
+    tree_version = models.CharField(max_length=32, default=new_content_version, editable=False)
+
+    objects = ContentQuerySet.as_manager()
 
     class Meta:
         ordering = ["id"]
@@ -266,8 +333,12 @@ class SkosConceptScheme(models.Model):
         else:
             return URIRef(self.identifier)
 
-    def as_graph(self):
-        g = Graph()
+    def as_graph(self, g=None):
+        """
+        Adds the triples of the concept scheme to `g`, a Graph or any object with
+        an add() method, and returns it. Without `g` they are added to a new Graph.
+        """
+        g = Graph() if g is None else g
         subj = self.get_subject()
         g.add((subj, RDF.type, SKOS.ConceptScheme))
         if self.title:
@@ -279,7 +350,7 @@ class SkosConceptScheme(models.Model):
             g.add((subj, predicate, object))
         for relation_name in ["has_titles", "has_descriptions", "has_sources"]:
             for x in getattr(self, relation_name).all():
-                g = g + x.as_graph()
+                x.as_graph(g)
         return modelprops_to_graph(self, subj, g)
 
     @classmethod
@@ -314,7 +385,7 @@ class SkosConceptScheme(models.Model):
 ######################################################################
 
 
-class ConceptSchemeTitle(models.Model):
+class ConceptSchemeTitle(InstanceDeletedMixin, models.Model):
     """
     A Class for ConceptScheme titles in other languages.
 
@@ -338,11 +409,13 @@ class ConceptSchemeTitle(models.Model):
         help_text="Language of title given above",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return "{}".format(self.name)
 
-    def as_graph(self):
-        g = Graph()
+    def as_graph(self, g=None):
+        g = Graph() if g is None else g
         subj = self.concept_scheme.get_subject()
         obj = Literal(self.name, lang=self.language)
         g.add((subj, DC.title, obj))
@@ -350,7 +423,7 @@ class ConceptSchemeTitle(models.Model):
         return g
 
 
-class ConceptSchemeDescription(models.Model):
+class ConceptSchemeDescription(InstanceDeletedMixin, models.Model):
     """
     A Class for ConceptScheme descriptions in other languages.
 
@@ -370,8 +443,10 @@ class ConceptSchemeDescription(models.Model):
         help_text="Language of description given above",
     )
 
-    def as_graph(self):
-        g = Graph()
+    objects = ContentQuerySet.as_manager()
+
+    def as_graph(self, g=None):
+        g = Graph() if g is None else g
         subj = self.concept_scheme.get_subject()
         obj = Literal(self.name, lang=self.language)
         g.add((subj, DC.description, obj))
@@ -381,7 +456,7 @@ class ConceptSchemeDescription(models.Model):
         return self.name
 
 
-class ConceptSchemeSource(models.Model):
+class ConceptSchemeSource(InstanceDeletedMixin, models.Model):
     """
     A Class for ConceptScheme source information.
 
@@ -404,8 +479,10 @@ class ConceptSchemeSource(models.Model):
         help_text="Language of source given above",
     )
 
-    def as_graph(self):
-        g = Graph()
+    objects = ContentQuerySet.as_manager()
+
+    def as_graph(self, g=None):
+        g = Graph() if g is None else g
         subj = self.concept_scheme.get_subject()
         obj = Literal(self.name, lang=self.language)
         g.add((subj, DC.source, obj))
@@ -423,7 +500,7 @@ class ConceptSchemeSource(models.Model):
 
 
 @reversion.register()
-class SkosCollection(models.Model):
+class SkosCollection(InstanceDeletedMixin, models.Model):
     """
     SKOS collections are labeled and/or ordered groups of SKOS concepts.
     Collections are useful where a group of concepts shares something in common,
@@ -468,6 +545,8 @@ class SkosCollection(models.Model):
         "If more than one list all using a semicolon ;",
     ).set_extra(predicate=DC.contributor, lang="label_lang", splitter=";")
     legacy_id = models.CharField(max_length=200, blank=True)
+    # hash of the imported record, an update import only rewrites collections whose hash changed
+    import_hash = models.CharField(max_length=40, blank=True, editable=False)
     # meta autosaved fields
     date_created = models.DateTimeField(editable=False, default=timezone.now).set_extra(
         predicate=DCTERMS.created, datatype=XSD.dateTime
@@ -483,6 +562,8 @@ class SkosCollection(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    objects = ContentQuerySet.as_manager()
+
     class Meta:
         ordering = ["id"]
         verbose_name = "Collection"
@@ -544,16 +625,17 @@ class SkosCollection(models.Model):
     def get_subject(self):
         return URIRef(self.create_uri())
 
-    def as_graph(self):
-        g = Graph()
+    def as_graph(self, g=None):
+        """Adds the triples of the collection to `g`, see SkosConceptScheme.as_graph()"""
+        g = Graph() if g is None else g
         subj = self.get_subject()
         g.add((subj, RDF.type, SKOS.Collection))
         if self.name:
             g.add((subj, SKOS.prefLabel, Literal(self.name, lang=self.label_lang)))
         for x in self.has_labels.all():
-            g = g + x.as_graph()
+            x.as_graph(g)
         for x in self.has_notes.all():
-            g = g + x.as_graph()
+            x.as_graph(g)
         for source in self.has_sources.all():
             g.add(
                 (
@@ -570,7 +652,7 @@ class SkosCollection(models.Model):
 ######################################################################
 
 
-class CollectionLabel(models.Model):
+class CollectionLabel(InstanceDeletedMixin, models.Model):
     """
     A Class for Collection labels/names in other languages.
 
@@ -601,24 +683,19 @@ class CollectionLabel(models.Model):
         help_text="Choose label type",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
-    def as_graph(self):
+    def as_graph(self, g=None):
         subj = self.collection.get_subject()
-        g = Graph()
-        if self.label_type == "prefLabel":
-            g.add((subj, SKOS.prefLabel, Literal(self.name, lang=self.language)))
-        elif self.label_type == "altLabel":
-            g.add((subj, SKOS.altLabel, Literal(self.name, lang=self.language)))
-        elif self.label_type == "hiddenLabel":
-            g.add((subj, SKOS.hiddenLabel, Literal(self.name, lang=self.language)))
-        else:
-            g.add((subj, SKOS.altLabel, Literal(self.name, lang=self.language)))
+        g = Graph() if g is None else g
+        g.add((subj, LABEL_PREDICATES.get(self.label_type, SKOS.altLabel), Literal(self.name, lang=self.language)))
         return g
 
 
-class CollectionNote(models.Model):
+class CollectionNote(InstanceDeletedMixin, models.Model):
     """
     A Class for SKOS documentary notes that are used
     for general documentation pusposes.
@@ -645,32 +722,19 @@ class CollectionNote(models.Model):
         help_text="Choose note type",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
-    def as_graph(self):
+    def as_graph(self, g=None):
         collection = self.collection.get_subject()
-        g = Graph()
-        if self.note_type == "note":
-            g.add((collection, SKOS.note, Literal(self.name, lang=self.language)))
-        elif self.note_type == "scopeNote":
-            g.add((collection, SKOS.scopeNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "changeNote":
-            g.add((collection, SKOS.changeNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "editorialNote":
-            g.add((collection, SKOS.editorialNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "historyNote":
-            g.add((collection, SKOS.historyNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "definition":
-            g.add((collection, SKOS.definition, Literal(self.name, lang=self.language)))
-        elif self.note_type == "example":
-            g.add((collection, SKOS.example, Literal(self.name, lang=self.language)))
-        else:
-            g.add((collection, SKOS.note, Literal(self.name, lang=self.language)))
+        g = Graph() if g is None else g
+        g.add((collection, NOTE_PREDICATES.get(self.note_type, SKOS.note), Literal(self.name, lang=self.language)))
         return g
 
 
-class CollectionSource(models.Model):
+class CollectionSource(InstanceDeletedMixin, models.Model):
     """
     A Class for Collection source information.
 
@@ -693,6 +757,8 @@ class CollectionSource(models.Model):
         help_text="Language of source given above",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return "{}".format(self.name)
 
@@ -704,8 +770,134 @@ class CollectionSource(models.Model):
 ######################################################################
 
 
+def concept_uri(identifier, legacy_id, pk, notation=""):
+    """The URI of a concept from the identifier of its scheme and its own fields, see SkosConcept.create_uri()"""
+    mcs = identifier
+    if mcs.endswith(VOCABS_SEPARATOR):
+        pass
+    else:
+        mcs = f"{mcs}{VOCABS_SEPARATOR}"
+    if legacy_id:
+        item_uri = f"{legacy_id}"
+    else:
+        if notation_for_uri:
+            tmp = slugify(notation, allow_unicode=False)
+            item_uri = f"{mcs}concept__{tmp}__{pk}"
+        else:
+            item_uri = f"{mcs}concept{pk}"
+    return item_uri
+
+
+class SkosConceptQuerySet(ContentQuerySet, TreeQuerySet):
+    pass
+
+
+class SkosConceptManager(TreeManager.from_queryset(SkosConceptQuerySet)):
+    def rebuild_scheme(self, scheme, batch_size=1000):
+        """
+        Rebuilds the trees of the concepts of `scheme` only. The tree fields are
+        computed in memory from the broader_concept links and only changed rows
+        are written back. The trees keep the tree ids they already have in the
+        scheme, additional trees get new ids from `allocate_tree_ids`.
+        Hierarchies are expected not to cross concept scheme boundaries.
+        """
+        rows = (
+            self.filter(scheme=scheme)
+            .order_by("pref_label", "id")
+            .values_list("id", "broader_concept_id", "lft", "rght", "tree_id", "level")
+        )
+        parents = {}
+        current = {}
+        children = defaultdict(list)
+        for pk, parent_id, *tree_fields in rows:
+            parents[pk] = parent_id
+            current[pk] = tuple(tree_fields)
+            children[parent_id].append(pk)
+        roots = [pk for pk, parent_id in parents.items() if parent_id not in parents]
+        scheme_tree_ids = sorted({tree_fields[2] for tree_fields in current.values() if tree_fields[2]})
+        missing = len(roots) - len(scheme_tree_ids)
+        if missing > 0:
+            first = self.allocate_tree_ids(missing)
+            scheme_tree_ids.extend(range(first, first + missing))
+        changed = []
+        for root, tree_id in zip(roots, scheme_tree_ids):
+            right = 1
+            left = {root: right}
+            stack = [(root, 0, iter(children[root]))]
+            while stack:
+                node, level, remaining = stack[-1]
+                child = next(remaining, None)
+                right += 1
+                if child is None:
+                    stack.pop()
+                    tree_fields = (left[node], right, tree_id, level)
+                    if current[node] != tree_fields:
+                        changed.append(
+                            self.model(id=node, lft=tree_fields[0], rght=right, tree_id=tree_id, level=level)
+                        )
+                else:
+                    left[child] = right
+                    stack.append((child, level + 1, iter(children[child])))
+        self.bulk_update(changed, ["lft", "rght", "tree_id", "level"], batch_size=batch_size)
+        return len(changed)
+
+    rebuild_scheme.alters_data = True
+
+    def allocate_tree_ids(self, count):
+        """
+        Reserves `count` consecutive unused tree ids and returns the first. The
+        TreeIdSequence row stays locked until the current transaction ends, so
+        concurrent imports and rebuilds never get the same tree id.
+        """
+        with transaction.atomic():
+            sequence, _ = TreeIdSequence.objects.select_for_update().get_or_create(pk=1)
+            # trees may be above the sequence if mptt moved them to keep the top concepts ordered
+            highest = self.aggregate(models.Max("tree_id"))["tree_id__max"] or 0
+            first = max(sequence.last_tree_id, highest) + 1
+            sequence.last_tree_id = first + count - 1
+            sequence.save(update_fields=["last_tree_id"])
+        return first
+
+    allocate_tree_ids.alters_data = True
+
+    def _get_next_tree_id(self):
+        # the tree id of a new top concept saved by mptt
+        return self.allocate_tree_ids(1)
+
+    def update_uris(self, scheme, batch_size=1000):
+        """
+        Recomputes the stored URIs of the concepts of `scheme`, after its
+        identifier changed or concepts were written in bulk, and writes back
+        the changed ones. Returns the number of changed concepts.
+        """
+        identifier = SkosConceptScheme.objects.filter(pk=scheme.pk).values_list("identifier", flat=True).get()
+        changed = [
+            self.model(id=pk, uri=uri)
+            for pk, legacy_id, notation, stored in self.filter(scheme=scheme)
+            .values_list("id", "legacy_id", "notation", "uri")
+            .iterator(chunk_size=batch_size)
+            if (uri := concept_uri(identifier, legacy_id, pk, notation)) != stored
+        ]
+        self.bulk_update(changed, ["uri"], batch_size=batch_size)
+        return len(changed)
+
+    update_uris.alters_data = True
+
+    def with_relation(self, relation, target, inferred=False):
+        """
+        The concepts with `target` in their `relation` field, e.g. ("exact_match",
+        "https://d-nb.info/gnd/..."), looked up in ConceptRelation. With `inferred`
+        also the concepts which `target` has the inverse relation to, if it is a concept.
+        """
+        condition = models.Q(has_relations__relation=relation, has_relations__target=target)
+        if inferred:
+            targets = ConceptRelation.objects.filter(relation=INVERSE_RELATIONS[relation], concept__uri=target)
+            condition |= models.Q(uri__in=targets.values("target"))
+        return self.filter(condition).distinct()
+
+
 @reversion.register()
-class SkosConcept(MPTTModel):
+class SkosConcept(InstanceDeletedMixin, MPTTModel):
     """
     A SKOS concept can be viewed as an idea or notion; a unit of thought.
     However, what constitutes a unit of thought is subjective,
@@ -793,6 +985,10 @@ class SkosConcept(MPTTModel):
     ###########################################################################
     # if using legacy_id as URI change it for URLField
     legacy_id = models.CharField(max_length=200, blank=True)
+    # the URI of create_uri(), written on save and by SkosConceptManager.update_uris()
+    uri = models.CharField(max_length=600, blank=True, editable=False, db_index=True)
+    # hash of the imported record, an update import only rewrites concepts whose hash changed
+    import_hash = models.CharField(max_length=40, blank=True, editable=False)
     creator = models.TextField(
         blank=True,
         verbose_name="dc:creator",
@@ -819,8 +1015,14 @@ class SkosConcept(MPTTModel):
         on_delete=models.SET_NULL,
     )
 
+    objects = SkosConceptManager()
+
     class Meta:
         verbose_name = "Concept"
+        indexes = [
+            models.Index(fields=["notation"], name="vocabs_concept_notation_idx"),
+            models.Index(fields=["legacy_id"], name="vocabs_concept_legacy_id_idx"),
+        ]
 
     class MPTTMeta:
         order_insertion_by = ["pref_label"]
@@ -833,29 +1035,37 @@ class SkosConcept(MPTTModel):
         if not self.id:
             self.date_created = timezone.now()
         self.date_modified = timezone.now()
+        if self.id or self.legacy_id:
+            self.uri = self.build_uri()
         super(SkosConcept, self).save(*args, **kwargs)
+        if not self.uri:
+            # the URI of a new concept holds its id
+            self.uri = self.build_uri()
+            SkosConcept.objects.filter(pk=self.pk).update(uri=self.uri)
+
+    def delete(self, *args, **kwargs):
+        # narrower concepts and memberships are deleted along with the concept, their collections are found before
+        members = SkosConcept.collection.through.objects.filter(skosconcept__in=self.get_descendants(include_self=True))
+        collection_ids = list(members.values_list("skoscollection_id", flat=True).distinct())
+        broader_concept_id = self.broader_concept_id
+        result = super(SkosConcept, self).delete(*args, **kwargs)
+        # the fragments of the deleted concepts are deleted by the cascade
+        concept_ids = [broader_concept_id] if broader_concept_id is not None else []
+        clear_export_fragments(concept_ids=concept_ids, collection_ids=collection_ids)
+        return result
+
+    def build_uri(self):
+        return concept_uri(self.scheme.identifier, self.legacy_id, self.id, self.notation)
 
     def create_uri(self):
-        mcs = self.scheme.identifier
-        if mcs.endswith(VOCABS_SEPARATOR):
-            pass
-        else:
-            mcs = f"{mcs}{VOCABS_SEPARATOR}"
-        if self.legacy_id:
-            item_uri = f"{self.legacy_id}"
-        else:
-            if notation_for_uri:
-                tmp = slugify(self.notation, allow_unicode=False)
-                item_uri = f"{mcs}concept__{tmp}__{self.id}"
-            else:
-                item_uri = f"{mcs}concept{self.id}"
-        return item_uri
+        return self.uri or self.build_uri()
 
     def get_subject(self):
         return URIRef(self.create_uri())
 
-    def as_graph(self):
-        g = Graph()
+    def as_graph(self, g=None):
+        """Adds the triples of the concept to `g`, see SkosConceptScheme.as_graph()"""
+        g = Graph() if g is None else g
         subj = self.get_subject()
         main_concept_scheme = self.scheme.get_subject()
         g.add((subj, RDF.type, SKOS.Concept))
@@ -871,18 +1081,12 @@ class SkosConcept(MPTTModel):
         for x in self.narrower_concepts.all():
             g.add((subj, SKOS.narrower, URIRef(x.create_uri())))
         for note in self.has_notes.all():
-            g = g + note.as_graph()
+            note.as_graph(g)
         for source in self.has_sources.all():
             g.add((subj, DC.source, Literal(source.name, lang=source.language)))
         for label in self.has_labels.all():
-            if label.label_type == "prefLabel":
-                g.add((subj, SKOS.prefLabel, Literal(label.name, lang=label.language)))
-            elif label.label_type == "altLabel":
-                g.add((subj, SKOS.altLabel, Literal(label.name, lang=label.language)))
-            elif label.label_type == "hiddenLabel":
-                g.add((subj, SKOS.hiddenLabel, Literal(label.name, lang=label.language)))
-            else:
-                g.add((subj, SKOS.altLabel, Literal(label.name, lang=label.language)))
+            predicate = LABEL_PREDICATES.get(label.label_type, SKOS.altLabel)
+            g.add((subj, predicate, Literal(label.name, lang=label.language)))
         return modelprops_to_graph(self, subj, g)
 
     # change for template tag
@@ -930,7 +1134,7 @@ class SkosConcept(MPTTModel):
 ######################################################################
 
 
-class ConceptLabel(models.Model):
+class ConceptLabel(InstanceDeletedMixin, models.Model):
     """
     A Class for Concept labels of any type.
 
@@ -957,11 +1161,13 @@ class ConceptLabel(models.Model):
         help_text="Choose label type",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
 
-class ConceptNote(models.Model):
+class ConceptNote(InstanceDeletedMixin, models.Model):
     """
     A Class for SKOS documentary notes that are used
     for general documentation pusposes.
@@ -988,32 +1194,19 @@ class ConceptNote(models.Model):
         help_text="Choose note type",
     )
 
-    def as_graph(self):
+    objects = ContentQuerySet.as_manager()
+
+    def as_graph(self, g=None):
         subj = self.concept.get_subject()
-        g = Graph()
-        if self.note_type == "note":
-            g.add((subj, SKOS.note, Literal(self.name, lang=self.language)))
-        elif self.note_type == "scopeNote":
-            g.add((subj, SKOS.scopeNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "changeNote":
-            g.add((subj, SKOS.changeNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "editorialNote":
-            g.add((subj, SKOS.editorialNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "historyNote":
-            g.add((subj, SKOS.historyNote, Literal(self.name, lang=self.language)))
-        elif self.note_type == "definition":
-            g.add((subj, SKOS.definition, Literal(self.name, lang=self.language)))
-        elif self.note_type == "example":
-            g.add((subj, SKOS.example, Literal(self.name, lang=self.language)))
-        else:
-            g.add((subj, SKOS.note, Literal(self.name, lang=self.language)))
+        g = Graph() if g is None else g
+        g.add((subj, NOTE_PREDICATES.get(self.note_type, SKOS.note), Literal(self.name, lang=self.language)))
         return g
 
     def __str__(self):
         return f"{self.name}"
 
 
-class ConceptSource(models.Model):
+class ConceptSource(InstanceDeletedMixin, models.Model):
     """
     A Class for Concept source information.
 
@@ -1033,10 +1226,197 @@ class ConceptSource(models.Model):
         help_text="Language of source given above",
     )
 
+    objects = ContentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
 
+def relation_targets(value):
+    """The URIs of a comma separated relation field, split like its PredicatePlan does"""
+    return list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+
+
+class ConceptRelation(models.Model):
+    """
+    A URI of the skos:related or a *Match field of a concept. The comma separated
+    fields stay what forms and serializers edit, these rows are synced from them
+    by sync_relations() so relations can be looked up in both directions.
+    """
+
+    concept = models.ForeignKey(
+        SkosConcept,
+        related_name="has_relations",
+        on_delete=models.CASCADE,
+    )
+    relation = models.CharField(max_length=20, choices=[(field, name) for name, field in SKOS_RELATION_TYPES])
+    target = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["concept", "relation", "target"], name="vocabs_unique_concept_relation"),
+        ]
+        indexes = [models.Index(fields=["target", "relation"], name="vocabs_relation_target_idx")]
+
+    def __str__(self):
+        return f"{self.concept_id} {self.relation} {self.target}"
+
+
+def sync_relations(concepts, batch_size=1000):
+    """
+    Writes the ConceptRelation rows of the queryset `concepts` from their relation
+    fields, only missing rows are inserted and stale ones deleted. Returns the number of changed rows.
+    """
+    rows = concepts.order_by().values_list("id", *RELATION_FIELDS).iterator(chunk_size=batch_size)
+    changed = 0
+    while batch := list(islice(rows, batch_size)):
+        changed += sync_relation_rows(batch, batch_size)
+    return changed
+
+
+def sync_relation_rows(batch, batch_size=1000):
+    """Syncs the ConceptRelation rows of concepts given as tuples of their id and RELATION_FIELDS"""
+    wanted = {
+        (pk, relation, target)
+        for pk, *values in batch
+        for relation, value in zip(RELATION_FIELDS, values)
+        for target in relation_targets(value)
+    }
+    stored = {
+        (pk, relation, target): relation_id
+        for relation_id, pk, relation, target in ConceptRelation.objects.filter(
+            concept_id__in=[row[0] for row in batch]
+        ).values_list("id", "concept_id", "relation", "target")
+    }
+    stale = [relation_id for key, relation_id in stored.items() if key not in wanted]
+    if stale:
+        ConceptRelation.objects.filter(pk__in=stale).delete()
+    missing = [
+        ConceptRelation(concept_id=pk, relation=relation, target=target)
+        for pk, relation, target in wanted
+        if (pk, relation, target) not in stored
+    ]
+    ConceptRelation.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+    return len(stale) + len(missing)
+
+
+def inferred_relations(concept):
+    """
+    The relations of `concept` that follow from the relations other concepts
+    have to it, as a dict of relation field to a list of URIs
+    """
+    inferred = defaultdict(list)
+    rows = ConceptRelation.objects.filter(target=concept.create_uri()).order_by("concept_id")
+    for relation, uri in rows.values_list("relation", "concept__uri"):
+        inferred[INVERSE_RELATIONS[relation]].append(uri)
+    return dict(inferred)
+
+
+######################################################################
+#
+# Tree ids
+#
+######################################################################
+
+
+class TreeIdSequence(models.Model):
+    """
+    The highest tree id handed out for concept trees, a single row which is
+    locked while tree ids are allocated, see SkosConceptManager.allocate_tree_ids
+    """
+
+    last_tree_id = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.last_tree_id}"
+
+
+######################################################################
+#
+# Import checkpoints
+#
+######################################################################
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a SKOS import which is written in chunks, a re-run of the
+    import with the same task id resumes after the last written subject
+    """
+
+    task_id = models.CharField(max_length=255, unique=True, verbose_name="Task id")
+    concept_scheme = models.ForeignKey(
+        SkosConceptScheme,
+        related_name="import_checkpoints",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    position = models.PositiveIntegerField(default=0, help_text="Number of subjects written so far")
+    last_subject = models.TextField(blank=True, help_text="Last subject written")
+    state = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Records and relations waiting for subjects after the checkpoint",
+    )
+    # the run of the import writing to the checkpoint and when it last did, see skos_import.claim_checkpoint
+    owner = models.CharField(max_length=255, blank=True, help_text="Import run holding the checkpoint")
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.task_id} ({self.position} subjects)"
+
+
+class ImportPendingLink(models.Model):
+    """
+    A broader link or collection membership of a checkpointed import whose
+    target concept is not written yet, kept out of ImportCheckpoint.state so
+    that a flush only writes the links it adds and removes
+    """
+
+    BROADER = "broader"
+    MEMBER = "member"
+    KINDS = ((BROADER, "Broader concept"), (MEMBER, "Collection member"))
+
+    checkpoint = models.ForeignKey(ImportCheckpoint, related_name="pending_links", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    source = models.TextField(help_text="legacy_id of the concept (broader) or of the collection (member)")
+    target = models.TextField(help_text="URI of the broader concept or of the member")
+
+    class Meta:
+        indexes = [models.Index(fields=["checkpoint", "kind"])]
+
+    def __str__(self):
+        return f"{self.source} {self.kind} {self.target}"
+
+
+class ExportFragment(models.Model):
+    """
+    The N-Triples of a concept or collection as written by a scheme export,
+    deleted on signals when the object or anything in its triples changes
+    """
+
+    concept = models.OneToOneField(
+        SkosConcept,
+        related_name="export_fragment",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    collection = models.OneToOneField(
+        SkosCollection,
+        related_name="export_fragment",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    ntriples = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.concept or self.collection}"
+
+
 def get_all_children(self, include_self=True):
     # many thanks to https://stackoverflow.com/questions/4725343
     r = []
@@ -1049,6 +1429,18 @@ def get_all_children(self, include_self=True):
     return r
 
 
+#############################################################################
+#
+# Relations on signals
+#
+#############################################################################
+
+
+@receiver(post_save, sender=SkosConcept, dispatch_uid="sync_concept_relations")
+def sync_concept_relations(sender, instance, **kwargs):
+    sync_relation_rows([(instance.pk, *(getattr(instance, field) for field in RELATION_FIELDS))])
+
+
 #############################################################################
 #
 # Permissions on signals
@@ -1058,39 +1450,31 @@ def get_all_children(self, include_self=True):
 
 @receiver(post_save, sender=SkosConceptScheme, dispatch_uid="create_perms_cs_created_by")
 def create_perms_cs_created_by(sender, instance, **kwargs):
-    assign_perm("delete_skosconceptscheme", instance.created_by, instance)
-    assign_perm("change_skosconceptscheme", instance.created_by, instance)
-    assign_perm("view_skosconceptscheme", instance.created_by, instance)
+    grant_object_permissions([instance.created_by], instance)
+
+
+def object_permission_users(instance):
+    """The creator of a collection or concept, the scheme curators and, if there are curators, the scheme creator"""
+    users = [instance.created_by]
+    curators = list(instance.scheme.curator.all())
+    if curators:
+        users.extend(curators)
+        users.append(instance.scheme.created_by)
+    return users
 
 
 @receiver(post_save, sender=SkosCollection, dispatch_uid="create_perms_collection_created_by")
 def create_perms_collection_created_by(sender, instance, **kwargs):
-    assign_perm("delete_skoscollection", instance.created_by, instance)
-    assign_perm("change_skoscollection", instance.created_by, instance)
-    assign_perm("view_skoscollection", instance.created_by, instance)
-    for curator in instance.scheme.curator.all():
-        assign_perm("delete_skoscollection", curator, instance)
-        assign_perm("change_skoscollection", curator, instance)
-        assign_perm("view_skoscollection", curator, instance)
-        if curator is not instance.scheme.created_by:
-            assign_perm("delete_skoscollection", instance.scheme.created_by, instance)
-            assign_perm("change_skoscollection", instance.scheme.created_by, instance)
-            assign_perm("view_skoscollection", instance.scheme.created_by, instance)
+    if inherits_scheme_permissions(sender):
+        return
+    grant_object_permissions(object_permission_users(instance), instance)
 
 
 @receiver(post_save, sender=SkosConcept, dispatch_uid="create_perms_concept_created_by")
 def create_perms_concept_created_by(sender, instance, **kwargs):
-    assign_perm("delete_skosconcept", instance.created_by, instance)
-    assign_perm("change_skosconcept", instance.created_by, instance)
-    assign_perm("view_skosconcept", instance.created_by, instance)
-    for curator in instance.scheme.curator.all():
-        assign_perm("delete_skosconcept", curator, instance)
-        assign_perm("change_skosconcept", curator, instance)
-        assign_perm("view_skosconcept", curator, instance)
-        if curator is not instance.scheme.created_by:
-            assign_perm("delete_skosconcept", instance.scheme.created_by, instance)
-            assign_perm("change_skosconcept", instance.scheme.created_by, instance)
-            assign_perm("view_skosconcept", instance.scheme.created_by, instance)
+    if inherits_scheme_permissions(sender):
+        return
+    grant_object_permissions(object_permission_users(instance), instance)
 
 
 ############### Adding new curator (user) to a Concept Scheme ###################
@@ -1104,29 +1488,261 @@ def create_perms_concept_created_by(sender, instance, **kwargs):
 )
 def create_perms_curator(sender, instance, **kwargs):
     if kwargs["action"] == "pre_add":
-        for curator in User.objects.filter(pk__in=kwargs["pk_set"]):
-            assign_perm("view_skosconceptscheme", curator, instance)
-            assign_perm("change_skosconceptscheme", curator, instance)
-            assign_perm("delete_skosconceptscheme", curator, instance)
-            for obj in instance.has_collections.all():
-                assign_perm("view_" + obj.__class__.__name__.lower(), curator, obj)
-                assign_perm("change_" + obj.__class__.__name__.lower(), curator, obj)
-                assign_perm("delete_" + obj.__class__.__name__.lower(), curator, obj)
-            for obj in instance.has_concepts.all():
-                assign_perm("view_" + obj.__class__.__name__.lower(), curator, obj)
-                assign_perm("change_" + obj.__class__.__name__.lower(), curator, obj)
-                assign_perm("delete_" + obj.__class__.__name__.lower(), curator, obj)
+        curators = list(User.objects.filter(pk__in=kwargs["pk_set"]))
+        grant_object_permissions(curators, instance)
+        update_scheme_permissions(curators, instance)
     elif kwargs["action"] == "post_remove":
-        for curator in User.objects.filter(pk__in=kwargs["pk_set"]):
-            remove_perm("view_skosconceptscheme", curator, instance)
-            remove_perm("change_skosconceptscheme", curator, instance)
-            # if user removed from the curators list
-            # he/she won't be able to access the objects he/she created within this CS
-            for obj in instance.has_collections.all():
-                remove_perm("view_" + obj.__class__.__name__.lower(), curator, obj)
-                remove_perm("change_" + obj.__class__.__name__.lower(), curator, obj)
-                remove_perm("delete_" + obj.__class__.__name__.lower(), curator, obj)
-            for obj in instance.has_concepts.all():
-                remove_perm("view_" + obj.__class__.__name__.lower(), curator, obj)
-                remove_perm("change_" + obj.__class__.__name__.lower(), curator, obj)
-                remove_perm("delete_" + obj.__class__.__name__.lower(), curator, obj)
+        curators = list(User.objects.filter(pk__in=kwargs["pk_set"]))
+        revoke_permissions(curators, SkosConceptScheme.objects.filter(pk=instance.pk), actions=("view", "change"))
+        # if user removed from the curators list
+        # he/she won't be able to access the objects he/she created within this CS
+        update_scheme_permissions(curators, instance, revoke=True)
+
+
+#############################################################################
+#
+# Content versions of concept schemes on signals
+#
+#############################################################################
+
+
+def bump_content_version(schemes):
+    """Gives the concept schemes of the queryset `schemes` a new content version, which invalidates their exports"""
+    fields = {"content_version": new_content_version(), "content_modified": timezone.now()}
+    schemes.update(**fields)
+    return fields
+
+
+# how the concept scheme of an instance is found: lookup on SkosConceptScheme, attribute of the instance
+CONTENT_VERSION_LOOKUPS = {
+    SkosConceptScheme: ("pk", "pk"),
+    ConceptSchemeTitle: ("pk", "concept_scheme_id"),
+    ConceptSchemeDescription: ("pk", "concept_scheme_id"),
+    ConceptSchemeSource: ("pk", "concept_scheme_id"),
+    CustomProperty: ("pk", "concept_scheme_id"),
+    SkosCollection: ("pk", "scheme_id"),
+    CollectionLabel: ("has_collections", "collection_id"),
+    CollectionNote: ("has_collections", "collection_id"),
+    CollectionSource: ("has_collections", "collection_id"),
+    SkosConcept: ("pk", "scheme_id"),
+    ConceptLabel: ("has_concepts", "concept_id"),
+    ConceptNote: ("has_concepts", "concept_id"),
+    ConceptSource: ("has_concepts", "concept_id"),
+}
+
+
+def content_changed(sender, instance, **kwargs):
+    lookup, attribute = CONTENT_VERSION_LOOKUPS[sender]
+    fields = bump_content_version(SkosConceptScheme.objects.filter(**{lookup: getattr(instance, attribute)}))
+    if sender is SkosConceptScheme:
+        for name, value in fields.items():
+            setattr(instance, name, value)
+
+
+def content_deleted(sender, queryset, **kwargs):
+    lookup, attribute = CONTENT_VERSION_LOOKUPS[sender]
+    schemes = SkosConceptScheme.objects.filter(**{f"{lookup}__in": queryset.order_by().values(attribute)})
+    # the ids are read first, MySQL doesn't update a table selected in a subquery
+    bump_content_version(SkosConceptScheme.objects.filter(pk__in=list(schemes.values_list("pk", flat=True))))
+
+
+for model in CONTENT_VERSION_LOOKUPS:
+    post_save.connect(content_changed, sender=model, dispatch_uid=f"content_version_save_{model.__name__}")
+    # a post_delete receiver would delete the rows of cascades one by one, see InstanceDeletedMixin
+    instance_deleted.connect(content_changed, sender=model, dispatch_uid=f"content_version_delete_{model.__name__}")
+    queryset_deleted.connect(content_deleted, sender=model, dispatch_uid=f"content_version_deleted_{model.__name__}")
+
+
+@receiver(m2m_changed, sender=SkosConcept.collection.through, dispatch_uid="content_version_members")
+def members_changed(sender, instance, **kwargs):
+    if kwargs["action"] not in ("post_add", "post_remove", "post_clear"):
+        return
+    scheme_ids = [instance.scheme_id]
+    if kwargs["pk_set"]:
+        scheme_ids.extend(kwargs["model"].objects.filter(pk__in=kwargs["pk_set"]).values_list("scheme_id", flat=True))
+    bump_content_version(SkosConceptScheme.objects.filter(pk__in=scheme_ids))
+
+
+@receiver(m2m_changed, sender=SkosConceptScheme.curator.through, dispatch_uid="content_version_curators")
+def curators_changed(sender, instance, **kwargs):
+    # curators are shown on the pages of the scheme and decide who sees it, see vocabs.conditional
+    if kwargs["action"] not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, SkosConceptScheme):
+        schemes = SkosConceptScheme.objects.filter(pk=instance.pk)
+    else:
+        schemes = SkosConceptScheme.objects.filter(pk__in=kwargs["pk_set"] or [])
+    bump_content_version(schemes)
+
+
+#############################################################################
+#
+# Tree versions of concept schemes on signals
+#
+#############################################################################
+
+# the fields of a concept shown in the hierarchy of its scheme, see vocabs.hierarchy
+TREE_FIELDS = ("scheme_id", "broader_concept_id", "pref_label", "needs_review")
+
+
+def bump_tree_version(schemes):
+    """Gives the concept schemes of the queryset `schemes` a new tree version, which invalidates their hierarchy"""
+    schemes.update(tree_version=new_content_version())
+
+
+@receiver(post_save, sender=SkosConcept, dispatch_uid="tree_version_concept_saved")
+def tree_concept_saved(sender, instance, **kwargs):
+    saved = getattr(instance, "_saved_tree_fields", None)
+    if saved == {field: getattr(instance, field) for field in TREE_FIELDS}:
+        return
+    scheme_ids = [instance.scheme_id, saved["scheme_id"] if saved else None]
+    bump_tree_version(SkosConceptScheme.objects.filter(pk__in=[pk for pk in scheme_ids if pk is not None]))
+
+
+@receiver(instance_deleted, sender=SkosConcept, dispatch_uid="tree_version_concept_deleted")
+def tree_concept_deleted(sender, instance, **kwargs):
+    # once for a concept and its narrower concepts, the trees of deleted schemes are gone with them
+    bump_tree_version(SkosConceptScheme.objects.filter(pk=instance.scheme_id))
+
+
+@receiver(queryset_deleted, sender=SkosConcept, dispatch_uid="tree_version_concepts_deleted")
+def tree_concepts_deleted(sender, queryset, **kwargs):
+    scheme_ids = list(queryset.order_by().values_list("scheme_id", flat=True).distinct())
+    bump_tree_version(SkosConceptScheme.objects.filter(pk__in=scheme_ids))
+
+
+#############################################################################
+#
+# Export fragments on signals
+#
+#############################################################################
+
+
+def clear_export_fragments(*conditions, concept_ids=(), collection_ids=()):
+    """Deletes the stored export fragments of concepts and collections, selected by ids or Q objects"""
+    condition = models.Q(concept_id__in=concept_ids) | models.Q(collection_id__in=collection_ids)
+    for q in conditions:
+        condition |= q
+    ExportFragment.objects.filter(condition).delete()
+
+
+def clear_scheme_fragments(concept_scheme):
+    """Deletes the export fragments of all concepts and collections of `concept_scheme`, for bulk writes"""
+    clear_export_fragments(models.Q(concept__scheme=concept_scheme), models.Q(collection__scheme=concept_scheme))
+
+
+def clear_concept_fragments(concept, *concept_ids):
+    """
+    Deletes the export fragments of `concept`, the concepts of `concept_ids`
+    and of all that have its URI in their triples: its narrower concepts and its collections
+    """
+    clear_export_fragments(
+        models.Q(concept__broader_concept_id=concept.pk),
+        models.Q(collection__has_members=concept.pk),
+        concept_ids=[pk for pk in (concept.pk, *concept_ids) if pk is not None],
+    )
+
+
+@receiver(pre_save, sender=SkosConcept, dispatch_uid="export_fragments_concept_pre_save")
+def concept_pre_save(sender, instance, **kwargs):
+    # the former broader concept loses a narrower concept if it is changed, the tree version compares all fields
+    instance._saved_tree_fields = (
+        SkosConcept.objects.filter(pk=instance.pk).values(*TREE_FIELDS).first() if instance.pk is not None else None
+    )
+
+
+@receiver(post_save, sender=SkosConcept, dispatch_uid="export_fragments_concept_saved")
+def concept_saved(sender, instance, **kwargs):
+    saved = getattr(instance, "_saved_tree_fields", None) or {}
+    clear_concept_fragments(instance, instance.broader_concept_id, saved.get("broader_concept_id"))
+
+
+@receiver(post_save, sender=SkosCollection, dispatch_uid="export_fragments_collection_saved")
+def collection_saved(sender, instance, **kwargs):
+    clear_export_fragments(collection_ids=[instance.pk])
+
+
+def concept_detail_changed(sender, instance, **kwargs):
+    clear_export_fragments(concept_ids=[instance.concept_id])
+
+
+def collection_detail_changed(sender, instance, **kwargs):
+    clear_export_fragments(collection_ids=[instance.collection_id])
+
+
+def concept_details_deleted(sender, queryset, **kwargs):
+    clear_export_fragments(models.Q(concept__in=queryset.order_by().values("concept_id")))
+
+
+def collection_details_deleted(sender, queryset, **kwargs):
+    clear_export_fragments(models.Q(collection__in=queryset.order_by().values("collection_id")))
+
+
+for model, receiver_function, queryset_receiver in (
+    (ConceptLabel, concept_detail_changed, concept_details_deleted),
+    (ConceptNote, concept_detail_changed, concept_details_deleted),
+    (ConceptSource, concept_detail_changed, concept_details_deleted),
+    (CollectionLabel, collection_detail_changed, collection_details_deleted),
+    (CollectionNote, collection_detail_changed, collection_details_deleted),
+    (CollectionSource, collection_detail_changed, collection_details_deleted),
+):
+    post_save.connect(receiver_function, sender=model, dispatch_uid=f"export_fragments_save_{model.__name__}")
+    instance_deleted.connect(receiver_function, sender=model, dispatch_uid=f"export_fragments_delete_{model.__name__}")
+    queryset_deleted.connect(queryset_receiver, sender=model, dispatch_uid=f"export_fragments_deleted_{model.__name__}")
+
+
+@receiver(queryset_deleted, sender=SkosConcept, dispatch_uid="export_fragments_concepts_deleted")
+def concepts_deleted(sender, queryset, **kwargs):
+    # the broader concepts lose narrower concepts, the collections of the schemes may list the deleted concepts
+    # or their narrower concepts which go with them, see SkosConcept.delete() for a single concept
+    scheme_ids = list(queryset.order_by().values_list("scheme_id", flat=True).distinct())
+    clear_export_fragments(
+        models.Q(concept__in=queryset.order_by().values("broader_concept_id")),
+        models.Q(collection__has_members__scheme__in=scheme_ids),
+    )
+
+
+@receiver(m2m_changed, sender=SkosConcept.collection.through, dispatch_uid="export_fragments_members")
+def fragment_members_changed(sender, instance, **kwargs):
+    if kwargs["action"] not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if isinstance(instance, SkosCollection):
+        clear_export_fragments(collection_ids=[instance.pk])
+    elif kwargs["action"] == "pre_clear":
+        clear_export_fragments(models.Q(collection__has_members=instance.pk))
+    else:
+        clear_export_fragments(collection_ids=kwargs["pk_set"])
+
+
+@receiver(pre_save, sender=SkosConceptScheme, dispatch_uid="export_fragments_scheme_pre_save")
+def scheme_pre_save(sender, instance, **kwargs):
+    instance._saved_uri_fields = (
+        SkosConceptScheme.objects.filter(pk=instance.pk).values_list("identifier", "legacy_id").first()
+        if instance.pk is not None
+        else None
+    )
+
+
+@receiver(pre_delete, sender=SkosConceptScheme, dispatch_uid="export_fragments_scheme_deleted")
+def scheme_deleted(sender, instance, **kwargs):
+    # the fragments of the scheme are deleted by the cascade, collections of other schemes may list its concepts
+    clear_export_fragments(
+        models.Q(collection__has_members__scheme=instance.pk) & ~models.Q(collection__scheme=instance.pk)
+    )
+
+
+@receiver(post_save, sender=SkosConceptScheme, dispatch_uid="export_fragments_scheme_saved")
+def scheme_saved(sender, instance, **kwargs):
+    saved = getattr(instance, "_saved_uri_fields", None)
+    if saved is not None and saved != (instance.identifier, instance.legacy_id):
+        # URIs of concepts and collections derive from the scheme, and may be in fragments of other schemes
+        # as members of collections and as broader or narrower concepts
+        clear_export_fragments(
+            models.Q(concept__scheme=instance),
+            models.Q(collection__scheme=instance),
+            models.Q(collection__has_members__scheme=instance),
+            models.Q(concept__broader_concept__scheme=instance),
+            models.Q(concept__narrower_concepts__scheme=instance),
+        )
+        if saved[0] != instance.identifier:
+            SkosConcept.objects.update_uris(instance)
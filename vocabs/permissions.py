@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from guardian.shortcuts import get_objects_for_user
+from guardian.utils import get_user_obj_perms_model
+
+ACTIONS = ("delete", "change", "view")
+BATCH_SIZE = getattr(settings, "VOCABS_PERMISSIONS_BATCH_SIZE", 1000)
+# schemes with more collections and concepts get curator permissions from a Celery task
+ASYNC_THRESHOLD = getattr(settings, "VOCABS_PERMISSIONS_ASYNC_THRESHOLD", 5000)
+# models whose permissions follow the scheme if VOCABS_SCHEME_PERMISSIONS is set
+SCHEME_MODELS = ("skoscollection", "skosconcept")
+
+
+def scheme_permissions_enabled():
+    return getattr(settings, "VOCABS_SCHEME_PERMISSIONS", False)
+
+
+def inherits_scheme_permissions(model):
+    """True if the permissions on objects of `model` are derived from their concept scheme"""
+    return scheme_permissions_enabled() and model._meta.model_name in SCHEME_MODELS
+
+
+def scheme_ids_for_user(user):
+    """Ids of the concept schemes `user` created or curates"""
+    from .models import SkosConceptScheme
+
+    queryset = SkosConceptScheme.objects.filter(Q(created_by=user) | Q(curator=user))
+    return sorted(set(queryset.values_list("pk", flat=True)))
+
+
+def cached_scheme_ids(user):
+    """
+    Like scheme_ids_for_user(), but cached on the user object as Django caches
+    its permissions in `_perm_cache`, a user fetched again sees later changes
+    """
+    if not hasattr(user, "_vocabs_scheme_ids"):
+        user._vocabs_scheme_ids = frozenset(scheme_ids_for_user(user))
+    return user._vocabs_scheme_ids
+
+
+def has_scheme_permission(user, obj):
+    """True if `user` created or curates the concept scheme of the collection or concept `obj`"""
+    if not user.is_active or user.is_anonymous or obj.scheme_id is None:
+        return False
+    return obj.scheme_id in cached_scheme_ids(user)
+
+
+def objects_for_user(user, perms, klass):
+    """
+    Like guardian's get_objects_for_user(), but if VOCABS_SCHEME_PERMISSIONS is
+    set collections and concepts are filtered by `scheme_id IN (...)` with the
+    schemes the user created or curates instead of joining the object permissions
+    """
+    queryset = klass if isinstance(klass, QuerySet) else klass._default_manager.all()
+    if not inherits_scheme_permissions(queryset.model):
+        return get_objects_for_user(user, perms, klass=queryset)
+    if user.is_superuser and user.is_active:
+        return queryset
+    if not user.is_active or user.is_anonymous:
+        return queryset.none()
+    return queryset.filter(scheme_id__in=scheme_ids_for_user(user))
+
+
+def model_permissions(model, actions=ACTIONS):
+    """Returns the content type of `model` and its permissions for `actions`"""
+    content_type = ContentType.objects.get_for_model(model)
+    codenames = [f"{action}_{model._meta.model_name}" for action in actions]
+    return content_type, list(Permission.objects.filter(content_type=content_type, codename__in=codenames))
+
+
+def unique_users(users):
+    return list({user.pk: user for user in users if user is not None}.values())
+
+
+def object_pk_batches(queryset, batch_size=BATCH_SIZE):
+    """Yields the primary keys of `queryset` as strings, as guardian stores them, in batches"""
+    object_pks = [str(pk) for pk in queryset.order_by().values_list("pk", flat=True)]
+    for start in range(0, len(object_pks), batch_size):
+        end = start + batch_size
+        yield object_pks[start:end]
+
+
+def grant_permissions(users, queryset, actions=ACTIONS, batch_size=BATCH_SIZE):
+    """
+    Grants `actions` on every object of `queryset` to `users` with bulk inserts
+    of the missing UserObjectPermission rows, returns the number of rows inserted
+    """
+    UserObjectPermission = get_user_obj_perms_model()
+    users = unique_users(users)
+    if not users or inherits_scheme_permissions(queryset.model):
+        return 0
+    content_type, permissions = model_permissions(queryset.model, actions)
+    inserted = 0
+    for object_pks in object_pk_batches(queryset, batch_size):
+        existing = set(
+            UserObjectPermission.objects.filter(
+                content_type=content_type,
+                user__in=users,
+                permission__in=permissions,
+                object_pk__in=object_pks,
+            ).values_list("user_id", "permission_id", "object_pk")
+        )
+        rows = [
+            UserObjectPermission(user=user, permission=permission, content_type=content_type, object_pk=object_pk)
+            for user in users
+            for permission in permissions
+            for object_pk in object_pks
+            if (user.pk, permission.pk, object_pk) not in existing
+        ]
+        # ignore_conflicts covers rows inserted by a concurrent grant
+        UserObjectPermission.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        inserted += len(rows)
+    return inserted
+
+
+def revoke_permissions(users, queryset, actions=ACTIONS, batch_size=BATCH_SIZE):
+    """Removes the permissions for `actions` on every object of `queryset` from `users`"""
+    UserObjectPermission = get_user_obj_perms_model()
+    users = unique_users(users)
+    if not users:
+        return 0
+    content_type, permissions = model_permissions(queryset.model, actions)
+    deleted = 0
+    for object_pks in object_pk_batches(queryset, batch_size):
+        count, _ = UserObjectPermission.objects.filter(
+            content_type=content_type,
+            user__in=users,
+            permission__in=permissions,
+            object_pk__in=object_pks,
+        ).delete()
+        deleted += count
+    return deleted
+
+
+def grant_object_permissions(users, obj, actions=ACTIONS):
+    """Grants `actions` on a single object to `users`"""
+    return grant_permissions(users, type(obj).objects.filter(pk=obj.pk), actions)
+
+
+def apply_scheme_permissions(users, concept_scheme, actions=ACTIONS, revoke=False):
+    """Grants or revokes `actions` on all collections and concepts of a concept scheme"""
+    update = revoke_permissions if revoke else grant_permissions
+    return sum(
+        update(users, queryset, actions)
+        for queryset in (concept_scheme.has_collections.all(), concept_scheme.has_concepts.all())
+    )
+
+
+def update_scheme_permissions(users, concept_scheme, actions=ACTIONS, revoke=False):
+    """
+    Like apply_scheme_permissions(), but schemes with at least
+    VOCABS_PERMISSIONS_ASYNC_THRESHOLD collections and concepts are handed to
+    a Celery task once the transaction is committed
+    """
+    users = unique_users(users)
+    if not users or (not revoke and scheme_permissions_enabled()):
+        return
+    size = concept_scheme.has_collections.count() + concept_scheme.has_concepts.count()
+    if size < ASYNC_THRESHOLD:
+        apply_scheme_permissions(users, concept_scheme, actions, revoke=revoke)
+        return
+    from .tasks import scheme_permissions
+
+    user_ids = [user.pk for user in users]
+    transaction.on_commit(lambda: scheme_permissions.delay(user_ids, concept_scheme.pk, list(actions), revoke=revoke))
+
+
+def collapse_scheme_permissions(concept_scheme, dry_run=False):
+    """
+    Deletes the object permissions on the collections and concepts of a concept
+    scheme held by its creator and curators, which VOCABS_SCHEME_PERMISSIONS
+    derives from the scheme. Returns the number of rows deleted, or that would be.
+    """
+    UserObjectPermission = get_user_obj_perms_model()
+    users = unique_users([concept_scheme.created_by, *concept_scheme.curator.all()])
+    if dry_run:
+        total = 0
+        for queryset in (concept_scheme.has_collections.all(), concept_scheme.has_concepts.all()):
+            content_type, permissions = model_permissions(queryset.model)
+            for object_pks in object_pk_batches(queryset):
+                total += UserObjectPermission.objects.filter(
+                    content_type=content_type, user__in=users, permission__in=permissions, object_pk__in=object_pks
+                ).count()
+        return total
+    return apply_scheme_permissions(users, concept_scheme, revoke=True)
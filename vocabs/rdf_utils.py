@@ -1,6 +1,9 @@
-import rdflib
+import re
+from xml.sax.saxutils import escape, quoteattr
+
 from django.conf import settings
-from rdflib import Literal, Namespace, URIRef
+from rdflib import RDF, XSD, BNode, Literal, Namespace, URIRef
+from rdflib.namespace import split_uri
 
 SKOS = Namespace("http://www.w3.org/2004/02/skos/core#")
 DC = Namespace("http://purl.org/dc/elements/1.1/")
@@ -22,32 +25,208 @@ RDF_FORMATS = {
     "nquads": "nq",
     "json-ld": ".jsonld",
 }
+# format of downloads and export tasks without one, written while the export runs, see STREAMING_SERIALIZERS
+DEFAULT_EXPORT_FORMAT = "xml"
+RDF_CONTENT_TYPES = {
+    "nt": "application/n-triples",
+    "turtle": "text/turtle",
+    "xml": "application/rdf+xml",
+}
+PREFIXES = {
+    "rdf": str(RDF),
+    "rdfs": str(RDFS),
+    "skos": str(SKOS),
+    "dc": str(DC),
+    "dcterms": str(DCT),
+    "owl": str(OWL),
+    "xsd": str(XSD),
+}
+LOCAL_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*")
+# size of the chunks written by the streaming serializers
+CHUNK_SIZE = 64 * 1024
+
+
+def graph_construct_qs(results, progress=None):
+    """
+    Builds the graph of the concepts in `results`, their scheme and collections,
+    `progress(phase, done, total)` is called after each concept
+    """
+    from .skos_export import SkosExporter
+
+    return SkosExporter(results, progress=progress).graph()
+
+
+def nt_escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+
+
+def nt_term(term):
+    """The N-Triples form of a URI, blank node or literal"""
+    if isinstance(term, Literal):
+        value = f'"{nt_escape(str(term))}"'
+        if term.language:
+            return f"{value}@{term.language}"
+        if term.datatype:
+            return f"{value}^^<{term.datatype}>"
+        return value
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    return f"<{term}>"
+
+
+def qname(uri):
+    """Returns `uri` as prefix:name if it is in one of PREFIXES, otherwise None"""
+    for prefix, namespace in PREFIXES.items():
+        name = uri.removeprefix(namespace) if uri.startswith(namespace) else ""
+        if LOCAL_NAME.fullmatch(name):
+            return f"{prefix}:{name}"
+    return None
+
+
+def group_by_subject(triples):
+    """Groups triples by subject and predicate, keeping their order"""
+    subjects = {}
+    for s, p, o in triples:
+        subjects.setdefault(s, {}).setdefault(p, []).append(o)
+    return subjects
+
+
+class StreamingSerializer(object):
+    """
+    Serializes the blocks of triples yielded by SkosExporter.blocks() one
+    after another, so a download or file is written while it is built
+    """
+
+    def header(self):
+        return ""
+
+    def footer(self):
+        return ""
+
+    def block(self, triples):
+        raise NotImplementedError
+
+    def serialize(self, blocks, chunk_size=CHUNK_SIZE):
+        """Yields the serialization in str chunks of about `chunk_size` characters"""
+        return self.chunks((self.block(triples) for triples in blocks), chunk_size)
+
+    def chunks(self, texts, chunk_size=CHUNK_SIZE):
+        """Yields the header, the serialized blocks `texts` and the footer in chunks of about `chunk_size`"""
+        chunk = [self.header()]
+        size = len(chunk[0])
+        for text in texts:
+            chunk.append(text)
+            size += len(text)
+            if size >= chunk_size:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        chunk.append(self.footer())
+        yield "".join(chunk)
+
+
+class NTriplesSerializer(StreamingSerializer):
+    def block(self, triples):
+        return "".join(f"{nt_term(s)} {nt_term(p)} {nt_term(o)} .\n" for s, p, o in triples)
+
+
+class TurtleSerializer(StreamingSerializer):
+    """Turtle with the triples of a block grouped by subject"""
+
+    def header(self):
+        return "".join(f"@prefix {prefix}: <{namespace}> .\n" for prefix, namespace in PREFIXES.items()) + "\n"
+
+    def term(self, term):
+        if isinstance(term, URIRef):
+            return qname(term) or nt_term(term)
+        if isinstance(term, Literal) and term.datatype and not term.language:
+            return f'"{nt_escape(str(term))}"^^{self.term(term.datatype)}'
+        return nt_term(term)
+
+    def block(self, triples):
+        lines = []
+        for subject, predicates in group_by_subject(triples).items():
+            statements = [
+                "{} {}".format(
+                    "a" if predicate == RDF.type else self.term(predicate),
+                    ", ".join(self.term(o) for o in objects),
+                )
+                for predicate, objects in predicates.items()
+            ]
+            lines.append("{} {} .\n\n".format(self.term(subject), " ;\n    ".join(statements)))
+        return "".join(lines)
+
+
+class XMLSerializer(StreamingSerializer):
+    """Flat RDF/XML with one rdf:Description per subject of a block"""
+
+    def header(self):
+        namespaces = "".join(f'\n   xmlns:{prefix}="{namespace}"' for prefix, namespace in PREFIXES.items())
+        return f'<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF{namespaces}\n>\n'
+
+    def footer(self):
+        return "</rdf:RDF>\n"
+
+    def element(self, predicate):
+        """The element name of `predicate` and the namespace declaration it needs"""
+        name = qname(predicate)
+        if name is not None:
+            return name, ""
+        namespace, local_name = split_uri(predicate)
+        return f"ns1:{local_name}", f" xmlns:ns1={quoteattr(namespace)}"
+
+    def property(self, predicate, o):
+        name, declaration = self.element(predicate)
+        if isinstance(o, URIRef):
+            return f"    <{name}{declaration} rdf:resource={quoteattr(o)}/>\n"
+        if isinstance(o, BNode):
+            return f"    <{name}{declaration} rdf:nodeID={quoteattr(o)}/>\n"
+        if o.language:
+            attributes = f" xml:lang={quoteattr(o.language)}"
+        elif o.datatype:
+            attributes = f" rdf:datatype={quoteattr(o.datatype)}"
+        else:
+            attributes = ""
+        return f"    <{name}{declaration}{attributes}>{escape(str(o))}</{name}>\n"
+
+    def block(self, triples):
+        lines = []
+        for subject, predicates in group_by_subject(triples).items():
+            attribute = "rdf:nodeID" if isinstance(subject, BNode) else "rdf:about"
+            lines.append(f"  <rdf:Description {attribute}={quoteattr(subject)}>\n")
+            for predicate, objects in predicates.items():
+                lines.extend(self.property(predicate, o) for o in objects)
+            lines.append("  </rdf:Description>\n")
+        return "".join(lines)
+
+
+STREAMING_SERIALIZERS = {
+    "nt": NTriplesSerializer,
+    "turtle": TurtleSerializer,
+    "xml": XMLSerializer,
+}
+
+
+def serialize_qs(results, export_format, progress=None, fragments=False):
+    """
+    Yields the graph of the concepts in `results` serialized in `export_format`,
+    the STREAMING_SERIALIZERS formats in chunks while the graph is built,
+    the other formats in one piece once it is built. With `fragments`, which
+    needs concepts of a single scheme, N-Triples are put together from the
+    stored fragments of the concepts and collections and only the missing ones are built.
+    """
+    from .skos_export import SkosExporter
+
+    exporter = SkosExporter(results, progress=progress)
+    if fragments and export_format == "nt":
+        yield from NTriplesSerializer().chunks(exporter.ntriples())
+    elif export_format in STREAMING_SERIALIZERS:
+        yield from STREAMING_SERIALIZERS[export_format]().serialize(exporter.blocks())
+    else:
+        yield exporter.graph().serialize(format=export_format)
 
 
-def graph_construct_qs(results):
-    g = rdflib.Graph()
-    main_concept_scheme = results.first().scheme.get_subject()
-    main_concept_scheme_graph = results.first().scheme.as_graph()
-    g = g + main_concept_scheme_graph
-    for obj in results:
-        concept = URIRef(obj.create_uri())
-        g.add((concept, SKOS.inScheme, main_concept_scheme))
-        g = g + obj.as_graph()
-        if obj.collection.all():
-            for x in obj.collection.all():
-                collection = x.get_subject()
-                collection_graph = x.as_graph()
-                g = g + collection_graph
-                if x.creator:
-                    for i in x.creator.split(";"):
-                        g.add((collection, DC.creator, Literal(i.strip())))
-                if x.contributor:
-                    for i in x.contributor.split(";"):
-                        g.add((collection, DC.contributor, Literal(i.strip())))
-                if x.has_members.all():
-                    for y in x.has_members.all():
-                        if y.legacy_id:
-                            g.add((collection, SKOS.member, URIRef(y.legacy_id)))
-                        else:
-                            g.add((collection, SKOS.member, URIRef(y.create_uri())))
-    return g
+def export_qs(results, export_format, path, progress=None):
+    """Writes the graph of the concepts in `results` in `export_format` to the file `path`"""
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in serialize_qs(results, export_format, progress=progress):
+            f.write(chunk)
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from .models import SkosConceptScheme, SkosCollection, SkosConcept
+from django.conf import settings
 from django.contrib.auth.models import User
 
+# URIs, notations and legacy ids resolved by one request
+RESOLVE_MAX = getattr(settings, "VOCABS_RESOLVE_MAX", 10000)
+
 
 class SkosConceptSchemeSerializer(serializers.ModelSerializer):
     has_concepts = serializers.HyperlinkedRelatedField(many=True, read_only=True, view_name="skosconcept-detail")
@@ -10,7 +14,7 @@ class SkosConceptSchemeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SkosConceptScheme
-        fields = "__all__"
+        exclude = ["content_version", "content_modified", "tree_version"]
 
 
 class SkosCollectionSerializer(serializers.ModelSerializer):
@@ -19,7 +23,7 @@ class SkosCollectionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SkosCollection
-        fields = "__all__"
+        exclude = ["import_hash"]
 
 
 class SkosConceptSerializer(serializers.ModelSerializer):
@@ -27,4 +31,18 @@ class SkosConceptSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SkosConcept
-        exclude = ["lft", "rght", "tree_id", "level"]
+        exclude = ["lft", "rght", "tree_id", "level", "import_hash"]
+
+
+class ConceptResolveSerializer(serializers.Serializer):
+    """URIs, notations and legacy ids to resolve to concept ids, optionally within one concept scheme"""
+
+    uris = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    notations = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    legacy_ids = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    scheme = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if len(data["uris"]) + len(data["notations"]) + len(data["legacy_ids"]) > RESOLVE_MAX:
+            raise serializers.ValidationError(f"At most {RESOLVE_MAX} values can be resolved at once")
+        return data
@@ -0,0 +1,334 @@
+from collections import defaultdict
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from rdflib import DC, RDF, SKOS, Graph, Literal, URIRef
+
+from .models import (
+    LABEL_PREDICATES,
+    NOTE_PREDICATES,
+    RELATION_FIELDS,
+    VOCABS_SEPARATOR,
+    CollectionLabel,
+    CollectionNote,
+    CollectionSource,
+    ConceptLabel,
+    ConceptNote,
+    ConceptRelation,
+    ConceptSource,
+    ExportFragment,
+    SkosCollection,
+    SkosConcept,
+    SkosConceptScheme,
+    concept_uri,
+)
+from .rdf_utils import NTriplesSerializer
+from .utils import predicate_plan
+
+RELATION_PREDICATES = {field: SkosConcept._meta.get_field(field).extra["predicate"] for field in RELATION_FIELDS}
+URI_FIELDS = ["id", "legacy_id", "notation", "scheme__identifier"]
+# concepts whose labels, notes, sources and relations are loaded together
+DEFAULT_BATCH_SIZE = getattr(settings, "VOCABS_EXPORT_BATCH_SIZE", 1000)
+
+
+def collection_uri(identifier, legacy_id, pk):
+    """The URI of a collection, see SkosCollection.create_uri()"""
+    if legacy_id:
+        return legacy_id
+    if not identifier.endswith(VOCABS_SEPARATOR):
+        identifier = f"{identifier}{VOCABS_SEPARATOR}"
+    return f"{identifier}collection{pk}"
+
+
+def row_concept_uri(row, prefix=""):
+    """The URI of a concept from a values() row with URI_FIELDS, optionally behind a relation `prefix`"""
+    fields = ("scheme__identifier", "legacy_id", "id", "notation")
+    return URIRef(concept_uri(*(row[prefix + field] for field in fields)))
+
+
+def group_by(rows, key):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(row)
+    return groups
+
+
+class TripleBlock(list):
+    """
+    The triples about one subject, with the add() of a graph so as_graph() can fill it.
+    add() skips duplicates with a set kept beside the list, append() is for triples
+    that can't be duplicates and are not looked up by a later add()
+    """
+
+    def __init__(self, triples=()):
+        super().__init__(triples)
+        self.triples = set(self)
+
+    def add(self, triple):
+        if triple not in self.triples:
+            self.triples.add(triple)
+            self.append(triple)
+        return self
+
+
+class SkosExporter(object):
+    """
+    Builds the graph of a queryset of concepts, their scheme and collections
+    with the same triples as SkosConcept.as_graph() and SkosCollection.as_graph().
+    The related rows are loaded with values() in a fixed number of queries per
+    batch of concepts instead of a few queries per concept. blocks() yields the
+    triples subject by subject, so they can be serialized while they are built.
+    """
+
+    def __init__(self, concepts, progress=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.concepts = concepts
+        self.progress = progress
+        self.batch_size = batch_size
+        # the relation fields are read from ConceptRelation instead of being split
+        self.concept_plan = predicate_plan(SkosConcept, exclude=RELATION_FIELDS)
+        self.collection_plan = predicate_plan(SkosCollection)
+
+    def concept_ids(self):
+        """The ids of the exported concepts as a subquery"""
+        return self.concepts.order_by().values("pk")
+
+    def batches(self, rows):
+        rows = rows.iterator(chunk_size=self.batch_size)
+        while batch := list(islice(rows, self.batch_size)):
+            yield batch
+
+    def concept_rows(self, concepts):
+        fields = URI_FIELDS + [
+            "pref_label",
+            "pref_label_lang",
+            "broader_concept_id",
+            "scheme__legacy_id",
+        ]
+        return concepts.values(*fields, *self.concept_plan.field_names)
+
+    def concept_batches(self):
+        return self.batches(self.concept_rows(self.concepts))
+
+    def concept_uris(self, rows):
+        """Maps the ids of a batch of concepts and of their broader concepts to their URIs"""
+        uris = {row["id"]: row_concept_uri(row) for row in rows}
+        broader_ids = {row["broader_concept_id"] for row in rows} - set(uris) - {None}
+        for row in SkosConcept.objects.filter(pk__in=broader_ids).values(*URI_FIELDS):
+            uris[row["id"]] = row_concept_uri(row)
+        return uris
+
+    def narrower_concepts(self, ids):
+        """Maps concept ids to the URIs of their narrower concepts"""
+        narrower = defaultdict(list)
+        queryset = SkosConcept.objects.filter(broader_concept_id__in=ids)
+        for row in queryset.values(*URI_FIELDS, "broader_concept_id"):
+            narrower[row["broader_concept_id"]].append(row_concept_uri(row))
+        return narrower
+
+    def related_rows(self, model, ids, *fields):
+        """The labels, notes or sources of concepts grouped by concept id"""
+        rows = model.objects.filter(concept_id__in=ids).values("concept_id", *fields)
+        return group_by(rows, "concept_id")
+
+    def scheme_block(self):
+        """The triples of the scheme of the first concept"""
+        first = self.concepts.select_related("scheme").first()
+        if first is None:
+            return TripleBlock()
+        self.concept_scheme = first.scheme
+        self.main_concept_scheme = first.scheme.get_subject()
+        return first.scheme.as_graph(TripleBlock())
+
+    def report_progress(self, done):
+        if self.progress is not None:
+            if not hasattr(self, "total"):
+                self.total = self.concepts.count()
+            self.progress("graph", done, self.total)
+
+    def concept_blocks(self):
+        done = 0
+        for rows in self.concept_batches():
+            for _, block in self.batch_blocks(rows):
+                yield block
+            done += len(rows)
+            self.report_progress(done)
+
+    def batch_blocks(self, rows):
+        """Yields the id and the triples of each concept of a batch of concept_rows()"""
+        ids = [row["id"] for row in rows]
+        uris = self.concept_uris(rows)
+        narrower = self.narrower_concepts(ids)
+        notes = self.related_rows(ConceptNote, ids, "name", "language", "note_type")
+        sources = self.related_rows(ConceptSource, ids, "name", "language")
+        labels = self.related_rows(ConceptLabel, ids, "name", "language", "label_type")
+        relations = self.related_rows(ConceptRelation, ids, "relation", "target")
+        for row in rows:
+            block = TripleBlock()
+            subj = uris[row["id"]]
+            concept_scheme = URIRef(row["scheme__legacy_id"] or row["scheme__identifier"])
+            block.add((subj, SKOS.inScheme, self.main_concept_scheme))
+            block.add((subj, RDF.type, SKOS.Concept))
+            block.add((subj, SKOS.prefLabel, Literal(row["pref_label"], lang=row["pref_label_lang"])))
+            block.add((subj, SKOS.inScheme, concept_scheme))
+            if row["notation"] != "":
+                block.add((subj, SKOS.notation, Literal(row["notation"])))
+            if row["broader_concept_id"]:
+                block.add((subj, SKOS.broader, uris[row["broader_concept_id"]]))
+            else:
+                block.add((concept_scheme, SKOS.hasTopConcept, subj))
+                block.add((subj, SKOS.topConceptOf, concept_scheme))
+            for uri in narrower[row["id"]]:
+                block.add((subj, SKOS.narrower, uri))
+            for note in notes[row["id"]]:
+                predicate = NOTE_PREDICATES.get(note["note_type"], SKOS.note)
+                block.add((subj, predicate, Literal(note["name"], lang=note["language"])))
+            for source in sources[row["id"]]:
+                block.add((subj, DC.source, Literal(source["name"], lang=source["language"])))
+            for label in labels[row["id"]]:
+                predicate = LABEL_PREDICATES.get(label["label_type"], SKOS.altLabel)
+                block.add((subj, predicate, Literal(label["name"], lang=label["language"])))
+            self.concept_plan.add_row(subj, row, block)
+            for relation in relations[row["id"]]:
+                block.add((subj, RELATION_PREDICATES[relation["relation"]], URIRef(relation["target"])))
+            yield row["id"], block
+
+    def concept_id_blocks(self, ids):
+        """Yields the id and the triples of each concept of `ids`"""
+        return self.batch_blocks(list(self.concept_rows(self.concepts.filter(pk__in=ids))))
+
+    def collection_ids(self):
+        """The ids of the collections of the exported concepts as a subquery"""
+        Membership = SkosConcept.collection.through
+        return Membership.objects.filter(skosconcept__in=self.concept_ids()).values("skoscollection_id")
+
+    def collection_blocks(self):
+        """
+        The triples of the collections of the exported concepts with all their
+        members, each collection once however many of its members are exported
+        """
+        for _, block in self.collection_id_blocks(self.collection_ids()):
+            yield block
+
+    def collection_id_blocks(self, collection_ids):
+        """Yields the id and the triples of each collection of `collection_ids` in the order of their ids"""
+        Membership = SkosConcept.collection.through
+        fields = ["id", "name", "label_lang", "legacy_id", "scheme__identifier"]
+        rows = (
+            SkosCollection.objects.filter(pk__in=collection_ids)
+            .order_by("id")
+            .values(*fields, *self.collection_plan.field_names)
+        )
+        labels = group_by(
+            CollectionLabel.objects.filter(collection__in=collection_ids).values(
+                "collection_id", "name", "language", "label_type"
+            ),
+            "collection_id",
+        )
+        notes = group_by(
+            CollectionNote.objects.filter(collection__in=collection_ids).values(
+                "collection_id", "name", "language", "note_type"
+            ),
+            "collection_id",
+        )
+        sources = group_by(
+            CollectionSource.objects.filter(collection__in=collection_ids).values("collection_id", "name", "language"),
+            "collection_id",
+        )
+        # the members of all collections in one query, read along with the collections
+        members = (
+            Membership.objects.filter(skoscollection__in=collection_ids)
+            .order_by("skoscollection_id")
+            .values(
+                "skoscollection_id",
+                "skosconcept__id",
+                "skosconcept__legacy_id",
+                "skosconcept__notation",
+                "skosconcept__scheme__identifier",
+            )
+        )
+        member_groups = groupby(members.iterator(chunk_size=self.batch_size), key=itemgetter("skoscollection_id"))
+        group = next(member_groups, None)
+        for row in list(rows):
+            block = TripleBlock()
+            subj = URIRef(collection_uri(row["scheme__identifier"], row["legacy_id"], row["id"]))
+            block.add((subj, RDF.type, SKOS.Collection))
+            if row["name"]:
+                block.add((subj, SKOS.prefLabel, Literal(row["name"], lang=row["label_lang"])))
+            for label in labels[row["id"]]:
+                predicate = LABEL_PREDICATES.get(label["label_type"], SKOS.altLabel)
+                block.add((subj, predicate, Literal(label["name"], lang=label["language"])))
+            for note in notes[row["id"]]:
+                predicate = NOTE_PREDICATES.get(note["note_type"], SKOS.note)
+                block.add((subj, predicate, Literal(note["name"], lang=note["language"])))
+            for source in sources[row["id"]]:
+                block.add((subj, DC.source, Literal(source["name"], lang=source["language"])))
+            self.collection_plan.add_row(subj, row, block)
+            if row["creator"]:
+                for i in row["creator"].split(";"):
+                    block.add((subj, DC.creator, Literal(i.strip())))
+            if row["contributor"]:
+                for i in row["contributor"].split(";"):
+                    block.add((subj, DC.contributor, Literal(i.strip())))
+            if group is not None and group[0] == row["id"]:
+                for member in group[1]:
+                    block.append((subj, SKOS.member, row_concept_uri(member, prefix="skosconcept__")))
+                group = next(member_groups, None)
+            yield row["id"], block
+
+    def blocks(self):
+        """Yields the triples of the scheme, each concept and each collection as lists"""
+        yield self.scheme_block()
+        yield from self.concept_blocks()
+        yield from self.collection_blocks()
+
+    def stored_fragments(self, field, ids, build):
+        """
+        Yields the N-Triples of the concepts or collections of `ids` from their
+        ExportFragment, the missing ones are built with `build(ids)` and stored
+        """
+        serializer = NTriplesSerializer()
+        stored = dict(ExportFragment.objects.filter(**{f"{field}__in": ids}).values_list(field, "ntriples"))
+        missing = [pk for pk in ids if pk not in stored]
+        built = {pk: serializer.block(block) for pk, block in build(missing)} if missing else {}
+        # a fragment built while its scheme is changed may already be outdated
+        current = SkosConceptScheme.objects.filter(
+            pk=self.concept_scheme.pk, content_version=self.concept_scheme.content_version
+        )
+        if built and current.exists():
+            ExportFragment.objects.bulk_create(
+                [ExportFragment(**{field: pk, "ntriples": text}) for pk, text in built.items()],
+                ignore_conflicts=True,
+            )
+        self.built[field] += len(built)
+        for pk in ids:
+            yield stored[pk] if pk in stored else built[pk]
+
+    def ntriples(self):
+        """
+        Yields the N-Triples of the scheme, each concept and each collection, with
+        the concepts and collections read from their ExportFragment if they have one.
+        Only the concepts of one scheme can be exported like this, the fragments
+        put each concept in its own scheme rather than in that of the first concept.
+        """
+        self.built = defaultdict(int)
+        serializer = NTriplesSerializer()
+        yield serializer.block(self.scheme_block())
+        if not hasattr(self, "concept_scheme"):
+            return
+        done = 0
+        for ids in self.batches(self.concepts.values_list("pk", flat=True)):
+            yield from self.stored_fragments("concept_id", ids, self.concept_id_blocks)
+            done += len(ids)
+            self.report_progress(done)
+        collection_ids = SkosCollection.objects.filter(pk__in=self.collection_ids()).order_by("id")
+        for ids in self.batches(collection_ids.values_list("pk", flat=True)):
+            yield from self.stored_fragments("collection_id", ids, self.collection_id_blocks)
+
+    def graph(self, g=None):
+        """Adds the triples of the scheme of the first concept, the concepts and their collections to `g`"""
+        g = Graph() if g is None else g
+        for block in self.blocks():
+            for triple in block:
+                g.add(triple)
+        return g
@@ -1,10 +1,27 @@
+import hashlib
+import io
+import json
 import logging
-import re
+import os
+import pathlib
+import socket
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
 
+import django
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
-from rdflib import RDF, SKOS, Namespace, URIRef
+from django.utils import timezone
+from rdflib import RDF, SKOS, BNode, Namespace, URIRef
+from rdflib.plugins.parsers.notation3 import RDFSink, SinkParser
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.util import guess_format
 
 from .models import (
     SKOS_RELATION_TYPES,
@@ -17,10 +34,17 @@ from .models import (
     ConceptSchemeSource,
     ConceptSchemeTitle,
     ConceptSource,
+    ImportCheckpoint,
+    ImportPendingLink,
     SkosCollection,
     SkosConcept,
     SkosConceptScheme,
+    bump_content_version,
+    bump_tree_version,
+    clear_scheme_fragments,
+    sync_relations,
 )
+from .permissions import grant_permissions
 from .utils import MyGraph as Graph
 
 logging.getLogger().setLevel(logging.INFO)
@@ -30,6 +54,130 @@ DCT = Namespace("http://purl.org/dc/terms/")
 RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
 OWL = Namespace("http://www.w3.org/2002/07/owl#")
 VOCABS = Namespace("https://vocabs.acdh.oeaw.ac.at/create-concept-scheme/")
+DEFAULT_BATCH_SIZE = getattr(settings, "VOCABS_IMPORT_BATCH_SIZE", 1000)
+# seconds after the last heartbeat of an import run before another delivery of its task may take it over
+IMPORT_LEASE = getattr(settings, "VOCABS_IMPORT_LEASE", 600)
+# size of the byte ranges N-Triples files are split into by the parallel import
+DEFAULT_CHUNK_SIZE = getattr(settings, "VOCABS_IMPORT_CHUNK_SIZE", 32 * 1024 * 1024)
+
+# file formats the streaming import can read without building a graph
+STREAMING_FORMATS = {
+    "nt": "nt",
+    "nt11": "nt",
+    "ntriples": "nt",
+    "ttl": "turtle",
+    "turtle": "turtle",
+}
+
+NOTE_PREDICATES = [
+    (SKOS.note, "note"),
+    (SKOS.definition, "definition"),
+    (SKOS.scopeNote, "scopeNote"),
+    (SKOS.changeNote, "changeNote"),
+    (SKOS.editorialNote, "editorialNote"),
+    (SKOS.historyNote, "historyNote"),
+    (SKOS.example, "example"),
+]
+SOURCE_PREDICATES = [DCT.source, DC.source]
+# the first of these predicates a concept scheme or collection has triples for is used for its labels
+LABEL_PREDICATES = [DC.title, RDFS.label, DCT.title, SKOS.prefLabel]
+CONCEPT_LABEL_PREDICATES = [SKOS.prefLabel, RDFS.label]
+# predicates read from the triples of a skos:Concept
+CONCEPT_PREDICATES = {
+    *CONCEPT_LABEL_PREDICATES,
+    SKOS.altLabel,
+    SKOS.hiddenLabel,
+    SKOS.inScheme,
+    SKOS.notation,
+    SKOS.broader,
+    *SOURCE_PREDICATES,
+    *(predicate for predicate, _ in NOTE_PREDICATES),
+    *(SKOS[rel_type[0]] for rel_type in SKOS_RELATION_TYPES),
+}
+
+
+def allow_properties(_property):
+    """Allow DC and DCT properties"""
+    properties = [
+        URIRef("http://purl.org/dc/terms/{}".format(_property)),
+        URIRef("http://purl.org/dc/elements/1.1/{}".format(_property)),
+    ]
+    return properties
+
+
+def group_objects(predicate_objects, predicates=None):
+    """Groups the objects of (predicate, object) pairs by predicate"""
+    objects = defaultdict(list)
+    for predicate, obj in predicate_objects:
+        if predicates is None or predicate in predicates:
+            objects[predicate].append(obj)
+    return objects
+
+
+def preferred_labels(objects, label_predicates):
+    for predicate in label_predicates:
+        if objects[predicate]:
+            return objects[predicate]
+    return []
+
+
+class SubjectGroupingSink(object):
+    """
+    Parser sink passing the triples of each subject as a list of
+    (predicate, object) pairs to `handler(subject, predicate_objects)`.
+    Triples of a subject are expected to be consecutive, as in subject sorted
+    N-Triples or Turtle. Only the current subject is kept, a subject coming
+    back is found by the loader, see SkosBulkLoader.check_subject().
+    Triples about blank nodes are skipped.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.subject = None
+        self.predicate_objects = []
+
+    def triple(self, s, p, o):
+        if isinstance(s, BNode):
+            return
+        if s != self.subject:
+            self.flush()
+            self.subject = s
+        self.predicate_objects.append((p, o))
+
+    def add(self, triple):
+        """Graph.add() used by the Turtle parser"""
+        self.triple(*triple)
+
+    def flush(self):
+        if self.subject is not None:
+            self.handler(self.subject, self.predicate_objects)
+        self.subject = None
+        self.predicate_objects = []
+
+
+class ImportInProgress(Exception):
+    """Another run of the import holds its checkpoint"""
+
+
+def claim_checkpoint(task_id, owner, create=True):
+    """
+    Locks the ImportCheckpoint of `task_id` until the current transaction ends
+    and makes `owner` its holder. Raises ImportInProgress if another run renewed
+    it less than IMPORT_LEASE seconds ago, and ImportCheckpoint.DoesNotExist if
+    it is missing and not `create`, which means that the import has finished.
+    """
+    with transaction.atomic():
+        if create:
+            ImportCheckpoint.objects.get_or_create(task_id=task_id)
+        checkpoint = ImportCheckpoint.objects.select_for_update().get(task_id=task_id)
+        now = timezone.now()
+        held = checkpoint.owner not in ("", owner) and checkpoint.heartbeat is not None
+        if held and now - checkpoint.heartbeat < timedelta(seconds=IMPORT_LEASE):
+            raise ImportInProgress(f"Import {task_id} is run by {checkpoint.owner}")
+        checkpoint.owner = owner
+        checkpoint.heartbeat = now
+        checkpoint.save(update_fields=["owner", "heartbeat"])
+    return checkpoint
 
 
 class SkosImporter(object):
@@ -37,10 +185,129 @@ class SkosImporter(object):
     Perform a file parsing and importing SKOS data in database
     """
 
-    def __init__(self, file, file_format=None, language=None):
+    def __init__(
+        self, file, file_format=None, language=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, resume_only=False
+    ):
         self.file = file
         self.file_format = file_format
         self.language = language
+        self.batch_size = batch_size
+        # called as progress(phase, done, total) while importing
+        self.progress = progress
+        # a redelivered task only resumes its checkpoint, it does not start the import again
+        self.resume_only = resume_only
+        self.timings = {}
+        self.unresolved_broader = []
+
+    def language_check(self, term):
+        """Returns the language of a literal or the specified language if it has none"""
+        language = getattr(term, "language", None)
+        if language:
+            return str(language)
+        return self.language
+
+    def concept_scheme_record(self, subject, predicate_objects):
+        """Builds the dictionary of a concept scheme from its (predicate, object) pairs"""
+        objects = group_objects(predicate_objects)
+        concept_scheme = {"identifier": str(subject)}
+        concept_scheme["title"] = [
+            {"title": str(title), "lang": self.language_check(title)}
+            for title in preferred_labels(objects, LABEL_PREDICATES)
+        ]
+        for _property in ["creator", "contributor", "language", "subject", "publisher"]:
+            concept_scheme[_property] = ";".join(str(o) for p in allow_properties(_property) for o in objects[p])
+        if objects[DCT.license]:
+            concept_scheme["license"] = str(objects[DCT.license][-1])
+        concept_scheme["description"] = [
+            {"name": str(d), "lang": self.language_check(d)}
+            for p in allow_properties("description")
+            for d in objects[p]
+        ]
+        concept_scheme["source"] = [
+            {"name": str(s), "lang": self.language_check(s)} for p in SOURCE_PREDICATES for s in objects[p]
+        ]
+        return concept_scheme
+
+    def collection_record(self, subject, predicate_objects):
+        """Builds the dictionary of a collection from its (predicate, object) pairs"""
+        objects = group_objects(predicate_objects)
+        collection = {"legacy_id": str(subject)}
+        collection["labels"] = [
+            {"label": str(label), "label_lang": self.language_check(label)}
+            for label in preferred_labels(objects, LABEL_PREDICATES)
+        ]
+        collection["members"] = [str(member) for member in objects[SKOS.member]]
+        collection["note"] = [
+            {"name": str(note), "lang": self.language_check(note), "note_type": note_type}
+            for predicate, note_type in NOTE_PREDICATES
+            for note in objects[predicate]
+        ]
+        collection["other_label"] = [
+            {"name": str(label), "lang": self.language_check(label), "label_type": label_type}
+            for predicate, label_type in [(SKOS.altLabel, "altLabel"), (SKOS.hiddenLabel, "hiddenLabel")]
+            for label in objects[predicate]
+        ]
+        collection["source"] = [
+            {"name": str(source), "lang": self.language_check(source)}
+            for predicate in SOURCE_PREDICATES
+            for source in objects[predicate]
+        ]
+        return collection
+
+    def concept_record(self, subject, predicate_objects, creator="", contributor=""):
+        """
+        Builds the dictionary of a concept from its (predicate, object) pairs in
+        a single pass. Objects are grouped by predicate through CONCEPT_PREDICATES,
+        the groups are then read in the order the SKOS properties are stored.
+        Concepts inherit creator and contributor of the concept scheme.
+        """
+        objects = group_objects(predicate_objects, CONCEPT_PREDICATES)
+        concept = {"legacy_id": str(subject)}
+        # process skos:exactMatch etc.
+        for rel_type in SKOS_RELATION_TYPES:
+            if objects[SKOS[rel_type[0]]]:
+                concept[rel_type[1]] = {f"{o}" for o in objects[SKOS[rel_type[0]]]}
+        concept["pref_label"] = [
+            {"label": str(label), "lang": self.language_check(label)}
+            for label in preferred_labels(objects, CONCEPT_LABEL_PREDICATES)
+        ]
+        if objects[SKOS.inScheme]:
+            concept["scheme"] = str(objects[SKOS.inScheme][-1])
+        if objects[SKOS.notation]:
+            concept["notation"] = str(objects[SKOS.notation][-1])
+        concept["creator"] = creator
+        concept["contributor"] = contributor
+        if objects[SKOS.broader]:
+            concept["broader_concept"] = str(objects[SKOS.broader][-1])
+        concept["alt_label"] = [
+            {"label": str(label), "lang": self.language_check(label)} for label in objects[SKOS.altLabel]
+        ]
+        concept["hidden_label"] = [
+            {"label": str(label), "lang": self.language_check(label)} for label in objects[SKOS.hiddenLabel]
+        ]
+        concept["source"] = [
+            {"name": str(source), "lang": self.language_check(source)}
+            for predicate in SOURCE_PREDICATES
+            for source in objects[predicate]
+        ]
+        concept["note"] = [
+            {"name": str(note), "lang": self.language_check(note), "note_type": note_type}
+            for predicate, note_type in NOTE_PREDICATES
+            for note in objects[predicate]
+        ]
+        return concept
+
+    def subject_records(self, subject, predicate_objects):
+        """Returns (rdf:type, record) pairs for the SKOS types of a subject"""
+        types = {obj for predicate, obj in predicate_objects if predicate == RDF.type}
+        records = []
+        if SKOS.ConceptScheme in types:
+            records.append((SKOS.ConceptScheme, self.concept_scheme_record(subject, predicate_objects)))
+        if SKOS.Collection in types:
+            records.append((SKOS.Collection, self.collection_record(subject, predicate_objects)))
+        if SKOS.Concept in types:
+            records.append((SKOS.Concept, self.concept_record(subject, predicate_objects)))
+        return records
 
     def _graph_read(self):
         """
@@ -62,78 +329,11 @@ class SkosImporter(object):
         concept_scheme = {}
         g = self._graph_read()
 
-        def allow_properties(_property):
-            """Allow DC and DCT properties"""
-            properties = [
-                URIRef("http://purl.org/dc/terms/{}".format(_property)),
-                URIRef("http://purl.org/dc/elements/1.1/{}".format(_property)),
-            ]
-            return properties
-
-        def language_check(property_lang):
-            """Check for language attributes, if they are absent set language to a specified language"""
-            if property_lang:
-                if str(property_lang) == "None":
-                    return self.language
-                else:
-                    return str(property_lang)
-            else:
-                return self.language
-
         # Parsing concept scheme
 
         if (None, RDF.type, SKOS.ConceptScheme) in g:
             for cs in g.subjects(RDF.type, SKOS.ConceptScheme):
-                concept_scheme["identifier"] = str(cs)
-                titles = []
-                # Set labels properties to recognize all possible labels
-                for title in g.preferredLabel(
-                    cs,
-                    labelProperties=(
-                        (DC.title),
-                        (RDFS.label),
-                        (DCT.title),
-                        (SKOS.prefLabel),
-                    ),
-                ):
-                    temp_title = {"title": str(title[1])}
-                    # If language attribute is absent populate it with a specified language
-                    if str(title[1].language) == "None":
-                        temp_title["lang"] = self.language
-                    else:
-                        temp_title["lang"] = str(title[1].language)
-                    titles.append(temp_title)
-                concept_scheme["title"] = titles
-                concept_scheme["creator"] = ";".join(
-                    [c for cp in allow_properties("creator") for c in g.objects(cs, cp)]
-                )
-                concept_scheme["contributor"] = ";".join(
-                    [contr for contrp in allow_properties("contributor") for contr in g.objects(cs, contrp)]
-                )
-                concept_scheme["language"] = ";".join(
-                    [lang for lp in allow_properties("language") for lang in g.objects(cs, lp)]
-                )
-                concept_scheme["subject"] = ";".join(
-                    [s for sp in allow_properties("subject") for s in g.objects(cs, sp)]
-                )
-                concept_scheme["publisher"] = ";".join(
-                    [p for pp in allow_properties("publisher") for p in g.objects(cs, pp)]
-                )
-                for license in g.objects(cs, DCT.license):
-                    concept_scheme["license"] = str(license)
-                descriptions = []
-                for descp in allow_properties("description"):
-                    for d in g.objects(cs, descp):
-                        temp_desc = {"name": str(d), "lang": language_check(d.language)}
-                        descriptions.append(temp_desc)
-                concept_scheme["description"] = descriptions
-                sources = []
-                for sp in allow_properties("source"):
-                    for s in g.objects(cs, sp):
-                        temp_s = {"name": str(s), "lang": language_check(s.language)}
-                        sources.append(temp_s)
-                concept_scheme["source"] = sources
-
+                concept_scheme.update(self.concept_scheme_record(cs, g.predicate_objects(cs)))
         else:
             raise Exception("rdf:type skos:ConceptScheme is not found")
 
@@ -142,73 +342,7 @@ class SkosImporter(object):
         if (None, RDF.type, SKOS.Collection) in g:
             collections = []
             for col in g.subjects(RDF.type, SKOS.Collection):
-                collection = {"legacy_id": str(col)}
-                labels = []
-                for label in g.preferredLabel(
-                    col,
-                    labelProperties=(
-                        (DC.title),
-                        (RDFS.label),
-                        (DCT.title),
-                        (SKOS.prefLabel),
-                    ),
-                ):
-                    temp_col_label = {"label": str(label[1])}
-                    if str(label[1].language):
-                        if str(label[1].language) == "None":
-                            temp_col_label["label_lang"] = self.language
-                        else:
-                            temp_col_label["label_lang"] = str(label[1].language)
-                    else:
-                        temp_col_label["label_lang"] = self.language
-                    labels.append(temp_col_label)
-                collection["labels"] = labels
-                members = []
-                for member in g.objects(col, SKOS.member):
-                    members.append(str(member))
-                collection["members"] = members
-                # Collection notes
-                col_notes = []
-                col_predicates = [
-                    SKOS.note,
-                    SKOS.definition,
-                    SKOS.scopeNote,
-                    SKOS.changeNote,
-                    SKOS.editorialNote,
-                    SKOS.historyNote,
-                    SKOS.example,
-                ]
-                for pred in col_predicates:
-                    for note in g.objects(col, pred):
-                        temp_note = {
-                            "name": str(note),
-                            "lang": language_check(note.language),
-                            "note_type": re.search("http.*#(.*)", str(pred)).group(1),
-                        }
-                        col_notes.append(temp_note)
-                collection["note"] = col_notes
-                # Collection other labels
-                col_labels = []
-                for pred in [SKOS.altLabel, SKOS.hiddenLabel]:
-                    for other_label in g.objects(col, pred):
-                        temp_other_label = {
-                            "name": str(other_label),
-                            "lang": language_check(other_label.language),
-                            "label_type": re.search("http.*#(.*)", str(pred)).group(1),
-                        }
-                        col_labels.append(temp_other_label)
-                collection["other_label"] = col_labels
-                # Collection sources
-                col_sources = []
-                for col_srcp in allow_properties("source"):
-                    for source in g.objects(col, col_srcp):
-                        temp_col_src = {
-                            "name": str(source),
-                            "lang": language_check(source.language),
-                        }
-                        col_sources.append(temp_col_src)
-                collection["source"] = col_sources
-                collections.append(collection)
+                collections.append(self.collection_record(col, g.predicate_objects(col)))
             concept_scheme["collections"] = collections
 
         else:
@@ -219,84 +353,12 @@ class SkosImporter(object):
         if (None, RDF.type, SKOS.Concept) in g:
             concepts = []
             for c in g.subjects(RDF.type, SKOS.Concept):
-                concept = {"legacy_id": str(c)}
-                # process skos:exactMatch etc.
-                for rel_type in SKOS_RELATION_TYPES:
-                    cur_subj = URIRef(concept["legacy_id"])
-                    pred = SKOS[rel_type[0]]
-                    if (cur_subj, pred, None) in g:
-                        concept[rel_type[1]] = set()
-                        for s, _, o in g.triples((cur_subj, pred, None)):
-                            concept[rel_type[1]].add(f"{o}")
-                # Concept pref labels
-                pref_labels = []
-                for pref_label in g.preferredLabel(c):
-                    label = {"label": str(pref_label[1])}
-                    if str(pref_label[1].language) == "None":
-                        label["lang"] = self.language
-                    else:
-                        label["lang"] = str(pref_label[1].language)
-                    pref_labels.append(label)
-                concept["pref_label"] = pref_labels
-                for scheme in g.objects(c, SKOS.inScheme):
-                    concept["scheme"] = str(scheme)
-                for notation in g.objects(c, SKOS.notation):
-                    concept["notation"] = str(notation)
-                concept["creator"] = ";".join([c for cp in allow_properties("creator") for c in g.objects(cs, cp)])
-                concept["contributor"] = ";".join(
-                    [contr for contrp in allow_properties("contributor") for contr in g.objects(cs, contrp)]
+                concept = self.concept_record(
+                    c,
+                    g.predicate_objects(c),
+                    creator=concept_scheme.get("creator", ""),
+                    contributor=concept_scheme.get("contributor", ""),
                 )
-                for broader_concept in g.objects(c, SKOS.broader):
-                    concept["broader_concept"] = str(broader_concept)
-                # Concept alt labels
-                alt_labels = []
-                for alt_label in g.objects(c, SKOS.altLabel):
-                    label = {
-                        "label": str(alt_label),
-                        "lang": language_check(alt_label.language),
-                    }
-                    alt_labels.append(label)
-                concept["alt_label"] = alt_labels
-                # Concept hidden labels
-                hidden_labels = []
-                for hidden_label in g.objects(c, SKOS.hiddenLabel):
-                    label = {
-                        "label": str(hidden_label),
-                        "lang": language_check(hidden_label.language),
-                    }
-                    hidden_labels.append(label)
-                concept["hidden_label"] = hidden_labels
-                # Concept sources
-                sources = []
-                for srcp in allow_properties("source"):
-                    for source in g.objects(c, srcp):
-                        temp_source = {
-                            "name": str(source),
-                            "lang": language_check(source.language),
-                        }
-                        sources.append(temp_source)
-                concept["source"] = sources
-                # Concept documentary notes
-                notes = []
-                predicates = [
-                    SKOS.note,
-                    SKOS.definition,
-                    SKOS.scopeNote,
-                    SKOS.changeNote,
-                    SKOS.editorialNote,
-                    SKOS.historyNote,
-                    SKOS.example,
-                ]
-                for pred in predicates:
-                    for note in g.objects(c, pred):
-                        temp_note = {
-                            "name": str(note),
-                            "lang": language_check(note.language),
-                            "note_type": re.search("http.*#(.*)", str(pred)).group(1),
-                        }
-                        notes.append(temp_note)
-                concept["note"] = notes
-                # Add concept to a list
                 concepts.append(concept)
             concept_scheme["has_concepts"] = concepts
         else:
@@ -304,255 +366,1208 @@ class SkosImporter(object):
             logging.info("Graph doesn't have concepts")
         return concept_scheme
 
-    def upload_data(self, user):
-        """
-        Creates and saves concept scheme and its concepts in a database
-        """
-        concept_scheme = self.parse_triples()
-        concept_scheme_uri = concept_scheme.get("identifier")
-        concept_scheme_creator = concept_scheme.get("creator", "")
-        concept_scheme_contributor = concept_scheme.get("contributor", "")
-        concept_scheme_language = concept_scheme.get("language", "")
-        concept_scheme_subject = concept_scheme.get("subject", "")
-        concept_scheme_publisher = concept_scheme.get("publisher", "")
-        concept_scheme_license = concept_scheme.get("license", "")
-        concept_scheme_description = concept_scheme.get("description")
-        concept_scheme_source = concept_scheme.get("source")
-        concept_scheme_has_concepts = concept_scheme.get("has_concepts")
-        concept_scheme_has_collections = concept_scheme.get("collections")
-        main_title = {}
-        other_titles = []
-        for title in concept_scheme.get("title"):
-            if title.get("lang") == self.language:
-                main_title["label"] = title.get("title")
-                main_title["lang"] = title.get("lang")
-            else:
-                other_title = {
-                    "label": title.get("title", "Empty title"),
-                    "lang": title.get("lang", self.language),
-                }
-                other_titles.append(other_title)
-        concept_scheme_title = main_title.get("label", "No title in specified language")
-        concept_scheme_title_lang = main_title.get("lang", self.language)
-        concept_scheme = SkosConceptScheme.objects.create(
-            identifier=concept_scheme_uri,
-            title=concept_scheme_title,
-            title_lang=concept_scheme_title_lang,
-            creator=concept_scheme_creator,
-            contributor=concept_scheme_contributor,
-            language=concept_scheme_language,
-            subject=concept_scheme_subject,
-            publisher=concept_scheme_publisher,
-            license=concept_scheme_license,
-            created_by=User.objects.get(username=user),
+    def get_loader(self, user, task_id=None):
+        """
+        Returns a SkosBulkLoader, with `task_id` its progress is saved in an
+        ImportCheckpoint and an interrupted import with that id is resumed.
+        The checkpoint is claimed for this run, see claim_checkpoint.
+        """
+        checkpoint = None
+        if task_id is not None:
+            owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            checkpoint = claim_checkpoint(task_id, owner, create=not self.resume_only)
+        loader = SkosBulkLoader(
+            user=User.objects.get(username=user),
+            language=self.language,
+            batch_size=self.batch_size,
+            checkpoint=checkpoint,
+            progress=self.progress,
         )
-        if len(other_titles) > 0:
-            for other in other_titles:
-                ConceptSchemeTitle.objects.create(
-                    concept_scheme=concept_scheme,
-                    name=other.get("label"),
-                    language=other.get("lang"),
+        loader.resume()
+        self.timings = loader.timings
+        self.unresolved_broader = loader.unresolved_broader
+        return loader
+
+    @contextmanager
+    def loading(self, user, task_id=None):
+        """
+        Yields the loader of get_loader(), if the import fails its checkpoint
+        is released so that the import can be resumed right away
+        """
+        loader = self.get_loader(user, task_id)
+        try:
+            yield loader
+        except BaseException:
+            loader.release_checkpoint()
+            raise
+
+    def upload_data(self, user, task_id=None):
+        """
+        Creates and saves concept scheme and its concepts in a database,
+        committing every `batch_size` records
+        """
+        with self.loading(user, task_id) as loader:
+            loader.report_progress("parse")
+            with loader.timer("parse"):
+                concept_scheme = self.parse_triples()
+            scheme_record = {
+                key: value for key, value in concept_scheme.items() if key not in ("collections", "has_concepts")
+            }
+            records = [(SKOS.ConceptScheme, scheme_record)]
+            # sorted, so a resumed import reads the records in the same order
+            for record_type, key in [(SKOS.Collection, "collections"), (SKOS.Concept, "has_concepts")]:
+                records.extend(
+                    (record_type, record)
+                    for record in sorted(concept_scheme.get(key) or [], key=lambda x: x["legacy_id"])
                 )
+            loader.total = len(records)
+            for record_type, record in records:
+                if loader.skip_subject():
+                    continue
+                loader.add_record(record_type, record)
+                loader.subject_done(record.get("legacy_id") or record.get("identifier", ""))
+            loader.finish()
+            if loader.concepts:
+                return loader.concept_scheme.get_absolute_url()
+            return
+
+    def stream_triples(self, sink):
+        """
+        Feeds the triples of the file to `sink` while parsing, without building
+        a graph. N-Triples are read line by line, Turtle is read as text and
+        parsed statement by statement.
+        """
+        file_format = STREAMING_FORMATS.get(self.file_format)
+        if file_format is None:
+            raise ValueError(f"Streaming import reads {', '.join(STREAMING_FORMATS)}, not {self.file_format}")
+        with open(self.file, "rb") as f:
+            if file_format == "nt":
+                W3CNTriplesParser(sink).parse(f)
+            else:
+                base_uri = pathlib.Path(self.file).absolute().as_uri()
+                SinkParser(RDFSink(sink), baseURI=base_uri, turtle=True).loadStream(f)
+        sink.flush()
+
+    def stream_data(self, user, task_id=None):
+        """
+        Imports subject sorted N-Triples or Turtle without loading the file into
+        a graph. The triples are grouped by subject into records which are
+        written in batches of `batch_size`, so memory use depends on the batch
+        size and the legacy_id -> pk maps rather than on the size of the file.
+        """
+        with self.loading(user, task_id) as loader:
+
+            def handle_subject(subject, predicate_objects):
+                if loader.skip_subject():
+                    return
+                records = self.subject_records(subject, predicate_objects)
+                loader.check_subject(subject, records)
+                for record_type, record in records:
+                    loader.add_record(record_type, record)
+                loader.subject_done(subject)
+
+            with loader.timer("stream"):
+                self.stream_triples(SubjectGroupingSink(handle_subject))
+            loader.finish()
+            if loader.concepts:
+                return loader.concept_scheme.get_absolute_url()
+            return
+
+    def read_records(self, handler, streaming=False, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Parses the file(s) like upload_data(), stream_data() or parallel_data()
+        and calls `handler(subject, records)` with the (rdf:type, record) pairs
+        of every subject
+        """
+
+        def handle_subject(subject, predicate_objects):
+            handler(subject, self.subject_records(subject, predicate_objects))
+
+        if workers:
+            for subjects in parallel_map(self.parse_jobs(chunk_size), workers):
+                for subject, records in subjects:
+                    handler(subject, records)
+        elif streaming:
+            self.stream_triples(SubjectGroupingSink(handle_subject))
         else:
-            pass
+            concept_scheme = self.parse_triples()
+            scheme_record = {
+                key: value for key, value in concept_scheme.items() if key not in ("collections", "has_concepts")
+            }
+            handler(scheme_record["identifier"], [(SKOS.ConceptScheme, scheme_record)])
+            for record_type, key in [(SKOS.Collection, "collections"), (SKOS.Concept, "has_concepts")]:
+                for record in concept_scheme.get(key) or []:
+                    handler(record["legacy_id"], [(record_type, record)])
+
+    def analyse(self, streaming=False, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Parses the file(s) without writing to the database and returns an
+        ImportStatistics report of the records and the parse time
+        """
+        statistics = ImportStatistics(language=self.language)
+
+        def handle_subject(subject, records):
+            for record_type, record in records:
+                statistics.add_record(record_type, record)
+
+        start = time.perf_counter()
+        self.read_records(handle_subject, streaming=streaming, workers=workers, chunk_size=chunk_size)
+        self.timings = {"parse": time.perf_counter() - start}
+        return statistics.report(timings=self.timings)
+
+    def update_data(self, user, concept_scheme, streaming=False, workers=None):
+        """
+        Updates an existing concept scheme from the file(s): concepts and
+        collections are matched by legacy_id and only the inserted, changed and
+        removed ones are written. Returns a summary of the changes.
+        """
+        updater = SkosSchemeUpdater(
+            user=User.objects.get(username=user),
+            concept_scheme=concept_scheme,
+            language=self.language,
+            batch_size=self.batch_size,
+            progress=self.progress,
+        )
+        self.timings = updater.timings
+        self.unresolved_broader = updater.unresolved_broader
+
+        def handle_subject(subject, records):
+            updater.check_subject(subject, records)
+            for record_type, record in records:
+                updater.add_record(record_type, record)
+            updater.subject_done(subject)
+
+        with updater.timer("stream"):
+            self.read_records(handle_subject, streaming=streaming, workers=workers)
+        return updater.finish()
+
+    def parse_jobs(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Splits the import into (function, args) jobs for the parallel import,
+        N-Triples files are split into byte ranges, other files are parsed whole
+        """
+        files = self.file if isinstance(self.file, (list, tuple)) else [self.file]
+        jobs = []
+        for path in files:
+            file_format = self.file_format or guess_format(str(path))
+            if STREAMING_FORMATS.get(file_format) == "nt":
+                for start, end in ntriples_ranges(path, chunk_size):
+                    jobs.append((parse_ntriples_range, (path, self.language, start, end)))
+            else:
+                jobs.append((parse_file, (path, file_format, self.language)))
+        return jobs
+
+    def parallel_data(self, user, workers=None, task_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Parses one or several files in a pool of `workers` processes. Every worker
+        returns the records of its part of the input and they are written in
+        input order by this process. Triples of a subject have to be consecutive
+        in N-Triples files and in one file if several are imported.
+        """
+        with self.loading(user, task_id) as loader:
+            with loader.timer("stream"):
+                for subjects in parallel_map(self.parse_jobs(chunk_size), workers):
+                    for subject, records in subjects:
+                        if loader.skip_subject():
+                            continue
+                        loader.check_subject(subject, records)
+                        for record_type, record in records:
+                            loader.add_record(record_type, record)
+                        loader.subject_done(subject)
+            loader.finish()
+            if loader.concepts:
+                return loader.concept_scheme.get_absolute_url()
+            return
+
+
+class ImportStatistics(object):
+    """Counts the records of an import for SkosImporter.analyse()"""
+
+    def __init__(self, language=None):
+        self.language = language
+        self.concept_schemes = 0
+        self.collections = 0
+        self.concepts = set()
+        self.labels = 0
+        self.languages = set()
+        self.broader = []
+        self.missing_pref_label = []
+        self.missing_main_label = 0
+
+    def add_labels(self, labels, lang_key="lang"):
+        self.labels += len(labels)
+        self.languages.update(label.get(lang_key) for label in labels if label.get(lang_key))
+
+    def add_record(self, record_type, record):
+        if record_type == SKOS.ConceptScheme:
+            self.concept_schemes += 1
+        elif record_type == SKOS.Collection:
+            self.collections += 1
+            self.add_labels(record.get("labels") or [], lang_key="label_lang")
+            self.add_labels(record.get("other_label") or [])
+        elif record_type == SKOS.Concept:
+            self.concepts.add(record["legacy_id"])
+            pref_labels = record.get("pref_label") or []
+            if not pref_labels:
+                self.missing_pref_label.append(record["legacy_id"])
+            elif self.language not in {label.get("lang") for label in pref_labels}:
+                self.missing_main_label += 1
+            self.add_labels(pref_labels)
+            self.add_labels(record.get("alt_label") or [])
+            self.add_labels(record.get("hidden_label") or [])
+            if record.get("broader_concept") is not None:
+                self.broader.append((record["legacy_id"], record["broader_concept"]))
+
+    def report(self, timings=None):
+        """Returns the statistics as a JSON serialisable dictionary"""
+        broken_broader = [(legacy_id, broader) for legacy_id, broader in self.broader if broader not in self.concepts]
+        return {
+            "concept_schemes": self.concept_schemes,
+            "collections": self.collections,
+            "concepts": len(self.concepts),
+            "labels": self.labels,
+            "languages": sorted(self.languages),
+            "broken_broader": len(broken_broader),
+            "broken_broader_examples": broken_broader[:10],
+            "missing_pref_label": len(self.missing_pref_label),
+            "missing_pref_label_examples": self.missing_pref_label[:10],
+            "missing_main_language_label": self.missing_main_label,
+            "timings": timings or {},
+        }
+
+
+def canonical(value):
+    """Sorts lists and sets of a record recursively, so equal records serialise equally"""
+    if isinstance(value, dict):
+        return {key: canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, set, tuple)):
+        return sorted((canonical(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+def record_hash(record):
+    """
+    Hash of a parsed collection or concept record, creator and contributor are
+    left out as concepts inherit them from the concept scheme
+    """
+    data = {key: value for key, value in record.items() if key not in ("creator", "contributor")}
+    return hashlib.sha1(json.dumps(canonical(data), sort_keys=True).encode()).hexdigest()
+
+
+def ntriples_ranges(path, chunk_size):
+    """
+    Splits a subject sorted N-Triples file into (start, end) byte ranges of
+    about `chunk_size` bytes, each range ends where a new subject begins
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                ranges.append((start, size))
+                break
+            f.seek(end)
+            f.readline()
+            subject = None
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if not line:
+                    position = size
+                    break
+                parts = line.split(None, 1)
+                if not parts or parts[0].startswith(b"#"):
+                    continue
+                if subject is not None and parts[0] != subject:
+                    break
+                subject = parts[0]
+            ranges.append((start, position))
+            start = position
+    return ranges
+
+
+def parse_ntriples_range(path, language, start, end):
+    """Parses a byte range of an N-Triples file into (subject, records) pairs"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    importer = SkosImporter(file=path, file_format="nt", language=language)
+    subjects = []
+    sink = SubjectGroupingSink(
+        lambda subject, predicate_objects: subjects.append(
+            (str(subject), importer.subject_records(subject, predicate_objects))
+        )
+    )
+    W3CNTriplesParser(sink).parse(io.BytesIO(data))
+    sink.flush()
+    return subjects
+
+
+def parse_file(path, file_format, language):
+    """Parses a whole file into (subject, records) pairs sorted by subject"""
+    importer = SkosImporter(file=path, file_format=file_format, language=language)
+    g = importer._graph_read()
+    subjects = {
+        subject
+        for rdf_type in (SKOS.ConceptScheme, SKOS.Collection, SKOS.Concept)
+        for subject in g.subjects(RDF.type, rdf_type)
+        if not isinstance(subject, BNode)
+    }
+    return [
+        (str(subject), importer.subject_records(subject, list(g.predicate_objects(subject))))
+        for subject in sorted(subjects)
+    ]
+
+
+def parallel_map(jobs, workers=None):
+    """
+    Runs (function, args) jobs in a process pool and yields their results in
+    order, at most two jobs per worker are queued ahead of the consumer
+    """
+    workers = workers or os.cpu_count()
+    # django.setup() lets workers import the models if they don't fork
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        futures = deque()
+        for function, args in jobs:
+            futures.append(executor.submit(function, *args))
+            if len(futures) >= workers * 2:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
 
-        if concept_scheme_description:
-            for desc in concept_scheme_description:
-                ConceptSchemeDescription.objects.create(
-                    concept_scheme=concept_scheme,
-                    name=desc.get("name"),
-                    language=desc.get("lang"),
+class SkosBulkLoader(object):
+    """
+    Writes a parsed concept scheme to the database, inserting collections,
+    concepts and their labels, notes and sources in batches of `batch_size` rows
+    """
+
+    def __init__(self, user, language=None, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, progress=None):
+        self.user = user
+        self.language = language
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.concept_scheme = None
+        self.collections = {}
+        self.concepts = {}
+        self.unresolved_broader = []
+        self.timings = {}
+        # state of the chunked import, see add_record()
+        self.position = 0
+        # number of subjects, if it is known before they are written
+        self.total = None
+        self.last_subject = ""
+        self.has_concept_scheme_record = False
+        self.concept_scheme_record = {}
+        self.pending_concept_scheme = None
+        self.pending_collections = []
+        self.pending_concepts = []
+        self.pending_concept_ids = set()
+        self.pending_collection_ids = set()
+        # subjects without SKOS records, the others are found again by their legacy_id, see check_subject()
+        self.untyped_subjects = set()
+        # broader URI -> legacy_ids of the narrower concepts, member URI -> legacy_ids of the collections
+        self.pending_broader = defaultdict(list)
+        self.collection_index = defaultdict(list)
+
+    @contextmanager
+    def timer(self, phase):
+        """Adds the wall time spent in the block to `self.timings[phase]`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start
+
+    def report_progress(self, phase):
+        if self.progress is not None:
+            self.progress(phase, self.position, self.total)
+
+    def log_timings(self):
+        timings = ", ".join(f"{phase}: {seconds:.2f}s" for phase, seconds in self.timings.items())
+        logging.info(f"Import of {self.concept_scheme} finished ({timings})")
+
+    def bulk_create(self, model, objs):
+        return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def split_labels(self, labels, label_key="label", lang_key="lang", default_label=None):
+        """
+        Returns the label in the main language of the import and a list of
+        (label, language) tuples of all other labels
+        """
+        main_label = {}
+        other_labels = []
+        for label in labels:
+            if label.get(lang_key) == self.language:
+                main_label = {"label": label.get(label_key), "lang": label.get(lang_key)}
+            else:
+                other_labels.append((label.get(label_key, default_label), label.get(lang_key, self.language)))
+        return main_label, other_labels
+
+    def concept_scheme_fields(self, concept_scheme):
+        """Returns the SkosConceptScheme fields of a concept scheme record"""
+        main_title, _ = self.split_labels(
+            concept_scheme.get("title") or [], label_key="title", default_label="Empty title"
+        )
+        return {
+            "identifier": concept_scheme.get("identifier"),
+            "title": main_title.get("label", "No title in specified language"),
+            "title_lang": main_title.get("lang", self.language),
+            "creator": concept_scheme.get("creator", ""),
+            "contributor": concept_scheme.get("contributor", ""),
+            "language": concept_scheme.get("language", ""),
+            "subject": concept_scheme.get("subject", ""),
+            "publisher": concept_scheme.get("publisher", ""),
+            "license": concept_scheme.get("license", ""),
+        }
+
+    def concept_scheme_rows(self, concept_scheme):
+        """Returns the titles, descriptions and sources of a concept scheme record"""
+        _, other_titles = self.split_labels(
+            concept_scheme.get("title") or [], label_key="title", default_label="Empty title"
+        )
+        titles = [
+            ConceptSchemeTitle(concept_scheme=self.concept_scheme, name=name, language=lang)
+            for name, lang in other_titles
+        ]
+        descriptions = [
+            ConceptSchemeDescription(
+                concept_scheme=self.concept_scheme,
+                name=desc.get("name"),
+                language=desc.get("lang"),
+            )
+            for desc in concept_scheme.get("description") or []
+        ]
+        sources = [
+            ConceptSchemeSource(
+                concept_scheme=self.concept_scheme,
+                name=source.get("name"),
+                language=source.get("lang"),
+            )
+            for source in concept_scheme.get("source") or []
+        ]
+        return titles, descriptions, sources
+
+    def create_concept_scheme(self, concept_scheme):
+        with self.timer("scheme"):
+            fields = self.concept_scheme_fields(concept_scheme)
+            if self.concept_scheme is None:
+                self.concept_scheme = SkosConceptScheme.objects.create(created_by=self.user, **fields)
+            else:
+                # the streaming import creates the scheme before its triples are read
+                for field, value in fields.items():
+                    setattr(self.concept_scheme, field, value)
+                self.concept_scheme.save()
+            for model, objs in zip(
+                (ConceptSchemeTitle, ConceptSchemeDescription, ConceptSchemeSource),
+                self.concept_scheme_rows(concept_scheme),
+            ):
+                self.bulk_create(model, objs)
+        return self.concept_scheme
+
+    def collection_fields(self, col):
+        """Returns the SkosCollection fields of a collection record"""
+        main_label, _ = self.split_labels(col.get("labels"), lang_key="label_lang", default_label="other label")
+        return {
+            "name": main_label.get("label", "no label in specified language"),
+            "legacy_id": col.get("legacy_id"),
+            "label_lang": main_label.get("lang", self.language),
+            "import_hash": record_hash(col),
+        }
+
+    def collection_rows(self, collection, col):
+        """Returns the labels, notes and sources of a collection record"""
+        _, other_labels = self.split_labels(col.get("labels"), lang_key="label_lang", default_label="other label")
+        labels = [
+            CollectionLabel(collection=collection, name=name, language=lang, label_type="prefLabel")
+            for name, lang in other_labels
+        ]
+        notes = [
+            CollectionNote(
+                collection=collection,
+                name=cn.get("name"),
+                language=cn.get("lang"),
+                note_type=cn.get("note_type"),
+            )
+            for cn in col.get("note") or []
+        ]
+        labels.extend(
+            CollectionLabel(
+                collection=collection,
+                name=cahl.get("name"),
+                language=cahl.get("lang"),
+                label_type=cahl.get("label_type"),
+            )
+            for cahl in col.get("other_label") or []
+        )
+        sources = [
+            CollectionSource(collection=collection, name=csrc.get("name"), language=csrc.get("lang"))
+            for csrc in col.get("source") or []
+        ]
+        return labels, notes, sources
+
+    def create_collections(self, collections):
+        if not collections:
+            return
+        with self.timer("collections"):
+            new_collections = []
+            labels = []
+            notes = []
+            sources = []
+            for col in collections:
+                new_collection = SkosCollection(
+                    scheme=self.concept_scheme, created_by=self.user, **self.collection_fields(col)
                 )
-        else:
-            pass
-        if concept_scheme_source:
-            for source in concept_scheme_source:
-                ConceptSchemeSource.objects.create(
-                    concept_scheme=concept_scheme,
-                    name=source.get("name"),
-                    language=source.get("lang"),
+                new_collections.append(new_collection)
+                col_labels, col_notes, col_sources = self.collection_rows(new_collection, col)
+                labels.extend(col_labels)
+                notes.extend(col_notes)
+                sources.extend(col_sources)
+            self.bulk_create(SkosCollection, new_collections)
+            self.assign_permissions([SkosCollection.objects.filter(pk__in=[x.pk for x in new_collections])])
+            self.bulk_create(CollectionLabel, labels)
+            self.bulk_create(CollectionNote, notes)
+            self.bulk_create(CollectionSource, sources)
+            for new_collection in new_collections:
+                self.collections[new_collection.legacy_id] = new_collection
+
+    def concept_fields(self, concept):
+        """Returns the SkosConcept fields of a concept record, without the tree fields"""
+        main_pref_label, _ = self.split_labels(concept.get("pref_label"))
+        fields = {
+            "legacy_id": concept.get("legacy_id"),
+            "pref_label": main_pref_label.get("label", "no label in this language"),
+            "pref_label_lang": main_pref_label.get("lang", self.language),
+            "notation": concept.get("notation", ""),
+            "creator": concept.get("creator", ""),
+            "contributor": concept.get("contributor", ""),
+            "import_hash": record_hash(concept),
+        }
+        for rel_type in SKOS_RELATION_TYPES:
+            fields[rel_type[1]] = ",".join(sorted(concept.get(rel_type[1]) or []))
+        return fields
+
+    def concept_rows(self, new_concept, concept):
+        """Returns the labels, notes and sources of a concept record"""
+        _, other_pref_labels = self.split_labels(concept.get("pref_label"))
+        labels = [
+            ConceptLabel(concept=new_concept, name=name, language=lang, label_type="prefLabel")
+            for name, lang in other_pref_labels
+        ]
+        for label_type, key in [("altLabel", "alt_label"), ("hiddenLabel", "hidden_label")]:
+            labels.extend(
+                ConceptLabel(
+                    concept=new_concept,
+                    name=label.get("label"),
+                    language=label.get("lang"),
+                    label_type=label_type,
                 )
-        else:
-            pass
+                for label in concept.get(key) or []
+            )
+        notes = [
+            ConceptNote(
+                concept=new_concept,
+                name=n.get("name"),
+                language=n.get("lang"),
+                note_type=n.get("note_type"),
+            )
+            for n in concept.get("note") or []
+        ]
+        sources = [
+            ConceptSource(concept=new_concept, name=s.get("name"), language=s.get("lang"))
+            for s in concept.get("source") or []
+        ]
+        return labels, notes, sources
+
+    def create_concepts(self, concepts, collection_index=None):
+        """
+        Inserts the concepts, each as the only node of a tree of its own until
+        `rebuild_tree` builds the hierarchy, so the committed chunks of an
+        unfinished import are valid trees. `collection_index` maps member URIs
+        to the legacy ids of the collections they belong to.
+        """
+        if not concepts:
+            return
+        collection_index = collection_index or {}
+        with self.timer("concepts"):
+            first_tree_id = SkosConcept.objects.allocate_tree_ids(len(concepts))
+            new_concepts = []
+            labels = []
+            notes = []
+            sources = []
+            memberships = []
+            for index, concept in enumerate(concepts):
+                new_concept = SkosConcept(
+                    scheme=self.concept_scheme,
+                    created_by=self.user,
+                    lft=1,
+                    rght=2,
+                    tree_id=first_tree_id + index,
+                    level=0,
+                    **self.concept_fields(concept),
+                )
+                new_concepts.append(new_concept)
+                # concept to collections
+                for col_legacy_id in collection_index.get(concept.get("legacy_id"), []):
+                    memberships.append((new_concept, self.collections[col_legacy_id]))
+                concept_labels, concept_notes, concept_sources = self.concept_rows(new_concept, concept)
+                labels.extend(concept_labels)
+                notes.extend(concept_notes)
+                sources.extend(concept_sources)
+            self.bulk_create(SkosConcept, new_concepts)
+            self.assign_permissions([SkosConcept.objects.filter(pk__in=[x.pk for x in new_concepts])])
+            for new_concept in new_concepts:
+                self.concepts[new_concept.legacy_id] = new_concept.id
+            self.bulk_create(ConceptLabel, labels)
+            self.bulk_create(ConceptNote, notes)
+            self.bulk_create(ConceptSource, sources)
+            self.create_memberships((new_concept.id, collection.id) for new_concept, collection in memberships)
+
+    def create_memberships(self, memberships):
+        """Inserts (concept pk, collection pk) pairs into the SkosConcept.collection table"""
+        Membership = SkosConcept.collection.through
+        self.bulk_create(
+            Membership,
+            [
+                Membership(skosconcept_id=concept_id, skoscollection_id=collection_id)
+                for concept_id, collection_id in memberships
+            ],
+        )
+
+    def link_broader_concepts(self, links):
+        """
+        Sets broader_concept for (legacy_id, broader URI) pairs from the legacy_id -> pk
+        map of the inserted concepts, broader URIs that are not a concept of the
+        imported scheme are collected in `self.unresolved_broader`
+        """
+        with self.timer("relations"):
+            updates = []
+            for legacy_id, broader_concept in links:
+                broader_id = self.concepts.get(broader_concept)
+                if broader_id is None:
+                    self.unresolved_broader.append((legacy_id, broader_concept))
+                else:
+                    updates.append(SkosConcept(id=self.concepts[legacy_id], broader_concept_id=broader_id))
+            SkosConcept.objects.bulk_update(updates, ["broader_concept"], batch_size=self.batch_size)
+        if self.unresolved_broader:
+            examples = ", ".join(f"{legacy_id} -> {broader}" for legacy_id, broader in self.unresolved_broader[:10])
+            logging.warning(
+                f"{len(self.unresolved_broader)} broader concepts could not be resolved in "
+                f"{self.concept_scheme}: {examples}"
+            )
+
+    def rebuild_tree(self):
+        with self.timer("tree"):
+            SkosConcept.objects.rebuild_scheme(self.concept_scheme, batch_size=self.batch_size)
+
+    def assign_permissions(self, querysets=None):
+        """
+        Grants the object permissions the post_save signals would have granted,
+        bulk_create does not send them. They are granted with each chunk, so
+        editors see the rows of an unfinished import. Without `querysets` they
+        are granted on all collections and concepts of the scheme.
+        """
+        with self.timer("permissions"):
+            users = [self.user]
+            curators = list(self.concept_scheme.curator.all())
+            if curators:
+                users.extend(curators)
+                users.append(self.concept_scheme.created_by)
+            if querysets is None:
+                querysets = [
+                    model.objects.filter(scheme=self.concept_scheme) for model in (SkosCollection, SkosConcept)
+                ]
+            for queryset in querysets:
+                grant_permissions(users, queryset, batch_size=self.batch_size)
+
+    def resume(self):
+        """
+        Restores the state saved in `self.checkpoint`, the legacy_id -> pk maps
+        are rebuilt from the rows written before the checkpoint
+        """
+        if self.checkpoint is None or self.checkpoint.concept_scheme is None:
+            return
+        self.concept_scheme = self.checkpoint.concept_scheme
+        self.collections = {
+            collection.legacy_id: collection for collection in SkosCollection.objects.filter(scheme=self.concept_scheme)
+        }
+        self.concepts = dict(SkosConcept.objects.filter(scheme=self.concept_scheme).values_list("legacy_id", "id"))
+        state = self.checkpoint.state
+        self.has_concept_scheme_record = state.get("has_concept_scheme_record", False)
+        self.concept_scheme_record = state.get("concept_scheme_record", {})
+        pending = {ImportPendingLink.BROADER: self.pending_broader, ImportPendingLink.MEMBER: self.collection_index}
+        for kind, source, target in self.checkpoint.pending_links.values_list("kind", "source", "target"):
+            pending[kind][target].append(source)
+        self.unresolved_broader.extend(tuple(link) for link in state.get("unresolved_broader", []))
+        logging.info(
+            f"Resuming import of {self.concept_scheme} after {self.checkpoint.position} subjects "
+            f"({self.checkpoint.last_subject})"
+        )
+
+    def renew_checkpoint(self):
+        """
+        Locks the checkpoint for the transaction of a flush, a run whose
+        checkpoint was taken over by another delivery of the task stops here
+        """
+        if self.checkpoint is not None:
+            self.checkpoint = claim_checkpoint(self.checkpoint.task_id, self.checkpoint.owner, create=False)
+
+    def release_checkpoint(self):
+        if self.checkpoint is not None:
+            ImportCheckpoint.objects.filter(pk=self.checkpoint.pk, owner=self.checkpoint.owner).update(
+                owner="", heartbeat=None
+            )
+
+    def save_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        self.checkpoint.concept_scheme = self.concept_scheme
+        self.checkpoint.position = self.position
+        self.checkpoint.last_subject = self.last_subject
+        self.checkpoint.state = {
+            "has_concept_scheme_record": self.has_concept_scheme_record,
+            "concept_scheme_record": self.concept_scheme_record,
+            "unresolved_broader": self.unresolved_broader,
+        }
+        self.checkpoint.save()
+
+    def save_pending_links(self, added, resolved):
+        """
+        Writes the changes of a flush to the pending links of the checkpoint,
+        `added` are (kind, source, target) triples and `resolved` the targets
+        whose links were written
+        """
+        if self.checkpoint is None:
+            return
+        resolved = iter(resolved)
+        while batch := list(islice(resolved, self.batch_size)):
+            self.checkpoint.pending_links.filter(target__in=batch).delete()
+        ImportPendingLink.objects.bulk_create(
+            [
+                ImportPendingLink(checkpoint=self.checkpoint, kind=kind, source=source, target=target)
+                for kind, source, target in added
+            ],
+            batch_size=self.batch_size,
+        )
 
+    def skip_subject(self):
+        """True for the subjects that were written before the checkpoint"""
+        if self.checkpoint is not None and self.position < self.checkpoint.position:
+            self.position += 1
+            return True
+        return False
+
+    def add_record(self, record_type, record):
+        """
+        Buffers a record of the chunked import, the buffers are written by
+        `flush` once they hold `batch_size` records
+        """
+        if record_type == SKOS.ConceptScheme:
+            self.has_concept_scheme_record = True
+            self.concept_scheme_record = record
+            self.pending_concept_scheme = record
+        elif record_type == SKOS.Collection:
+            self.pending_collection_ids.add(record["legacy_id"])
+            self.pending_collections.append(record)
+        elif record_type == SKOS.Concept:
+            legacy_id = record["legacy_id"]
+            if legacy_id in self.concepts or legacy_id in self.pending_concept_ids:
+                raise ValueError(f"Triples about {legacy_id} are not consecutive, sort the file by subject")
+            self.pending_concept_ids.add(legacy_id)
+            self.pending_concepts.append(record)
+
+    def has_subject(self, legacy_id):
+        """True if records of the subject `legacy_id` were read before"""
+        if legacy_id == self.concept_scheme_record.get("identifier"):
+            return True
+        records = (self.concepts, self.pending_concept_ids, self.collections, self.pending_collection_ids)
+        return any(legacy_id in ids for ids in records)
+
+    def check_subject(self, subject, records):
+        """
+        Raises a ValueError if triples of `subject` came before, e.g. in an
+        unsorted file. Subjects with records are found by the legacy_ids the
+        loader keeps anyway, only the few subjects without a SKOS type are
+        remembered by their URI.
+        """
+        subject = str(subject)
+        if subject in self.untyped_subjects or self.has_subject(subject):
+            raise ValueError(f"Triples about {subject} are not consecutive, sort the file by subject")
+        if not records:
+            self.untyped_subjects.add(subject)
+
+    def subject_done(self, subject):
+        """
+        Marks the records of `subject` as complete, buffers are only flushed
+        between subjects so a checkpoint never splits the records of one subject
+        """
+        self.position += 1
+        self.last_subject = str(subject)
+        if len(self.pending_collections) + len(self.pending_concepts) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records and the checkpoint in one transaction.
+        Collection memberships and broader links are written as soon as both
+        ends are in the database, until then they wait in `collection_index`
+        and `pending_broader`
+        """
         with transaction.atomic():
-            if concept_scheme_has_collections:
-                for col in concept_scheme_has_collections:
-                    col_notes = col.get("note", "")
-                    col_alt_hid_labels = col.get("other_label", "")
-                    col_sources = col.get("source", "")
-                    col_main_label = {}
-                    col_other_labels = []
-                    for label in col.get("labels"):
-                        if label.get("label_lang") == self.language:
-                            col_main_label["label"] = label.get("label")
-                            col_main_label["lang"] = label.get("label_lang")
+            self.renew_checkpoint()
+            if self.pending_concept_scheme is not None:
+                self.create_concept_scheme(self.pending_concept_scheme)
+                self.pending_concept_scheme = None
+            elif self.concept_scheme is None:
+                # concepts came before the concept scheme, its fields are set once its triples are read
+                self.create_concept_scheme({})
+            memberships = []
+            members = []
+            if self.pending_collections:
+                self.create_collections(self.pending_collections)
+                for col in self.pending_collections:
+                    for member in col["members"]:
+                        if member in self.concepts:
+                            memberships.append((self.concepts[member], self.collections[col["legacy_id"]].id))
                         else:
-                            other_label = {
-                                "label": label.get("label", "other label"),
-                                "lang": label.get("label_lang", self.language),
-                            }
-                            col_other_labels.append(other_label)
-                    new_collection = SkosCollection.objects.create(
-                        scheme=concept_scheme,
-                        name=col_main_label.get("label", "no label in specified language"),
-                        legacy_id=col.get("legacy_id"),
-                        label_lang=col_main_label.get("lang", self.language),
-                        created_by=User.objects.get(username=user),
-                    )
-                    if len(col_other_labels) > 0:
-                        for other in col_other_labels:
-                            CollectionLabel.objects.create(
-                                collection=new_collection,
-                                name=other.get("label"),
-                                language=other.get("lang"),
-                                label_type="prefLabel",
-                            )
-                    if col_notes:
-                        for cn in col_notes:
-                            CollectionNote.objects.create(
-                                collection=new_collection,
-                                name=cn.get("name"),
-                                language=cn.get("lang"),
-                                note_type=cn.get("note_type"),
-                            )
-                    if col_alt_hid_labels:
-                        for cahl in col_alt_hid_labels:
-                            CollectionLabel.objects.create(
-                                collection=new_collection,
-                                name=cahl.get("name"),
-                                language=cahl.get("lang"),
-                                label_type=cahl.get("label_type"),
-                            )
-                    if col_sources:
-                        for csrc in col_sources:
-                            CollectionSource.objects.create(
-                                collection=new_collection,
-                                name=csrc.get("name"),
-                                language=csrc.get("lang"),
-                            )
+                            self.collection_index[member].append(col["legacy_id"])
+                            members.append((col["legacy_id"], member))
+                self.pending_collections = []
+                self.pending_collection_ids = set()
+            resolved_targets = set()
+            links = []
+            if self.pending_concepts:
+                self.create_concepts(self.pending_concepts, self.collection_index)
+                for concept in self.pending_concepts:
+                    if self.collection_index.pop(concept["legacy_id"], None) is not None:
+                        resolved_targets.add(concept["legacy_id"])
+                    broader_concept = concept.get("broader_concept")
+                    if broader_concept is not None:
+                        self.pending_broader[broader_concept].append(concept["legacy_id"])
+                        links.append((concept["legacy_id"], broader_concept))
+                resolved = []
+                for concept in self.pending_concepts:
+                    narrower = self.pending_broader.pop(concept["legacy_id"], None)
+                    if narrower is not None:
+                        resolved_targets.add(concept["legacy_id"])
+                        resolved.extend((legacy_id, concept["legacy_id"]) for legacy_id in narrower)
+                self.link_broader_concepts(resolved)
+                self.pending_concepts = []
+                self.pending_concept_ids = set()
+            self.create_memberships(memberships)
+            # the checkpoint only gets the links added and resolved by this flush
+            added = [
+                (ImportPendingLink.MEMBER, source, target)
+                for source, target in members
+                if target in self.collection_index
+            ] + [
+                (ImportPendingLink.BROADER, source, target)
+                for source, target in links
+                if target in self.pending_broader
+            ]
+            self.save_pending_links(added, resolved_targets)
+            self.save_checkpoint()
+            # bulk writes send no signals, cached exports are invalidated here
+            bump_content_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+            bump_tree_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+            clear_scheme_fragments(self.concept_scheme)
+        self.report_progress("write")
 
+    def finish(self):
+        """
+        Writes the remaining records and completes the import. The last chunk is
+        committed like the others, so progress is never reported from inside the
+        transaction where the task state would stay invisible until its commit
+        """
+        if not self.has_concept_scheme_record:
+            raise Exception("rdf:type skos:ConceptScheme is not found")
+        self.flush()
+        if self.concepts:
+            self.report_progress("tree")
+        with transaction.atomic():
+            self.renew_checkpoint()
+            self.link_broader_concepts(
+                (legacy_id, broader_concept)
+                for broader_concept, narrower in self.pending_broader.items()
+                for legacy_id in narrower
+            )
+            self.pending_broader = defaultdict(list)
+            creator = self.concept_scheme_record.get("creator", "")
+            contributor = self.concept_scheme_record.get("contributor", "")
+            if creator or contributor:
+                # concepts inherit creator and contributor of the concept scheme
+                SkosConcept.objects.filter(scheme=self.concept_scheme).update(creator=creator, contributor=contributor)
+            if self.concepts:
+                self.rebuild_tree()
+            if self.checkpoint is not None:
+                self.checkpoint.delete()
+            SkosConcept.objects.update_uris(self.concept_scheme)
+            sync_relations(SkosConcept.objects.filter(scheme=self.concept_scheme))
+            bump_content_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+            bump_tree_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+            clear_scheme_fragments(self.concept_scheme)
+        self.log_timings()
+
+
+class SkosSchemeUpdater(SkosBulkLoader):
+    """
+    Updates an existing concept scheme from parsed records. Collections and
+    concepts are matched by legacy_id and only rows of records whose hash
+    differs from the stored `import_hash` are rewritten, collections and
+    concepts missing from the records are removed.
+    """
+
+    def __init__(self, user, concept_scheme, language=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        super().__init__(user, language=language, batch_size=batch_size, progress=progress)
+        self.concept_scheme = concept_scheme
+        self.collections = {
+            collection.legacy_id: collection
+            for collection in SkosCollection.objects.filter(scheme=concept_scheme).exclude(legacy_id="")
+        }
+        self.concept_hashes = {}
+        for pk, legacy_id, import_hash in (
+            SkosConcept.objects.filter(scheme=concept_scheme)
+            .exclude(legacy_id="")
+            .values_list("id", "legacy_id", "import_hash")
+        ):
+            self.concepts[legacy_id] = pk
+            self.concept_hashes[legacy_id] = import_hash
+        self.seen_collections = set()
+        self.seen_concepts = set()
+        self.changed_collections = []
+        self.changed_concepts = []
+        # members of the inserted and changed collections, written once all concepts are known
+        self.collection_members = {}
+        # (legacy_id, broader URI or None) of the inserted and changed concepts
+        self.broader_links = []
+        self.summary = {
+            "concept_scheme": {"changed": False},
+            "collections": {"inserted": 0, "changed": 0, "removed": 0, "unchanged": 0},
+            "concepts": {"inserted": 0, "changed": 0, "removed": 0, "unchanged": 0},
+            # inserted and changed concepts whose broader concept is not in the scheme, see finish()
+            "unresolved_broader": 0,
+        }
+
+    def update_concept_scheme(self, record):
+        """Saves the concept scheme and replaces its titles, descriptions and sources if they changed"""
+        with self.timer("scheme"):
+            fields = self.concept_scheme_fields(record)
+            changed = [field for field, value in fields.items() if getattr(self.concept_scheme, field) != value]
+            if changed:
+                for field in changed:
+                    setattr(self.concept_scheme, field, fields[field])
+                self.concept_scheme.save()
+            for related, objs in zip(
+                (
+                    self.concept_scheme.has_titles,
+                    self.concept_scheme.has_descriptions,
+                    self.concept_scheme.has_sources,
+                ),
+                self.concept_scheme_rows(record),
+            ):
+                current = sorted(related.values_list("name", "language"))
+                if current != sorted((obj.name, obj.language) for obj in objs):
+                    related.all().delete()
+                    self.bulk_create(related.model, objs)
+                    changed.append(related.model.__name__)
+            self.summary["concept_scheme"]["changed"] = bool(changed)
+
+    def has_subject(self, legacy_id):
+        """True if records of the subject `legacy_id` were read before, concepts of the scheme are not"""
+        if legacy_id == self.concept_scheme_record.get("identifier"):
+            return True
+        return legacy_id in self.seen_concepts or legacy_id in self.seen_collections
+
+    def add_record(self, record_type, record):
+        """Sorts a record into inserted, changed or unchanged"""
+        if record_type == SKOS.ConceptScheme:
+            self.has_concept_scheme_record = True
+            self.concept_scheme_record = record
+            self.update_concept_scheme(record)
+        elif record_type == SKOS.Collection:
+            legacy_id = record["legacy_id"]
+            self.seen_collections.add(legacy_id)
+            collection = self.collections.get(legacy_id)
+            if collection is None:
+                self.pending_collections.append(record)
+                self.summary["collections"]["inserted"] += 1
+            elif collection.import_hash != record_hash(record):
+                self.changed_collections.append(record)
+                self.summary["collections"]["changed"] += 1
             else:
-                pass
-
-        if concept_scheme_has_concepts:
-            for concept in concept_scheme_has_concepts:
-                concept_legacy_id = concept.get("legacy_id")
-                concept_notation = concept.get("notation", "")
-                concept_creator = concept.get("creator", "")
-                concept_contributor = concept.get("contributor", "")
-                concept_alt_labels = concept.get("alt_label")
-                concept_hidden_labels = concept.get("hidden_label")
-                concept_notes = concept.get("note")
-                concept_sources = concept.get("source")
-                main_pref_label = {}
-                other_pref_labels = []
-                for pref_label in concept.get("pref_label"):
-                    if pref_label.get("lang") == self.language:
-                        main_pref_label["label"] = pref_label.get("label")
-                        main_pref_label["lang"] = pref_label.get("lang")
-                    else:
-                        other_pref_label = {
-                            "label": pref_label.get("label"),
-                            "lang": pref_label.get("lang", self.language),
-                        }
-                        other_pref_labels.append(other_pref_label)
-                concept_pref_label = main_pref_label.get("label", "no label in this language")
-                concept_pref_label_lang = main_pref_label.get("lang", self.language)
-                new_concept = SkosConcept.objects.create(
-                    legacy_id=concept_legacy_id,
-                    scheme=SkosConceptScheme.objects.get(id=concept_scheme.id),
-                    pref_label=concept_pref_label,
-                    pref_label_lang=concept_pref_label_lang,
-                    notation=concept_notation,
-                    creator=concept_creator,
-                    contributor=concept_contributor,
-                    created_by=User.objects.get(username=user),
-                )
-                for rel_type in SKOS_RELATION_TYPES:
-                    if concept.get(rel_type[1]):
-                        values = ",".join(concept.get(rel_type[1]))
-                        setattr(new_concept, rel_type[1], values)
-                new_concept.save()
+                self.summary["collections"]["unchanged"] += 1
+                return
+            self.collection_members[legacy_id] = record["members"]
+        elif record_type == SKOS.Concept:
+            legacy_id = record["legacy_id"]
+            if legacy_id in self.seen_concepts:
+                raise ValueError(f"Triples about {legacy_id} are not consecutive, sort the file by subject")
+            self.seen_concepts.add(legacy_id)
+            if legacy_id not in self.concept_hashes:
+                self.pending_concepts.append(record)
+                self.summary["concepts"]["inserted"] += 1
+            elif self.concept_hashes[legacy_id] != record_hash(record):
+                self.changed_concepts.append(record)
+                self.summary["concepts"]["changed"] += 1
+            else:
+                self.summary["concepts"]["unchanged"] += 1
+                return
+            self.broader_links.append((legacy_id, record.get("broader_concept")))
 
-                # concept to collections
-                if concept_scheme_has_collections:
-                    collections = []
-                    for col in concept_scheme_has_collections:
-                        if concept_legacy_id in col.get("members"):
-                            collections.append(col.get("legacy_id"))
-                        else:
-                            pass
-                    if len(collections) > 0:
-                        member_of_collections = SkosCollection.objects.filter(legacy_id__in=collections)
-                        new_concept.collection.set(member_of_collections)
-                else:
-                    pass
-
-                if len(other_pref_labels) > 0:
-                    for other in other_pref_labels:
-                        ConceptLabel.objects.create(
-                            concept=new_concept,
-                            name=other.get("label"),
-                            language=other.get("lang"),
-                            label_type="prefLabel",
-                        )
-                else:
-                    pass
-                if len(concept_alt_labels) > 0:
-                    for alt in concept_alt_labels:
-                        ConceptLabel.objects.create(
-                            concept=new_concept,
-                            name=alt.get("label"),
-                            language=alt.get("lang"),
-                            label_type="altLabel",
-                        )
-                else:
-                    pass
-                if len(concept_hidden_labels) > 0:
-                    for hid in concept_hidden_labels:
-                        ConceptLabel.objects.create(
-                            concept=new_concept,
-                            name=hid.get("label"),
-                            language=hid.get("lang"),
-                            label_type="hiddenLabel",
-                        )
-                else:
-                    pass
-                if len(concept_notes) > 0:
-                    for n in concept_notes:
-                        ConceptNote.objects.create(
-                            concept=new_concept,
-                            name=n.get("name"),
-                            language=n.get("lang"),
-                            note_type=n.get("note_type"),
-                        )
-                else:
-                    pass
-                if len(concept_sources) > 0:
-                    for s in concept_sources:
-                        ConceptSource.objects.create(
-                            concept=new_concept,
-                            name=s.get("name"),
-                            language=s.get("lang"),
-                        )
-                else:
-                    pass
-            # add relationships
-            for concept in concept_scheme_has_concepts:
-                if concept.get("broader_concept") is not None:
-                    local_concepts = SkosConcept.objects.filter(scheme=concept_scheme.id)
-                    try:
-                        local_concepts.filter(legacy_id=concept.get("legacy_id")).update(
-                            broader_concept=local_concepts.get(legacy_id=concept.get("broader_concept"))
-                        )
-                    except ObjectDoesNotExist as e:
-                        pass
-                        logging.info(e)
-                else:
-                    pass
-            SkosConcept.objects.rebuild()
-            return concept_scheme.get_absolute_url()
-        else:
-            pass
-        return
+    def subject_done(self, subject):
+        self.position += 1
+        self.last_subject = str(subject)
+        buffers = [self.pending_collections, self.changed_collections, self.pending_concepts, self.changed_concepts]
+        if sum(len(buffer) for buffer in buffers) >= self.batch_size:
+            self.flush()
+
+    def update_collections(self, records):
+        """Rewrites the fields, labels, notes and sources of changed collections"""
+        if not records:
+            return
+        with self.timer("collections"):
+            collections = []
+            labels = []
+            notes = []
+            sources = []
+            for col in records:
+                collection = self.collections[col["legacy_id"]]
+                for field, value in self.collection_fields(col).items():
+                    setattr(collection, field, value)
+                collection.date_modified = timezone.now()
+                collections.append(collection)
+                col_labels, col_notes, col_sources = self.collection_rows(collection, col)
+                labels.extend(col_labels)
+                notes.extend(col_notes)
+                sources.extend(col_sources)
+            ids = [collection.id for collection in collections]
+            for model in (CollectionLabel, CollectionNote, CollectionSource):
+                model.objects.filter(collection_id__in=ids).delete()
+            SkosCollection.objects.bulk_update(
+                collections, ["name", "label_lang", "import_hash", "date_modified"], batch_size=self.batch_size
+            )
+            self.bulk_create(CollectionLabel, labels)
+            self.bulk_create(CollectionNote, notes)
+            self.bulk_create(CollectionSource, sources)
+
+    def update_concepts(self, records):
+        """Rewrites the fields, labels, notes and sources of changed concepts"""
+        if not records:
+            return
+        with self.timer("concepts"):
+            concepts = []
+            labels = []
+            notes = []
+            sources = []
+            for record in records:
+                fields = self.concept_fields(record)
+                concept = SkosConcept(id=self.concepts[record["legacy_id"]], date_modified=timezone.now(), **fields)
+                concepts.append(concept)
+                concept_labels, concept_notes, concept_sources = self.concept_rows(concept, record)
+                labels.extend(concept_labels)
+                notes.extend(concept_notes)
+                sources.extend(concept_sources)
+            ids = [concept.id for concept in concepts]
+            for model in (ConceptLabel, ConceptNote, ConceptSource):
+                model.objects.filter(concept_id__in=ids).delete()
+            # creator and contributor are set from the concept scheme in finish()
+            update_fields = [field for field in fields if field not in ("legacy_id", "creator", "contributor")]
+            SkosConcept.objects.bulk_update(concepts, update_fields + ["date_modified"], batch_size=self.batch_size)
+            self.bulk_create(ConceptLabel, labels)
+            self.bulk_create(ConceptNote, notes)
+            self.bulk_create(ConceptSource, sources)
+
+    def flush(self):
+        with transaction.atomic():
+            self.create_collections(self.pending_collections)
+            self.update_collections(self.changed_collections)
+            self.create_concepts(self.pending_concepts)
+            self.update_concepts(self.changed_concepts)
+        self.pending_collections = []
+        self.changed_collections = []
+        self.pending_concepts = []
+        self.changed_concepts = []
+        self.report_progress("write")
+
+    def remove_missing(self):
+        """
+        Deletes the collections and concepts with a legacy_id that are missing
+        from the records, concepts that are kept lose a removed broader concept
+        """
+        removed_collections = [
+            collection.id
+            for legacy_id, collection in self.collections.items()
+            if legacy_id not in self.seen_collections
+        ]
+        removed_concepts = [pk for legacy_id, pk in self.concepts.items() if legacy_id not in self.seen_concepts]
+        self.collections = {
+            legacy_id: collection
+            for legacy_id, collection in self.collections.items()
+            if legacy_id in self.seen_collections
+        }
+        self.concepts = {legacy_id: pk for legacy_id, pk in self.concepts.items() if legacy_id in self.seen_concepts}
+        # broader_concept cascades, narrower concepts which are kept are detached first
+        orphans = SkosConcept.objects.filter(broader_concept_id__in=removed_concepts).exclude(id__in=removed_concepts)
+        orphans.update(broader_concept=None)
+        SkosConcept.objects.filter(id__in=removed_concepts).delete()
+        SkosCollection.objects.filter(id__in=removed_collections).delete()
+        self.summary["collections"]["removed"] = len(removed_collections)
+        self.summary["concepts"]["removed"] = len(removed_concepts)
+
+    def update_memberships(self):
+        """Replaces the members of the inserted and changed collections"""
+        Membership = SkosConcept.collection.through
+        collection_ids = [self.collections[legacy_id].id for legacy_id in self.collection_members]
+        Membership.objects.filter(skoscollection_id__in=collection_ids).delete()
+        self.create_memberships(
+            (self.concepts[member], self.collections[legacy_id].id)
+            for legacy_id, members in self.collection_members.items()
+            for member in members
+            if member in self.concepts
+        )
+
+    def finish(self):
+        """Writes the remaining records, removes missing ones and returns the summary of changes"""
+        if not self.has_concept_scheme_record:
+            raise Exception("rdf:type skos:ConceptScheme is not found")
+        self.flush()
+        removed = any(legacy_id not in self.seen_concepts for legacy_id in self.concepts)
+        if self.broader_links or removed:
+            self.report_progress("tree")
+        with transaction.atomic():
+            with self.timer("relations"):
+                self.remove_missing()
+                written = [self.concepts[legacy_id] for legacy_id, broader in self.broader_links]
+                # concepts whose new broader concept can't be resolved become top concepts as well
+                top_concepts = [
+                    self.concepts[legacy_id]
+                    for legacy_id, broader in self.broader_links
+                    if broader not in self.concepts
+                ]
+                SkosConcept.objects.filter(id__in=top_concepts).update(broader_concept=None)
+                self.update_memberships()
+            self.link_broader_concepts((legacy_id, broader) for legacy_id, broader in self.broader_links if broader)
+            self.summary["unresolved_broader"] = len(self.unresolved_broader)
+            creator = self.concept_scheme_record.get("creator", "")
+            contributor = self.concept_scheme_record.get("contributor", "")
+            if written and (creator or contributor):
+                SkosConcept.objects.filter(id__in=written).update(creator=creator, contributor=contributor)
+            if written or self.summary["concepts"]["removed"]:
+                self.rebuild_tree()
+            changes = [
+                count
+                for key in ("collections", "concepts")
+                for name, count in self.summary[key].items()
+                if name != "unchanged"
+            ]
+            if self.summary["concept_scheme"]["changed"] or any(changes):
+                SkosConcept.objects.update_uris(self.concept_scheme)
+                sync_relations(SkosConcept.objects.filter(scheme=self.concept_scheme))
+                bump_content_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+                bump_tree_version(SkosConceptScheme.objects.filter(pk=self.concept_scheme.pk))
+                clear_scheme_fragments(self.concept_scheme)
+        self.log_timings()
+        return self.summary
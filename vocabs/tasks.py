@@ -1,25 +1,81 @@
 import os
+import shutil
+import time
+
 from celery import shared_task
+from celery.exceptions import Ignore
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.utils.text import slugify
 
-from vocabs.models import SkosConceptScheme, SkosConcept
-from vocabs.rdf_utils import graph_construct_qs, RDF_FORMATS
-from vocabs.skos_import import SkosImporter
+from vocabs.export_cache import cache_enabled, cached_export
+from vocabs.models import ImportCheckpoint, SkosConceptScheme, SkosConcept
+from vocabs.permissions import apply_scheme_permissions
+from vocabs.rdf_utils import export_qs, RDF_FORMATS
+from vocabs.skos_import import IMPORT_LEASE, ImportInProgress, SkosImporter
 from vocabs.utils import push_to_gh
 
+# largest RDF/XML upload, these are parsed into an in-memory graph by the analysis and the import
+GRAPH_MAX_SIZE = 200 * 1024 * 1024
+
+
+class TaskProgress(object):
+    """
+    Publishes the progress of a bound task as its PROGRESS state with the phase,
+    items done and total, throughput and ETA. Updates within a phase are sent
+    at most every `interval` seconds.
+    """
+
+    def __init__(self, task, interval=1.0):
+        self.task = task
+        self.interval = interval
+        self.phase = None
+        self.phase_start = 0
+        self.phase_start_done = 0
+        self.last_update = 0
 
-@shared_task(name="Export")
-def export_concept_schema(schema_id, export_format):
+    def __call__(self, phase, done=0, total=None):
+        now = time.monotonic()
+        if phase != self.phase:
+            self.phase = phase
+            self.phase_start = now
+            self.phase_start_done = done
+        elif now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        elapsed = now - self.phase_start
+        rate = (done - self.phase_start_done) / elapsed if elapsed > 0 else None
+        eta = (total - done) / rate if total is not None and rate else None
+        if self.task.request.id is None:
+            # the task is called directly instead of by a worker
+            return
+        self.task.update_state(
+            state="PROGRESS",
+            meta={
+                "phase": phase,
+                "done": done,
+                "total": total,
+                "rate": round(rate, 1) if rate is not None else None,
+                "eta": round(eta) if eta is not None else None,
+            },
+        )
+
+
+@shared_task(name="Export", bind=True)
+def export_concept_schema(self, schema_id, export_format):
+    progress = TaskProgress(self)
     schema = SkosConceptScheme.objects.get(id=schema_id)
     qs = SkosConcept.objects.filter(scheme=schema)
-    g = graph_construct_qs(qs)
     file_name = f"{slugify(schema.title)}.{RDF_FORMATS[export_format]}"
     export_path = os.path.join(settings.MEDIA_ROOT, file_name)
-    g.serialize(export_path, format=export_format)
+    if cache_enabled():
+        shutil.copyfile(cached_export(schema, export_format, progress=progress), export_path)
+    else:
+        export_qs(qs, export_format, export_path, progress=progress)
     os.chmod(export_path, 0o0755)  # this is needed because I don't get docker permission/user things
     commit_message = f"{file_name} exported from vocabseditor"
     files = [export_path]
+    progress("push")
     push_to_gh(
         files,
         ghpat=settings.GHPAT,
@@ -29,11 +85,99 @@ def export_concept_schema(schema_id, export_format):
     return f"/media/{file_name}"
 
 
-@shared_task(name="Import")
-def import_concept_schema(full_path, user_name, file_format=None, language=None):
-    if file_format == "ttl":
-        skos_vocab = SkosImporter(file=full_path, file_format="ttl", language=language)
+# acks_late: the message is redelivered if the worker dies and the import resumes from its checkpoint
+@shared_task(name="Import", bind=True, acks_late=True, reject_on_worker_lost=True)
+def import_concept_schema(
+    self,
+    full_path,
+    user_name,
+    file_format=None,
+    language=None,
+    streaming=False,
+    workers=None,
+    concept_scheme_id=None,
+):
+    options = {
+        "language": language,
+        "progress": TaskProgress(self),
+        "resume_only": bool(self.request.retries or (self.request.delivery_info or {}).get("redelivered")),
+    }
+    if file_format in ["ttl", "nt"]:
+        skos_vocab = SkosImporter(file=full_path, file_format=file_format, **options)
     else:
-        skos_vocab = SkosImporter(file=full_path, language=language)
-    result = skos_vocab.upload_data(user=user_name)
+        skos_vocab = SkosImporter(file=full_path, **options)
+    try:
+        if concept_scheme_id:
+            concept_scheme = SkosConceptScheme.objects.get(id=concept_scheme_id)
+            result = skos_vocab.update_data(
+                user=user_name, concept_scheme=concept_scheme, streaming=streaming, workers=workers
+            )
+        elif workers:
+            result = skos_vocab.parallel_data(user=user_name, workers=workers, task_id=self.request.id)
+        elif streaming:
+            result = skos_vocab.stream_data(user=user_name, task_id=self.request.id)
+        else:
+            result = skos_vocab.upload_data(user=user_name, task_id=self.request.id)
+    except ImportInProgress as exc:
+        # redelivered while another worker still runs the import, e.g. after a broker consumer timeout,
+        # it is tried again once that run may have stopped renewing its checkpoint
+        raise self.retry(exc=exc, countdown=IMPORT_LEASE, max_retries=None)
+    except ImportCheckpoint.DoesNotExist:
+        # the other run finished the import and deleted its checkpoint
+        raise Ignore()
     return result
+
+
+@shared_task(name="Analyse import")
+def analyse_concept_schema(
+    full_path,
+    user_name,
+    file_format=None,
+    language=None,
+    streaming=False,
+    workers=None,
+    concept_scheme_id=None,
+):
+    """
+    Pre-flight check of an upload: parses the file without writing to the
+    database and starts the import only if it has a concept scheme and concepts.
+    N-Triples and Turtle are analysed while they are parsed, RDF/XML is loaded
+    into a graph and rejected above VOCABS_IMPORT_GRAPH_MAX_SIZE bytes.
+    Imports with at least VOCABS_IMPORT_LARGE_THRESHOLD concepts are sent to
+    the VOCABS_IMPORT_LARGE_QUEUE queue if it is set.
+    """
+    if file_format in ["ttl", "nt"]:
+        skos_vocab = SkosImporter(file=full_path, file_format=file_format, language=language)
+    else:
+        max_size = getattr(settings, "VOCABS_IMPORT_GRAPH_MAX_SIZE", GRAPH_MAX_SIZE)
+        if max_size and os.path.getsize(full_path) > max_size:
+            raise ValueError(f"RDF/XML files larger than {max_size} bytes can't be imported, upload N-Triples")
+        skos_vocab = SkosImporter(file=full_path, language=language)
+    report = skos_vocab.analyse(streaming=streaming or file_format in ["ttl", "nt"], workers=workers)
+    if not report["concept_schemes"]:
+        raise ValueError("rdf:type skos:ConceptScheme is not found")
+    if not report["concepts"]:
+        raise ValueError("rdf:type skos:Concept is not found")
+    queue = None
+    if report["concepts"] >= getattr(settings, "VOCABS_IMPORT_LARGE_THRESHOLD", 100000):
+        queue = getattr(settings, "VOCABS_IMPORT_LARGE_QUEUE", None)
+    import_concept_schema.apply_async(
+        args=[full_path, user_name],
+        kwargs={
+            "file_format": file_format,
+            "language": language,
+            "streaming": streaming,
+            "workers": workers,
+            "concept_scheme_id": concept_scheme_id,
+        },
+        queue=queue,
+    )
+    return report
+
+
+@shared_task(name="Scheme permissions")
+def scheme_permissions(user_ids, concept_scheme_id, actions, revoke=False):
+    """Grants or revokes permissions on the collections and concepts of a large concept scheme"""
+    concept_scheme = SkosConceptScheme.objects.get(id=concept_scheme_id)
+    users = list(User.objects.filter(pk__in=user_ids))
+    return apply_scheme_permissions(users, concept_scheme, actions, revoke=revoke)
@@ -1,18 +1,53 @@
+import json
 import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.http import FileResponse
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
-from rdflib import Graph
+from django.urls import reverse
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rdflib import DC, RDF, SKOS, Graph, Literal, URIRef
 
-from .constants import USER
-from ..models import SkosConceptScheme, SkosCollection, SkosConcept
-from ..skos_import import SkosImporter
-from ..rdf_utils import graph_construct_qs
+from .constants import USER, concept, concept_scheme
+from .constants import collection as collection_fields
+from ..models import (
+    CollectionNote,
+    ConceptLabel,
+    ExportFragment,
+    ImportCheckpoint,
+    SkosConceptScheme,
+    SkosCollection,
+    SkosConcept,
+)
+from ..skos_import import (
+    IMPORT_LEASE,
+    ImportInProgress,
+    SkosBulkLoader,
+    SkosImporter,
+    claim_checkpoint,
+    ntriples_ranges,
+)
+from ..rdf_utils import STREAMING_SERIALIZERS, graph_construct_qs, serialize_qs
+from ..export_cache import evict_stale, prune_cache
+from ..skos_export import SkosExporter
+from ..tasks import TaskProgress, analyse_concept_schema, export_concept_schema, import_concept_schema
 from ..utils import delete_legacy_ids, delete_skos_notations
 
 
 EXAMPLE_SKOS_IMPORT = os.path.join(os.path.dirname(__file__), "example_skos_import.rdf")
 EXAMPLE_SKOS_EXPORT = os.path.join(os.path.dirname(__file__), "example_skos_export.rdf")
+EXAMPLE_BROADER = os.path.join(os.path.dirname(__file__), "broader.ttl")
 
 
 class TestSkosImport(TestCase):
@@ -34,10 +69,103 @@ class TestSkosImport(TestCase):
         self.assertEqual(self.concept_scheme["title"][0]["title"], "DHA Taxonomy")
         self.assertEqual(self.concept_scheme["title"][0]["lang"], "en")
 
+    def test_concept_record(self):
+        concept = next(x for x in self.concept_scheme["has_concepts"] if x["legacy_id"].endswith("Concept48.07"))
+        self.assertEqual(concept["notation"], "48.07")
+        self.assertEqual(concept["broader_concept"], "https://vocabs.acdh.oeaw.ac.at/dhataxonomy/Concept48")
+        self.assertEqual(concept["pref_label"], [{"label": "lemmatisation", "lang": "en"}])
+        self.assertEqual([x["note_type"] for x in concept["note"]], ["definition"])
+        self.assertEqual(len(concept["source"]), 1)
+        self.assertEqual(concept["alt_label"], [])
+
     def test_uploading_data(self):
         self.assertEqual(len(SkosConceptScheme.objects.all()), 1)
         self.assertEqual(len(SkosCollection.objects.all()), 6)
         self.assertEqual(len(SkosConcept.objects.all()), 114)
+        for obj in SkosConcept.objects.select_related("scheme"):
+            self.assertEqual(obj.uri, obj.build_uri())
+
+    def test_uploading_data_in_batches(self):
+        skos_vocab = SkosImporter(file=EXAMPLE_SKOS_IMPORT, file_format="xml", language="en", batch_size=7)
+        skos_vocab.upload_data(self.user)
+        first, second = SkosConceptScheme.objects.all()
+        for relation in ["has_labels", "has_notes", "has_sources", "collection"]:
+            self.assertEqual(
+                SkosConcept.objects.filter(scheme=first).values(relation).count(),
+                SkosConcept.objects.filter(scheme=second).values(relation).count(),
+            )
+        self.assertEqual(
+            first.has_concepts.filter(broader_concept__isnull=False).count(),
+            second.has_concepts.filter(broader_concept__isnull=False).count(),
+        )
+        self.assertTrue(self.user.has_perm("change_skosconcept", second.has_concepts.first()))
+        self.assertTrue(self.user.has_perm("view_skoscollection", second.has_collections.first()))
+        self.assertIn("concepts", skos_vocab.timings)
+
+    def test_unresolved_broader_concepts(self):
+        skos_vocab = SkosImporter(file=EXAMPLE_BROADER, file_format="ttl", language="en")
+        skos_vocab.upload_data(self.user)
+        level_2 = SkosConcept.objects.get(legacy_id="https://vocabs.acdh.oeaw.ac.at/broader/2")
+        self.assertEqual(level_2.broader_concept.pref_label, "Level 1")
+        self.assertEqual(level_2.level, 1)
+        self.assertEqual(
+            skos_vocab.unresolved_broader,
+            [("https://vocabs.acdh.oeaw.ac.at/broader/3", "https://vocabs.acdh.oeaw.ac.at/broader/missing")],
+        )
+
+    def test_analyse(self):
+        report = SkosImporter(file=EXAMPLE_SKOS_IMPORT, file_format="xml", language="en").analyse()
+        self.assertEqual(report["concept_schemes"], 1)
+        self.assertEqual(report["collections"], 6)
+        self.assertEqual(report["concepts"], 114)
+        self.assertEqual(report["broken_broader"], 0)
+        self.assertIn("en", report["languages"])
+        self.assertIn("parse", report["timings"])
+        self.assertEqual(SkosConceptScheme.objects.count(), 1)
+        report = SkosImporter(file=EXAMPLE_BROADER, file_format="ttl", language="en").analyse()
+        self.assertEqual(report["concepts"], 3)
+        self.assertEqual(
+            report["broken_broader_examples"],
+            [("https://vocabs.acdh.oeaw.ac.at/broader/3", "https://vocabs.acdh.oeaw.ac.at/broader/missing")],
+        )
+
+    def test_analyse_task(self):
+        with patch.object(import_concept_schema, "apply_async") as apply_async:
+            report = analyse_concept_schema(EXAMPLE_BROADER, self.user.username, file_format="ttl", language="en")
+        self.assertEqual(report["broken_broader"], 1)
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs["args"], [EXAMPLE_BROADER, self.user.username])
+
+    def test_analyse_task_memory(self):
+        # Turtle is analysed while it is parsed, RDF/XML above the size limit is rejected before parsing
+        with patch.object(import_concept_schema, "apply_async"), patch.object(SkosImporter, "_graph_read") as read:
+            analyse_concept_schema(EXAMPLE_BROADER, self.user.username, file_format="ttl", language="en")
+            with override_settings(VOCABS_IMPORT_GRAPH_MAX_SIZE=1024):
+                with self.assertRaises(ValueError):
+                    analyse_concept_schema(EXAMPLE_SKOS_IMPORT, self.user.username, file_format="rdf", language="en")
+        read.assert_not_called()
+
+    def test_import_progress(self):
+        progress = []
+        transactions = set()
+
+        def report(*args):
+            progress.append(args)
+            transactions.add(len(connection.atomic_blocks))
+
+        skos_vocab = SkosImporter(
+            file=EXAMPLE_SKOS_IMPORT,
+            file_format="xml",
+            language="en",
+            batch_size=50,
+            progress=report,
+        )
+        skos_vocab.upload_data(self.user)
+        self.assertEqual(progress[0], ("parse", 0, None))
+        self.assertIn(("write", 121, 121), progress)
+        self.assertEqual(progress[-1][0], "tree")
+        # the task state is written outside the import transactions, in the one of the test case
+        self.assertEqual(transactions, {len(connection.atomic_blocks)})
 
     def test_related_concepts(self):
         test_file = os.path.join(os.path.dirname(__file__), "exact_match.ttl")
@@ -45,6 +173,9 @@ class TestSkosImport(TestCase):
         skos_vocab.upload_data(self.user)
         item = SkosConcept.objects.filter(exact_match__contains="https://d-nb.info/gnd/1197273174")
         self.assertEqual(item.count(), 1)
+        self.assertEqual(
+            list(SkosConcept.objects.with_relation("exact_match", "https://d-nb.info/gnd/1197273174")), list(item)
+        )
         concept_scheme = item.first().scheme
         delete_legacy_ids(concept_scheme)
         delete_skos_notations(concept_scheme)
@@ -53,6 +184,267 @@ class TestSkosImport(TestCase):
             self.assertEqual(x.notation, "")
 
 
+class TestSkosStreamingImport(TestCase):
+    """Test module for the streaming SKOS import."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(**USER)
+        g = Graph()
+        g.parse(EXAMPLE_SKOS_IMPORT, format="xml")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.nt_file = os.path.join(self.tmp_dir.name, "example.nt")
+        self.lines = sorted(line for line in g.serialize(format="nt").splitlines() if line.strip())
+        with open(self.nt_file, "w") as f:
+            f.write("\n".join(self.lines))
+        self.ttl_file = os.path.join(self.tmp_dir.name, "example.ttl")
+        g.serialize(self.ttl_file, format="turtle")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def assertSameImport(self, first, second):
+        self.assertEqual(first.title, second.title)
+        self.assertEqual(first.has_collections.count(), second.has_collections.count())
+        for relation in ["has_labels", "has_notes", "has_sources", "collection", "broader_concept"]:
+            lookup = {f"{relation}__isnull": False}
+            self.assertEqual(
+                sorted(first.has_concepts.filter(**lookup).values_list("legacy_id", flat=True)),
+                sorted(second.has_concepts.filter(**lookup).values_list("legacy_id", flat=True)),
+            )
+
+    def test_streaming_import(self):
+        SkosImporter(file=EXAMPLE_SKOS_IMPORT, file_format="xml", language="en").upload_data(self.user)
+        skos_vocab = SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10)
+        skos_vocab.stream_data(self.user)
+        SkosImporter(file=self.ttl_file, file_format="ttl", language="en", batch_size=10).stream_data(self.user)
+        graph_import, nt_import, ttl_import = SkosConceptScheme.objects.all()
+        self.assertEqual(nt_import.has_concepts.count(), 114)
+        self.assertSameImport(graph_import, nt_import)
+        self.assertSameImport(graph_import, ttl_import)
+        self.assertIn("stream", skos_vocab.timings)
+
+    def test_resume_import(self):
+        create_concepts = SkosBulkLoader.create_concepts
+        calls = []
+
+        def interrupted_create_concepts(loader, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 4:
+                raise RuntimeError("Worker lost")
+            return create_concepts(loader, *args, **kwargs)
+
+        with patch.object(SkosBulkLoader, "create_concepts", interrupted_create_concepts):
+            with self.assertRaises(RuntimeError):
+                SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10).stream_data(
+                    self.user, task_id="import-task"
+                )
+        checkpoint = ImportCheckpoint.objects.get(task_id="import-task")
+        self.assertTrue(0 < checkpoint.concept_scheme.has_concepts.count() < 114)
+        self.assertTrue(checkpoint.last_subject)
+        # the written chunks are valid trees of their own and editable before the import finishes
+        partial = checkpoint.concept_scheme.has_concepts.all()
+        tree_ids = list(partial.values_list("tree_id", flat=True))
+        self.assertNotIn(0, tree_ids)
+        self.assertEqual(len(set(tree_ids)), len(tree_ids))
+        self.assertTrue(self.user.has_perm("change_skosconcept", partial.first()))
+        # links waiting for concepts after the checkpoint are rows of their own, none points at a written concept
+        self.assertNotIn("pending_broader", checkpoint.state)
+        self.assertTrue(checkpoint.pending_links.exists())
+        self.assertFalse(checkpoint.pending_links.filter(target__in=partial.values("legacy_id")).exists())
+        SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10).stream_data(
+            self.user, task_id="import-task"
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+        SkosImporter(file=EXAMPLE_SKOS_IMPORT, file_format="xml", language="en").upload_data(self.user)
+        resumed_import, graph_import = SkosConceptScheme.objects.all()
+        self.assertEqual(resumed_import.has_concepts.count(), 114)
+        self.assertSameImport(graph_import, resumed_import)
+        self.assertTrue(self.user.has_perm("change_skosconcept", resumed_import.has_concepts.first()))
+
+    def test_checkpoint_claim(self):
+        def run(**kwargs):
+            importer = SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10, **kwargs)
+            return importer.stream_data(self.user, task_id="import-task")
+
+        claim_checkpoint("import-task", "first run")
+        with self.assertRaises(ImportInProgress):
+            run()
+        # the first run stopped renewing its checkpoint, another delivery takes over
+        ImportCheckpoint.objects.update(heartbeat=timezone.now() - timedelta(seconds=IMPORT_LEASE))
+        run()
+        self.assertFalse(ImportCheckpoint.objects.exists())
+        with self.assertRaises(ImportCheckpoint.DoesNotExist):
+            run(resume_only=True)
+        self.assertEqual(SkosConceptScheme.objects.count(), 1)
+
+    def test_lost_checkpoint(self):
+        loader = SkosImporter(file=self.nt_file, file_format="nt").get_loader(self.user.username, "import-task")
+        ImportCheckpoint.objects.update(owner="second run", heartbeat=timezone.now())
+        with self.assertRaises(ImportInProgress):
+            loader.flush()
+        self.assertFalse(SkosConceptScheme.objects.exists())
+
+    def test_streaming_analyse(self):
+        report = SkosImporter(file=self.nt_file, file_format="nt", language="en").analyse(streaming=True)
+        self.assertEqual(report["concepts"], 114)
+        self.assertEqual(report["collections"], 6)
+        parallel_report = SkosImporter(file=self.nt_file, file_format="nt", language="en").analyse(workers=2)
+        self.assertEqual(parallel_report.pop("timings").keys(), report.pop("timings").keys())
+        self.assertEqual(parallel_report, report)
+        self.assertFalse(SkosConceptScheme.objects.exists())
+
+    def test_ntriples_ranges(self):
+        ranges = ntriples_ranges(self.nt_file, 2048)
+        self.assertGreater(len(ranges), 5)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.nt_file))
+        subjects = set()
+        with open(self.nt_file, "rb") as f:
+            for start, end in ranges:
+                f.seek(start)
+                range_subjects = {line.split()[0] for line in f.read(end - start).splitlines()}
+                self.assertFalse(subjects & range_subjects)
+                subjects.update(range_subjects)
+
+    def test_parallel_import(self):
+        SkosImporter(file=EXAMPLE_SKOS_IMPORT, file_format="xml", language="en").upload_data(self.user)
+        skos_vocab = SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10)
+        skos_vocab.parallel_data(self.user, workers=2, chunk_size=2048)
+        first_half = os.path.join(self.tmp_dir.name, "first.nt")
+        second_half = os.path.join(self.tmp_dir.name, "second.nt")
+        subjects = [line.split()[0] for line in self.lines]
+        split = next(i for i in range(100, len(subjects)) if subjects[i] != subjects[i - 1])
+        with open(first_half, "w") as f:
+            f.write("\n".join(self.lines[:split]))
+        with open(second_half, "w") as f:
+            f.write("\n".join(self.lines[split:]))
+        SkosImporter(file=[first_half, second_half], language="en").parallel_data(self.user, workers=2)
+        # several files without --workers are read by one worker process
+        call_command("import_skos_vocab", first_half, second_half, "en", "nt", self.user.username, stdout=StringIO())
+        graph_import, ranges_import, files_import, command_import = SkosConceptScheme.objects.all()
+        self.assertEqual(ranges_import.has_concepts.count(), 114)
+        self.assertSameImport(graph_import, ranges_import)
+        self.assertSameImport(graph_import, files_import)
+        self.assertSameImport(graph_import, command_import)
+
+    def test_unsorted_file(self):
+        with open(self.nt_file, "w") as f:
+            f.write("\n".join(self.lines[1::2] + self.lines[::2]))
+        skos_vocab = SkosImporter(file=self.nt_file, file_format="nt", language="en")
+        with self.assertRaises(ValueError):
+            skos_vocab.stream_data(self.user)
+        self.assertEqual(SkosConceptScheme.objects.count(), 0)
+
+    def test_returning_subject(self):
+        concept_type = f"<{RDF.type}> <{SKOS.Concept}> ."
+        type_line = next(line for line in self.lines if line.endswith(concept_type))
+        subject = type_line.split()[0]
+        lines = [line for line in self.lines if line.split()[0] != subject]
+        subject_lines = [line for line in self.lines if line.split()[0] == subject and line != type_line]
+        # the concept is written by a flush before its other triples come back, then its untyped triples come first
+        returning_triples = lines[:20] + [type_line] + lines[20:] + subject_lines
+        for unsorted in (returning_triples, subject_lines + lines + [type_line]):
+            with open(self.nt_file, "w") as f:
+                f.write("\n".join(unsorted))
+            skos_vocab = SkosImporter(file=self.nt_file, file_format="nt", language="en", batch_size=10)
+            with self.assertRaises(ValueError):
+                skos_vocab.stream_data(self.user)
+
+
+UPDATE_TEMPLATE = """
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix dc: <http://purl.org/dc/elements/1.1/> .
+@prefix vocab: <https://vocabs.acdh.oeaw.ac.at/update/> .
+
+vocab:scheme a skos:ConceptScheme ;
+    dc:title "Update test"@en .
+
+vocab:collection a skos:Collection ;
+    skos:prefLabel "Collection"@en ;
+    skos:member {members} .
+{concepts}
+"""
+
+
+class TestSkosUpdateImport(TestCase):
+    """Test module for updating a concept scheme from a file."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(**USER)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.concepts = {
+            "1": (None, "Level 1"),
+            "2": ("1", "Level 2"),
+            "3": ("2", "Level 3"),
+            "4": ("1", "Other"),
+        }
+        SkosImporter(file=self.write_file(["2", "3"]), file_format="ttl", language="en").upload_data(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.get()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_file(self, members):
+        concepts = []
+        for legacy_id, (broader, label) in self.concepts.items():
+            concept = f'vocab:{legacy_id} a skos:Concept ; skos:inScheme vocab:scheme ; skos:prefLabel "{label}"@en'
+            if broader:
+                concept += f" ; skos:broader vocab:{broader}"
+            concepts.append(concept + " .")
+        path = os.path.join(self.tmp_dir.name, "update.ttl")
+        with open(path, "w") as f:
+            f.write(
+                UPDATE_TEMPLATE.format(
+                    members=", ".join(f"vocab:{member}" for member in members), concepts="\n".join(concepts)
+                )
+            )
+        return path
+
+    def update(self, members):
+        skos_vocab = SkosImporter(file=self.write_file(members), file_format="ttl", language="en")
+        return skos_vocab.update_data(self.user, self.concept_scheme)
+
+    def test_unchanged_file(self):
+        modified = dict(self.concept_scheme.has_concepts.values_list("legacy_id", "date_modified"))
+        content_version = self.concept_scheme.content_version
+        summary = self.update(["2", "3"])
+        self.concept_scheme.refresh_from_db()
+        self.assertEqual(self.concept_scheme.content_version, content_version)
+        self.assertFalse(summary["concept_scheme"]["changed"])
+        self.assertEqual(summary["concepts"], {"inserted": 0, "changed": 0, "removed": 0, "unchanged": 4})
+        self.assertEqual(summary["collections"], {"inserted": 0, "changed": 0, "removed": 0, "unchanged": 1})
+        self.assertEqual(dict(self.concept_scheme.has_concepts.values_list("legacy_id", "date_modified")), modified)
+
+    def test_changed_file(self):
+        uri = "https://vocabs.acdh.oeaw.ac.at/update/"
+        level_3 = SkosConcept.objects.get(legacy_id=f"{uri}3")
+        self.concepts["3"] = ("4", "Level 3 changed")
+        del self.concepts["2"]
+        self.concepts["5"] = ("3", "New")
+        summary = self.update(["3", "5"])
+        self.assertEqual(summary["concepts"], {"inserted": 1, "changed": 1, "removed": 1, "unchanged": 2})
+        self.assertEqual(summary["collections"]["changed"], 1)
+        self.assertFalse(SkosConcept.objects.filter(legacy_id=f"{uri}2").exists())
+        level_3 = SkosConcept.objects.get(id=level_3.id)
+        self.assertEqual(level_3.pref_label, "Level 3 changed")
+        self.assertEqual(level_3.broader_concept.legacy_id, f"{uri}4")
+        self.assertEqual(level_3.level, 2)
+        new = SkosConcept.objects.get(legacy_id=f"{uri}5")
+        self.assertEqual(new.broader_concept, level_3)
+        self.assertTrue(self.user.has_perm("change_skosconcept", new))
+        collection = SkosCollection.objects.get(legacy_id=f"{uri}collection")
+        self.assertEqual(sorted(collection.has_members.values_list("legacy_id", flat=True)), [f"{uri}3", f"{uri}5"])
+        self.assertEqual(self.update(["3", "5"])["concepts"]["unchanged"], 4)
+
+    def test_unresolved_broader(self):
+        self.concepts["3"] = ("missing", "Level 3")
+        summary = self.update(["2", "3"])
+        self.assertEqual(summary["unresolved_broader"], 1)
+        level_3 = SkosConcept.objects.get(legacy_id="https://vocabs.acdh.oeaw.ac.at/update/3")
+        self.assertIsNone(level_3.broader_concept)
+        self.assertEqual(level_3.level, 0)
+
+
 class TestSkosExport(TestCase):
     """Test module for SKOS export functionality."""
 
@@ -65,3 +457,377 @@ class TestSkosExport(TestCase):
     def test_skos_export(self):
         g = graph_construct_qs(SkosConcept.objects.all())
         self.assertEqual(Graph, type(g))
+
+    def object_graph(self, results):
+        """The graph of the concepts in `results` built from the as_graph() of each object"""
+        g = Graph()
+        g += results.first().scheme.as_graph()
+        for obj in results:
+            g.add((URIRef(obj.create_uri()), SKOS.inScheme, results.first().scheme.get_subject()))
+            g += obj.as_graph()
+            for x in obj.collection.all():
+                g += x.as_graph()
+                for i in x.creator.split(";") if x.creator else []:
+                    g.add((x.get_subject(), DC.creator, Literal(i.strip())))
+                for i in x.contributor.split(";") if x.contributor else []:
+                    g.add((x.get_subject(), DC.contributor, Literal(i.strip())))
+                for y in x.has_members.all():
+                    g.add((x.get_subject(), SKOS.member, URIRef(y.legacy_id or y.create_uri())))
+        return g
+
+    def test_skos_export_triples(self):
+        collection = SkosCollection.objects.first()
+        CollectionNote.objects.create(collection=collection, name="Note", language="en", note_type="scopeNote")
+        scheme = SkosConceptScheme.objects.first()
+        broader = SkosConcept.objects.create(**concept(scheme, "Without legacy id", self.user))
+        ConceptLabel.objects.create(concept=broader, name="Label", language="de", label_type="unknown")
+        SkosConcept.objects.create(**concept(scheme, "Narrower", self.user, broader=broader))
+        results = SkosConcept.objects.filter(scheme=scheme)
+        self.assertEqual(set(graph_construct_qs(results)), set(self.object_graph(results)))
+        # only a part of the scheme, the broader concept is not exported
+        results = SkosConcept.objects.filter(pref_label="Narrower")
+        self.assertEqual(set(graph_construct_qs(results)), set(self.object_graph(results)))
+
+    def test_streaming_export(self):
+        CollectionNote.objects.create(
+            collection=SkosCollection.objects.first(), name='Line 1\nLine 2 "quoted" <b>', language="en"
+        )
+        results = SkosConcept.objects.all()
+        expected = set(graph_construct_qs(results))
+        for export_format in STREAMING_SERIALIZERS:
+            with self.subTest(export_format=export_format):
+                g = Graph().parse(data="".join(serialize_qs(results, export_format)), format=export_format)
+                self.assertEqual(set(g), expected)
+        chunks = STREAMING_SERIALIZERS["nt"]().serialize(SkosExporter(results).blocks(), chunk_size=1)
+        self.assertGreater(len(list(chunks)), results.count())
+
+    def test_download_view(self):
+        response = self.client.get(reverse("vocabs:vocabs-download"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/rdf+xml; charset=utf-8")
+        g = Graph().parse(data=b"".join(response.streaming_content), format="xml")
+        self.assertEqual(set(g), set(graph_construct_qs(SkosConcept.objects.all())))
+        response = self.client.get(reverse("vocabs:vocabs-download"), {"format": "pretty-xml"})
+        self.assertFalse(response.streaming)
+
+    def test_export_task_format(self):
+        # export tasks and downloads default to the same streamed format
+        with patch.object(export_concept_schema, "delay") as delay:
+            self.client.get(reverse("vocabs:export"), {"schema-id": SkosConceptScheme.objects.first().id})
+        self.assertEqual(delay.call_args.args[1], "xml")
+        self.assertIn("xml", STREAMING_SERIALIZERS)
+
+    def test_many_narrower_concepts(self):
+        scheme = SkosConceptScheme.objects.first()
+        top = SkosConcept.objects.create(**concept(scheme, "Top", self.user))
+        SkosConcept.objects.bulk_create(
+            [
+                SkosConcept(
+                    **concept(scheme, f"Narrower {i}", self.user, broader=top),
+                    lft=1,
+                    rght=2,
+                    tree_id=top.tree_id,
+                    level=1,
+                )
+                for i in range(5000)
+            ]
+        )
+        results = SkosConcept.objects.filter(pk=top.pk)
+        g = graph_construct_qs(results)
+        self.assertEqual(len(list(g.objects(top.get_subject(), SKOS.narrower))), 5000)
+        streamed = Graph().parse(data="".join(serialize_qs(results, "nt")), format="nt")
+        self.assertEqual(set(streamed), set(g))
+
+    def test_skos_export_queries(self):
+        scheme = SkosConceptScheme.objects.first()
+        with CaptureQueriesContext(connection) as queries:
+            graph_construct_qs(SkosConcept.objects.filter(scheme=scheme))
+        for i in range(10):
+            item = SkosConcept.objects.create(**concept(scheme, f"Concept {i}", self.user))
+            ConceptLabel.objects.create(concept=item, name=f"Label {i}", language="en")
+            item.collection.add(SkosCollection.objects.first())
+        with self.assertNumQueries(len(queries)):
+            graph_construct_qs(SkosConcept.objects.filter(scheme=scheme))
+
+
+class TestExportCache(TestCase):
+    """Test module for the cached exports of concept schemes."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(**USER)
+        SkosImporter(file=EXAMPLE_SKOS_EXPORT, file_format="xml", language="en").upload_data(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.get()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def download(self):
+        params = {"format": "nt", "scheme": self.concept_scheme.id}
+        response = self.client.get(reverse("vocabs:vocabs-download"), params)
+        return response, b"".join(response.streaming_content)
+
+    def cached_files(self):
+        return os.listdir(os.path.join(self.tmp_dir.name, "export-cache", str(self.concept_scheme.id)))
+
+    def test_cached_download(self):
+        response, content = self.download()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertEqual(self.cached_files(), [f"{self.concept_scheme.content_version}-nt.nt"])
+        response, cached = self.download()
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(cached, content)
+        concept = SkosConcept.objects.filter(scheme=self.concept_scheme).first()
+        concept.pref_label = "Changed"
+        concept.save()
+        self.concept_scheme.refresh_from_db()
+        response, content = self.download()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertIn(b'"Changed"', content)
+        self.assertEqual(self.cached_files(), [f"{self.concept_scheme.content_version}-nt.nt"])
+
+    def test_content_version(self):
+        concept = SkosConcept.objects.filter(scheme=self.concept_scheme).first()
+        changes = [
+            lambda: ConceptLabel.objects.filter(concept__scheme=self.concept_scheme).first().delete(),
+            lambda: concept.collection.clear(),
+            lambda: CollectionNote.objects.create(collection=SkosCollection.objects.first(), name="Note"),
+            lambda: self.concept_scheme.has_titles.first().save(),
+        ]
+        versions = [self.concept_scheme.content_version]
+        for change in changes:
+            change()
+            self.concept_scheme.refresh_from_db()
+            versions.append(self.concept_scheme.content_version)
+        self.assertEqual(len(set(versions)), len(changes) + 1)
+
+    def test_content_version_on_delete(self):
+        concept = SkosConcept.objects.filter(scheme=self.concept_scheme, has_labels__isnull=False).first()
+        version = self.concept_scheme.content_version
+        with CaptureQueriesContext(connection) as queries:
+            concept.delete()
+        # the labels are deleted along with the concept without a version bump each
+        bump = 'UPDATE "vocabs_skosconceptscheme" SET "content_version"'
+        bumps = [query for query in queries if bump in query["sql"]]
+        self.assertEqual(len(bumps), 1)
+        self.concept_scheme.refresh_from_db()
+        self.assertNotEqual(self.concept_scheme.content_version, version)
+
+    def test_queryset_delete(self):
+        # e.g. the "delete selected" action of the admin
+        def versions():
+            schemes = SkosConceptScheme.objects.values_list("content_version", "tree_version")
+            return schemes.get(pk=self.concept_scheme.pk)
+
+        self.download()
+        before = versions()
+        label = ConceptLabel.objects.filter(concept__export_fragment__isnull=False).first()
+        ConceptLabel.objects.filter(pk=label.pk).delete()
+        self.assertFalse(ExportFragment.objects.filter(concept_id=label.concept_id).exists())
+        self.assertNotEqual(versions()[0], before[0])
+        self.download()
+        before = versions()
+        concept = SkosConcept.objects.filter(scheme=self.concept_scheme, broader_concept__isnull=False).last()
+        self.assertTrue(ExportFragment.objects.filter(concept_id=concept.broader_concept_id).exists())
+        SkosConcept.objects.filter(pk=concept.pk).delete()
+        self.assertFalse(ExportFragment.objects.filter(concept_id=concept.broader_concept_id).exists())
+        after = versions()
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+    def test_evict_stale(self):
+        self.download()
+        stale = SkosConceptScheme.objects.get(pk=self.concept_scheme.pk)
+        concept = SkosConcept.objects.filter(scheme=self.concept_scheme).first()
+        concept.pref_label = "Changed"
+        concept.save()
+        self.concept_scheme.refresh_from_db()
+        self.download()
+        # an instance read before the change keeps the export of the current version
+        self.assertEqual(evict_stale(stale), 0)
+        self.assertEqual(self.cached_files(), [f"{self.concept_scheme.content_version}-nt.nt"])
+
+    def test_prune_cache(self):
+        self.download()
+        self.concept_scheme.delete()
+        self.assertEqual(prune_cache(), 1)
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, "export-cache")), [])
+
+
+class TestSkosExportBenchmark(TestCase):
+    """Exports of a collection and a top concept with a growing number of members and narrower concepts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+
+    def create_scheme(self, size):
+        """A scheme with one collection of `size` members which are the narrower concepts of one top concept"""
+        scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user), identifier=f"https://example.org/{size}")
+        item = SkosCollection.objects.create(**collection_fields(scheme, self.user))
+        top = SkosConcept.objects.create(**concept(scheme, "Top", self.user))
+        concepts = SkosConcept.objects.bulk_create(
+            [
+                SkosConcept(
+                    **concept(scheme, f"Concept {i}", self.user, broader=top),
+                    lft=1,
+                    rght=2,
+                    tree_id=top.tree_id,
+                    level=1,
+                )
+                for i in range(size)
+            ]
+        )
+        SkosConcept.collection.through.objects.bulk_create(
+            [SkosConcept.collection.through(skosconcept_id=x.pk, skoscollection_id=item.pk) for x in concepts]
+        )
+        return scheme, item, top
+
+    def export(self, size):
+        """The number of queries and the graph of the export of a scheme of `size` members"""
+        scheme, item, top = self.create_scheme(size)
+        with CaptureQueriesContext(connection) as queries:
+            g = graph_construct_qs(SkosConcept.objects.filter(scheme=scheme))
+        self.assertEqual(len(list(g.objects(item.get_subject(), SKOS.member))), size)
+        self.assertEqual(len(list(g.objects(top.get_subject(), SKOS.narrower))), size)
+        return len(queries), g
+
+    def test_export_is_linear(self):
+        # within one batch of concepts the queries don't depend on the size and every concept adds the same triples
+        sizes = (100, 200, 400)
+        exports = [self.export(size) for size in sizes]
+        self.assertEqual(len({queries for queries, _ in exports}), 1)
+        triples = [len(g) for _, g in exports]
+        self.assertEqual(triples[2] - triples[1], 2 * (triples[1] - triples[0]))
+
+    @skipUnless(os.environ.get("VOCABS_BENCHMARKS"), "timing benchmark, run with VOCABS_BENCHMARKS=1")
+    def test_export_time_is_linear(self):
+        def export_time(size):
+            """The best of three export times"""
+            scheme = self.create_scheme(size)[0]
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                graph_construct_qs(SkosConcept.objects.filter(scheme=scheme))
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        small, large = export_time(250), export_time(1000)
+        # four times the members, a quadratic export would take about sixteen times as long
+        self.assertLess(large / small, 8)
+
+
+class TestTaskProgress(TestCase):
+    """Test module for the progress of import and export tasks."""
+
+    def test_task_progress(self):
+        states = []
+        task = SimpleNamespace(
+            request=SimpleNamespace(id="task-id"),
+            update_state=lambda **kwargs: states.append(kwargs),
+        )
+        progress = TaskProgress(task, interval=60)
+        progress("write", 0, 100)
+        progress("write", 10, 100)
+        progress("tree", 100, 100)
+        self.assertEqual([state["meta"]["phase"] for state in states], ["write", "tree"])
+        self.assertEqual(states[0]["state"], "PROGRESS")
+        self.assertEqual(states[0]["meta"]["total"], 100)
+
+    def test_task_progress_view(self):
+        TaskResult.objects.create(
+            task_id="task-id",
+            task_name="Import",
+            status="PROGRESS",
+            result=json.dumps({"phase": "write", "done": 10, "total": 100, "rate": 5.0, "eta": 18}),
+        )
+        response = self.client.get(reverse("vocabs:job-progress", kwargs={"task_id": "task-id"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["progress"]["eta"], 18)
+        response = self.client.get(reverse("vocabs:job-progress", kwargs={"task_id": "unknown"}))
+        self.assertEqual(response.json()["status"], "PENDING")
+
+
+class TestExportFragments(TestCase):
+    """Test module for the stored N-Triples fragments of concepts and collections."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(**USER)
+        SkosImporter(file=EXAMPLE_SKOS_EXPORT, file_format="xml", language="en").upload_data(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.get()
+        self.concepts = SkosConcept.objects.filter(scheme=self.concept_scheme)
+        self.other = SkosConcept.objects.create(**concept(self.concept_scheme, "Other", self.user))
+
+    def export(self):
+        exporter = SkosExporter(self.concepts)
+        graph = Graph().parse(data="".join(exporter.ntriples()), format="nt")
+        self.assertEqual(set(graph), set(graph_construct_qs(self.concepts)))
+        return exporter.built
+
+    def test_fragments(self):
+        built = self.export()
+        self.assertEqual(built["concept_id"], self.concepts.count())
+        self.assertEqual(ExportFragment.objects.filter(concept__isnull=False).count(), self.concepts.count())
+        self.assertEqual(ExportFragment.objects.filter(collection__isnull=False).count(), built["collection_id"])
+        built = self.export()
+        self.assertEqual(sum(built.values()), 0)
+        content = "".join(serialize_qs(self.concepts, "nt", fragments=True))
+        self.assertEqual(content, "".join(serialize_qs(self.concepts, "nt", fragments=True)))
+
+    def test_changed_concept(self):
+        self.export()
+        concept = self.concepts.filter(broader_concept__isnull=False, narrower_concepts__isnull=False).first()
+        concept.pref_label = "Changed"
+        concept.save()
+        built = self.export()
+        # the concept, its broader and its narrower concept have its URI in their triples
+        self.assertEqual(built["concept_id"], 3)
+        self.assertEqual(built["collection_id"], concept.collection.count())
+        ConceptLabel.objects.create(concept=concept, name="Label", language="en")
+        self.assertEqual(self.export()["concept_id"], 1)
+
+    def test_moved_concept(self):
+        self.export()
+        leaf = self.concepts.filter(broader_concept__broader_concept__isnull=False).first()
+        leaf.broader_concept = self.other
+        leaf.save()
+        # the concept, its former and its new broader concept
+        self.assertEqual(self.export()["concept_id"], 3)
+        leaf.delete()
+        self.assertEqual(self.export(), {"concept_id": 1, "collection_id": 1})
+
+    def test_deleted_concepts(self):
+        self.export()
+        ConceptLabel.objects.filter(concept__scheme=self.concept_scheme).first().delete()
+        self.assertEqual(self.export(), {"concept_id": 1, "collection_id": 0})
+        # deletes the narrower concept too, the broader concept and the collection lose their URIs
+        self.concepts.filter(broader_concept__isnull=False, narrower_concepts__isnull=False).first().delete()
+        self.assertEqual(self.export(), {"concept_id": 1, "collection_id": 1})
+
+    def test_changed_members(self):
+        self.export()
+        collection = SkosCollection.objects.get(scheme=self.concept_scheme)
+        self.other.collection.add(collection)
+        self.assertEqual(self.export(), {"concept_id": 0, "collection_id": 1})
+        self.other.collection.clear()
+        self.assertEqual(self.export(), {"concept_id": 0, "collection_id": 1})
+        collection.has_members.clear()
+        self.assertFalse(ExportFragment.objects.filter(collection=collection).exists())
+
+    def test_changed_scheme(self):
+        self.export()
+        other_scheme = SkosConceptScheme.objects.create(
+            **concept_scheme(self.user), identifier="https://example.org/other/"
+        )
+        unrelated = SkosConcept.objects.create(**concept(other_scheme, "Unrelated", self.user))
+        "".join(SkosExporter(SkosConcept.objects.filter(scheme=other_scheme)).ntriples())
+        self.concept_scheme.title = "Changed"
+        self.concept_scheme.save()
+        self.assertEqual(sum(self.export().values()), 0)
+        self.concept_scheme.identifier = "https://example.org/changed/"
+        self.concept_scheme.save()
+        self.assertEqual(self.export()["concept_id"], self.concepts.count())
+        # fragments without URIs of the changed scheme are kept
+        self.assertTrue(ExportFragment.objects.filter(concept=unrelated).exists())
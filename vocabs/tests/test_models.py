@@ -1,8 +1,18 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from guardian.models import UserObjectPermission
+from rdflib import DC, DCTERMS, SKOS, Graph, Literal, URIRef
 
 from .constants import USER, concept_scheme, collection, concept
-from ..models import SkosConceptScheme, SkosCollection, SkosConcept
+from ..models import ConceptNote, ConceptRelation, SkosConceptScheme, SkosCollection, SkosConcept, inferred_relations
+from ..permissions import grant_permissions, objects_for_user
+from ..utils import PREDICATE_PLANS, modelprops_to_graph
 
 
 class ConceptSchemeTest(TestCase):
@@ -45,3 +55,242 @@ class ConceptTest(TestCase):
         concept_one = SkosConcept.objects.get(pref_label="Concept 1")
         self.assertEqual(concept_one.pref_label, "Concept 1")
         self.assertEqual(len(SkosConcept.objects.all()), 1)
+
+    def test_as_graph_target(self):
+        g = Graph()
+        self.assertIs(self.concept_scheme.as_graph(g), g)
+        self.assertIs(self.concept.as_graph(g), g)
+        ConceptNote.objects.create(concept=self.concept, name="Note", language="en")
+        triples = set()
+        self.concept.as_graph(triples)
+        self.assertEqual(triples, set(self.concept.as_graph()))
+        self.assertLessEqual(set(self.concept.as_graph()), set(g) | triples)
+
+    def test_predicate_plan(self):
+        self.assertIn(("vocabs.SkosConcept", ()), PREDICATE_PLANS)
+        self.concept.exact_match = "https://example.org/a, ,https://example.org/b"
+        self.concept.creator = "A; B"
+        subj = self.concept.get_subject()
+        triples = set(modelprops_to_graph(self.concept, subj, set()))
+        self.assertLessEqual(
+            {
+                (subj, SKOS.exactMatch, URIRef("https://example.org/a")),
+                (subj, SKOS.exactMatch, URIRef("https://example.org/b")),
+                (subj, DC.creator, Literal("A")),
+                (subj, DC.creator, Literal("B")),
+                (subj, DCTERMS.created, Literal(self.concept.date_created)),
+            },
+            triples,
+        )
+        note = ConceptNote(concept=self.concept, name="Note", language="en", note_type="unknown")
+        self.assertEqual(set(note.as_graph()), {(subj, SKOS.note, Literal("Note", lang="en"))})
+
+    def test_stored_uri(self):
+        self.assertEqual(SkosConcept.objects.get().uri, self.concept.build_uri())
+        self.concept.legacy_id = "https://example.org/concept"
+        self.concept.save()
+        self.assertEqual(SkosConcept.objects.get().uri, "https://example.org/concept")
+        self.concept.legacy_id = ""
+        self.concept.save()
+        self.concept_scheme.identifier = "https://example.org/changed"
+        self.concept_scheme.save()
+        self.assertEqual(SkosConcept.objects.get().uri, f"https://example.org/changed/concept{self.concept.id}")
+
+
+class ConceptRelationTest(TestCase):
+    """Test module for the ConceptRelation rows of the relation fields"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.broader = SkosConcept.objects.create(**concept(self.concept_scheme, "Broader", self.user))
+        self.concept = SkosConcept.objects.create(
+            exact_match="https://d-nb.info/gnd/1, https://d-nb.info/gnd/2,",
+            broad_match=self.broader.uri,
+            **concept(self.concept_scheme, "Concept", self.user),
+        )
+
+    def relations(self):
+        return set(ConceptRelation.objects.values_list("concept_id", "relation", "target"))
+
+    def test_sync(self):
+        self.assertEqual(
+            self.relations(),
+            {
+                (self.concept.id, "exact_match", "https://d-nb.info/gnd/1"),
+                (self.concept.id, "exact_match", "https://d-nb.info/gnd/2"),
+                (self.concept.id, "broad_match", self.broader.uri),
+            },
+        )
+        self.concept.exact_match = "https://d-nb.info/gnd/2"
+        self.concept.related = self.broader.uri
+        self.concept.save()
+        self.assertEqual(
+            self.relations(),
+            {
+                (self.concept.id, "exact_match", "https://d-nb.info/gnd/2"),
+                (self.concept.id, "broad_match", self.broader.uri),
+                (self.concept.id, "related", self.broader.uri),
+            },
+        )
+
+    def test_lookup(self):
+        matches = SkosConcept.objects.with_relation("exact_match", "https://d-nb.info/gnd/1")
+        self.assertEqual(list(matches), [self.concept])
+        self.assertEqual(list(SkosConcept.objects.with_relation("narrow_match", self.concept.uri)), [])
+        self.assertEqual(
+            list(SkosConcept.objects.with_relation("narrow_match", self.concept.uri, inferred=True)), [self.broader]
+        )
+        self.assertEqual(inferred_relations(self.broader), {"narrow_match": [self.concept.uri]})
+
+
+class ConceptTreeTest(TestCase):
+    """Test module for the scheme scoped SkosConcept tree rebuild"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.other_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        b = SkosConcept.objects.create(**concept(self.concept_scheme, "B", self.user))
+        c = SkosConcept.objects.create(**concept(self.concept_scheme, "C", self.user, broader=b))
+        SkosConcept.objects.create(**concept(self.concept_scheme, "D", self.user, broader=c))
+        SkosConcept.objects.create(**concept(self.concept_scheme, "A", self.user))
+        SkosConcept.objects.create(**concept(self.other_scheme, "X", self.user))
+
+    def tree_fields(self, scheme):
+        return {
+            x["pref_label"]: x
+            for x in SkosConcept.objects.filter(scheme=scheme).values("pref_label", "lft", "rght", "tree_id", "level")
+        }
+
+    def test_rebuild_scheme(self):
+        expected = self.tree_fields(self.concept_scheme)
+        other = self.tree_fields(self.other_scheme)
+        SkosConcept.objects.filter(scheme=self.concept_scheme).update(lft=0, rght=0, tree_id=0, level=0)
+        SkosConcept.objects.rebuild_scheme(self.concept_scheme)
+        rebuilt = self.tree_fields(self.concept_scheme)
+        for label in ["A", "B", "C", "D"]:
+            for field in ["lft", "rght", "level"]:
+                self.assertEqual(rebuilt[label][field], expected[label][field])
+        self.assertEqual(rebuilt["B"]["tree_id"], rebuilt["D"]["tree_id"])
+        self.assertLess(rebuilt["A"]["tree_id"], rebuilt["B"]["tree_id"])
+        self.assertNotIn(other["X"]["tree_id"], [rebuilt["A"]["tree_id"], rebuilt["B"]["tree_id"]])
+        self.assertEqual(self.tree_fields(self.other_scheme), other)
+        self.assertEqual(SkosConcept.objects.rebuild_scheme(self.concept_scheme), 0)
+
+    def test_allocate_tree_ids(self):
+        highest = max(x["tree_id"] for x in self.tree_fields(self.other_scheme).values())
+        first = SkosConcept.objects.allocate_tree_ids(3)
+        self.assertEqual(first, highest + 1)
+        self.assertEqual(SkosConcept.objects.allocate_tree_ids(1), first + 3)
+        # new top concepts get their tree id from the same sequence
+        last = SkosConcept.objects.create(**concept(self.other_scheme, "Z", self.user))
+        self.assertEqual(last.tree_id, first + 4)
+
+
+class PermissionsTest(TestCase):
+    """Test module for the object permissions of concept schemes, collections and concepts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.curator = User.objects.create_user(username="curator", password="12345")
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.collection = SkosCollection.objects.create(**collection(self.concept_scheme, self.user))
+        self.concepts = [
+            SkosConcept.objects.create(**concept(self.concept_scheme, f"Concept {i}", self.user)) for i in range(3)
+        ]
+
+    def test_created_by(self):
+        self.assertTrue(self.user.has_perm("delete_skosconceptscheme", self.concept_scheme))
+        self.assertTrue(self.user.has_perm("change_skoscollection", self.collection))
+        self.assertTrue(self.user.has_perm("view_skosconcept", self.concepts[0]))
+        self.assertFalse(self.curator.has_perm("view_skosconcept", self.concepts[0]))
+
+    def test_existing_permissions_are_skipped(self):
+        queryset = SkosConcept.objects.filter(scheme=self.concept_scheme)
+        self.assertEqual(grant_permissions([self.user], queryset), 0)
+        self.assertEqual(grant_permissions([self.user, self.curator], queryset, actions=["view"]), 3)
+
+    def test_curators(self):
+        self.concept_scheme.curator.add(self.curator)
+        curator = User.objects.get(pk=self.curator.pk)
+        self.assertTrue(curator.has_perm("change_skosconceptscheme", self.concept_scheme))
+        self.assertTrue(curator.has_perm("change_skoscollection", self.collection))
+        for item in self.concepts:
+            self.assertTrue(curator.has_perm("delete_skosconcept", item))
+        new_concept = SkosConcept.objects.create(**concept(self.concept_scheme, "New", self.user))
+        self.assertTrue(curator.has_perm("change_skosconcept", new_concept))
+        self.concept_scheme.curator.remove(self.curator)
+        curator = User.objects.get(pk=self.curator.pk)
+        self.assertFalse(curator.has_perm("change_skosconceptscheme", self.concept_scheme))
+        self.assertFalse(curator.has_perm("view_skosconcept", new_concept))
+
+    def test_large_scheme_uses_task(self):
+        with patch("vocabs.permissions.ASYNC_THRESHOLD", 2), patch("vocabs.tasks.scheme_permissions.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.concept_scheme.curator.add(self.curator)
+        delay.assert_called_once_with(
+            [self.curator.pk], self.concept_scheme.pk, ["delete", "change", "view"], revoke=False
+        )
+        self.assertFalse(self.curator.has_perm("view_skosconcept", self.concepts[0]))
+
+
+class SchemePermissionsTest(TestCase):
+    """Test module for collection and concept permissions derived from the concept scheme"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.curator = User.objects.create_user(username="curator", password="12345")
+        self.other = User.objects.create_user(username="other", password="12345")
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.concept = SkosConcept.objects.create(**concept(self.concept_scheme, "Concept", self.user))
+
+    def object_permissions(self, obj):
+        return UserObjectPermission.objects.filter(content_type__model=obj._meta.model_name, object_pk=str(obj.pk))
+
+    def test_collapse_object_permissions(self):
+        self.concept_scheme.curator.add(self.curator)
+        self.assertEqual(self.object_permissions(self.concept).count(), 6)
+        call_command("collapse_object_permissions", "--dry-run", stdout=StringIO())
+        self.assertEqual(self.object_permissions(self.concept).count(), 6)
+        with override_settings(VOCABS_SCHEME_PERMISSIONS=True):
+            call_command("collapse_object_permissions", stdout=StringIO())
+            self.assertFalse(self.object_permissions(self.concept).exists())
+            curator = User.objects.get(pk=self.curator.pk)
+            self.assertTrue(curator.has_perm("vocabs.delete_skosconcept", self.concept))
+            self.assertTrue(curator.has_perm("change_skosconceptscheme", self.concept_scheme))
+
+    @override_settings(VOCABS_SCHEME_PERMISSIONS=True)
+    def test_no_object_permissions_written(self):
+        new_concept = SkosConcept.objects.create(**concept(self.concept_scheme, "New", self.user))
+        self.concept_scheme.curator.add(self.curator)
+        self.assertFalse(self.object_permissions(new_concept).exists())
+        self.assertTrue(self.user.has_perm("change_skosconcept", new_concept))
+        self.assertTrue(User.objects.get(pk=self.curator.pk).has_perm("view_skosconcept", new_concept))
+        self.assertFalse(self.other.has_perm("view_skosconcept", new_concept))
+        self.concept_scheme.curator.remove(self.curator)
+        self.assertFalse(User.objects.get(pk=self.curator.pk).has_perm("view_skosconcept", new_concept))
+
+    @override_settings(VOCABS_SCHEME_PERMISSIONS=True)
+    def test_scheme_permission_cache(self):
+        concepts = [SkosConcept.objects.create(**concept(self.concept_scheme, f"C{i}", self.user)) for i in range(5)]
+        curator = User.objects.get(pk=self.curator.pk)
+        self.assertFalse(curator.has_perm("view_skosconcept", self.concept))
+        self.concept_scheme.curator.add(self.curator)
+        # the schemes are read once per user object, a user fetched again sees the new curator
+        curator = User.objects.get(pk=self.curator.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(all(curator.has_perm("change_skosconcept", obj) for obj in concepts))
+        scheme_queries = [q for q in queries.captured_queries if "vocabs_skosconceptscheme" in q["sql"]]
+        self.assertEqual(len(scheme_queries), 1)
+
+    @override_settings(VOCABS_SCHEME_PERMISSIONS=True)
+    def test_objects_for_user(self):
+        self.concept_scheme.curator.add(self.curator)
+        with CaptureQueriesContext(connection) as queries:
+            concepts = list(objects_for_user(self.curator, ["view_skosconcept"], SkosConcept))
+        self.assertEqual(concepts, [self.concept])
+        self.assertIn('"scheme_id" IN', queries.captured_queries[-1]["sql"])
+        self.assertNotIn("guardian", queries.captured_queries[-1]["sql"])
+        self.assertFalse(objects_for_user(self.other, "view_skosconcept", SkosConcept).exists())
+        self.assertEqual(objects_for_user(self.curator, "view_skosconceptscheme", SkosConceptScheme).count(), 1)
@@ -1,5 +1,13 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .constants import USER, concept, concept_scheme
+from ..hierarchy import tree_html
+from ..models import ConceptLabel, SkosConcept, SkosConceptScheme
 
 
 class VocabsTest(TestCase):
@@ -21,3 +29,182 @@ class VocabsTest(TestCase):
         form_data = {"pref_label": "test concept"}
         rv = self.client.post("/vocabs/concepts/create/", form_data, follow=True)
         self.assertContains(rv, "test concept")
+
+    def test_scheme_download_links(self):
+        user = User.objects.get(username="temporary")
+        scheme = SkosConceptScheme.objects.create(**concept_scheme(user))
+        download = f"{reverse('vocabs:vocabs-download')}?scheme={scheme.id}"
+        self.assertNotContains(self.client.get(scheme.get_absolute_url()), download)
+        SkosConcept.objects.create(**concept(scheme, "Concept", user))
+        self.assertContains(self.client.get(scheme.get_absolute_url()), download)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.client.force_login(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.concept = SkosConcept.objects.create(**concept(self.concept_scheme, "Concept", self.user))
+
+    def assertNotModified(self, url, data=None):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        response = self.client.get(url, data, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        return response
+
+    def test_detail_pages(self):
+        for obj in (self.concept_scheme, self.concept):
+            with self.subTest(obj=obj):
+                response = self.assertNotModified(obj.get_absolute_url())
+                self.assertIn("private", response["Cache-Control"])
+        etag = self.client.get(self.concept_scheme.get_absolute_url())["ETag"]
+        ConceptLabel.objects.create(concept=self.concept, name="Label", language="en")
+        response = self.client.get(self.concept_scheme.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_download(self):
+        url = reverse("vocabs:vocabs-download")
+        response = self.assertNotModified(url, {"scheme": self.concept_scheme.id, "format": "nt"})
+        self.assertIn("public", response["Cache-Control"])
+        last_modified = self.client.get(url, {"format": "turtle"})["Last-Modified"]
+        response = self.client.get(url, {"format": "turtle"}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_api(self):
+        self.assertNotModified(f"/api/skosconcepts/{self.concept.id}/")
+        self.assertNotModified("/api/skosconceptschemes/", {"format": "json"})
+        etag = self.client.get("/api/skosconcepts/", {"format": "json"})["ETag"]
+        self.concept.pref_label = "Changed"
+        self.concept.save()
+        response = self.client.get("/api/skosconcepts/", {"format": "json"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Changed")
+
+
+class ResolveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.client.force_login(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.concept = SkosConcept.objects.create(
+            notation="A1", legacy_id="https://example.org/a1", **concept(self.concept_scheme, "A", self.user)
+        )
+        self.other = SkosConcept.objects.create(notation="A1", **concept(self.concept_scheme, "B", self.user))
+
+    def test_resolve(self):
+        data = {
+            "uris": [self.other.uri, "https://example.org/missing"],
+            "notations": ["A1"],
+            "legacy_ids": ["https://example.org/a1"],
+        }
+        response = self.client.post("/api/skosconcepts/resolve/", data, content_type="application/json")
+        self.assertEqual(
+            response.json(),
+            {
+                "uris": {self.other.uri: [self.other.id], "https://example.org/missing": []},
+                "notations": {"A1": [self.concept.id, self.other.id]},
+                "legacy_ids": {"https://example.org/a1": [self.concept.id]},
+            },
+        )
+
+    def test_resolve_visible(self):
+        self.client.force_login(User.objects.create_user("other", password="12345"))
+        data = {"notations": ["A1"]}
+        response = self.client.post("/api/skosconcepts/resolve/", data, content_type="application/json")
+        self.assertEqual(response.json()["notations"], {"A1": []})
+
+
+class RelationsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.client.force_login(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.concept = SkosConcept.objects.create(**concept(self.concept_scheme, "A", self.user))
+        self.other = SkosConcept.objects.create(
+            related=self.concept.uri, **concept(self.concept_scheme, "B", self.user)
+        )
+
+    def test_relations(self):
+        response = self.client.get(f"/api/skosconcepts/{self.concept.id}/relations/", {"format": "json"})
+        self.assertEqual(response.json(), {"relations": {}, "inferred": {"related": [self.other.uri]}})
+        params = {"format": "json", "relation": "related", "target": self.concept.uri}
+        response = self.client.get("/api/skosconcepts/with_relation/", params)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.other.id])
+
+
+class HierarchyTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(**USER)
+        self.client.force_login(self.user)
+        self.concept_scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+        self.top = SkosConcept.objects.create(**concept(self.concept_scheme, "top", self.user))
+        self.middle = SkosConcept.objects.create(**concept(self.concept_scheme, "middle", self.user, self.top))
+        self.bottom = SkosConcept.objects.create(**concept(self.concept_scheme, "bottom", self.user, self.middle))
+        self.other = SkosConcept.objects.create(**concept(self.concept_scheme, "other", self.user))
+        self.url = reverse("vocabs:concept_children", kwargs={"pk": self.concept_scheme.id})
+
+    def test_children(self):
+        children = self.client.get(self.url).json()["children"]
+        self.assertEqual(
+            [(node["id"], node["has_children"]) for node in children], [(self.other.id, False), (self.top.id, True)]
+        )
+        children = self.client.get(self.url, {"parent": self.middle.id}).json()["children"]
+        self.assertEqual([node["id"] for node in children], [self.bottom.id])
+        self.assertEqual(children[0]["url"], self.bottom.get_absolute_url())
+        self.assertEqual(self.client.get(self.url, {"parent": 0}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {"parent": "x"}).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_sidebar(self):
+        response = self.client.get(self.middle.get_absolute_url())
+        self.assertEqual([node["id"] for node in response.context["tree_nodes"]], [self.other.id, self.top.id])
+        self.assertContains(response, f"?parent={self.middle.id}")
+        self.assertContains(response, self.bottom.get_absolute_url())
+        response = self.client.get(self.concept_scheme.get_absolute_url())
+        self.assertNotContains(response, self.middle.get_absolute_url())
+
+    def tree_version(self):
+        return SkosConceptScheme.objects.values_list("tree_version", flat=True).get(pk=self.concept_scheme.pk)
+
+    def test_tree_version(self):
+        version = self.tree_version()
+        self.bottom.notation = "b"
+        self.bottom.save()
+        self.assertEqual(self.tree_version(), version)
+        for change in (
+            lambda: setattr(self.bottom, "pref_label", "lowest"),
+            lambda: setattr(self.bottom, "broader_concept", self.top),
+            lambda: setattr(self.bottom, "needs_review", True),
+        ):
+            change()
+            self.bottom.save()
+            self.assertNotEqual(self.tree_version(), version)
+            version = self.tree_version()
+        self.bottom.delete()
+        self.assertNotEqual(self.tree_version(), version)
+
+    def test_full_tree(self):
+        self.concept_scheme.refresh_from_db()
+        html = tree_html(self.concept_scheme)
+        self.assertEqual(cache.get(f"vocabs-tree:{self.concept_scheme.pk}:{self.concept_scheme.tree_version}"), html)
+        self.assertIn(self.bottom.get_absolute_url(), html)
+        response = self.client.get(self.middle.get_absolute_url(), {"tree": "full"})
+        self.assertContains(response, f'data-concept="{self.middle.id}" class="fw-bold" aria-current="page"')
+        self.assertContains(response, self.bottom.get_absolute_url())
+        self.assertNotIn('aria-current="page"', tree_html(self.concept_scheme))
+
+    def test_scheme_delete(self):
+        def delete_queries(size):
+            scheme = SkosConceptScheme.objects.create(**concept_scheme(self.user))
+            for i in range(size):
+                item = SkosConcept.objects.create(**concept(scheme, f"concept {i}", self.user))
+                ConceptLabel.objects.create(concept=item, name="label", language="en")
+            with CaptureQueriesContext(connection) as queries:
+                scheme.delete()
+            return len(queries)
+
+        # the concepts and labels are deleted in bulk, without queries per row
+        self.assertEqual(delete_queries(2), delete_queries(6))
@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from vocabs.import_export_views import import_async, export_async, TaskResultListView
+from vocabs.import_export_views import import_async, export_async, task_progress, TaskResultListView
 
 
 app_name = "vocabs"
@@ -29,6 +29,11 @@ urlpatterns = [
         views.SkosConceptSchemeDetailView.as_view(),
         name="skosconceptscheme_detail",
     ),
+    path(
+        "scheme/<int:pk>/children/",
+        views.concept_children,
+        name="concept_children",
+    ),
     path(
         "scheme/create/",
         views.SkosConceptSchemeCreate.as_view(),
@@ -83,4 +88,5 @@ urlpatterns = [
     path("import/", import_async, name="import"),
     path("export/", export_async, name="export"),
     path("job-status/", TaskResultListView.as_view(), name="job-status"),
+    path("job-status/<str:task_id>/", task_progress, name="job-progress"),
 ]
@@ -82,30 +82,88 @@ class MyGraph(Graph):
         return default
 
 
-def modelprops_to_graph(obj, subj, g):
-    for field in obj._meta.fields:
-        if hasattr(field, "extra") and "predicate" in field.extra:
-            value = getattr(obj, field.name)
+def predicate_fields(model):
+    """The fields of `model` with a predicate in their extra, see set_extra()"""
+    return [field for field in model._meta.fields if hasattr(field, "extra") and "predicate" in field.extra]
+
+
+def field_converter(field):
+    """
+    Compiles the set_extra() metadata of `field` into a function of the subject
+    and a non-empty value of the field that returns the triples of the value
+    """
+    predicate = field.extra["predicate"]
+    datatype = field.extra.get("datatype")
+    if "splitter" in field.extra:
+        splitter = field.extra["splitter"]
+        if field.extra.get("as_uri"):
+            term = URIRef
+        elif datatype is not None:
+
+            def term(item):
+                return Literal(item, datatype=datatype)
+
+        else:
+            term = Literal
+
+        def convert(subj, value):
+            return [(subj, predicate, term(item)) for item in map(str.strip, value.split(splitter)) if item]
+
+    else:
+
+        def convert(subj, value):
+            return [(subj, predicate, Literal(value, datatype=datatype))]
+
+    return convert
+
+
+class PredicatePlan(object):
+    """
+    The triples of the fields of a model with a predicate in their extra,
+    compiled once per model so the values of an object or of a values() row
+    are turned into triples without looking at the field metadata again
+    """
+
+    def __init__(self, fields):
+        self.field_names = [field.name for field in fields]
+        self.converters = [field_converter(field) for field in fields]
+
+    def triples(self, subj, values):
+        """The triples of `values`, a sequence of field values in the order of field_names"""
+        for convert, value in zip(self.converters, values):
             if value:
-                predicate = field.extra["predicate"]
-                if "splitter" in field.extra:
-                    splitter = field.extra["splitter"]
-                    for item in value.split(splitter):
-                        item = item.strip()
-                        if item:
-                            if field.extra.get("as_uri"):
-                                g.add((subj, predicate, URIRef(item)))
-                            else:
-                                try:
-                                    g.add((subj, predicate, Literal(item, datatype=field.extra["datatype"])))
-                                except KeyError:
-                                    g.add((subj, predicate, Literal(item)))
-                else:
-                    try:
-                        g.add((subj, predicate, Literal(value, datatype=field.extra["datatype"])))
-                    except KeyError:
-                        g.add((subj, predicate, Literal(value)))
-    return g
+                yield from convert(subj, value)
+
+    def add(self, subj, values, g):
+        for triple in self.triples(subj, values):
+            g.add(triple)
+        return g
+
+    def add_row(self, subj, row, g):
+        """Adds the triples of a values() dict with the field_names to `g`"""
+        return self.add(subj, [row[name] for name in self.field_names], g)
+
+
+PREDICATE_PLANS = {}
+
+
+def predicate_plan(model, exclude=()):
+    """The PredicatePlan of `model` without the fields in `exclude`, compiled on first use"""
+    key = (model._meta.label, tuple(exclude))
+    if key not in PREDICATE_PLANS:
+        PREDICATE_PLANS[key] = PredicatePlan([field for field in predicate_fields(model) if field.name not in exclude])
+    return PREDICATE_PLANS[key]
+
+
+def compile_predicate_plans(models):
+    """Compiles the PredicatePlan of `models` up front, see VocabsConfig.ready()"""
+    for model in models:
+        predicate_plan(model)
+
+
+def modelprops_to_graph(obj, subj, g):
+    plan = predicate_plan(obj._meta.model)
+    return plan.add(subj, [getattr(obj, name) for name in plan.field_names], g)
 
 
 def push_to_gh(
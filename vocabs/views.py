@@ -1,18 +1,26 @@
 import datetime
+import os
 import time
 
 from browsing.utils import BaseCreateView, BaseUpdateView, GenericListView
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import DeleteView
-from guardian.shortcuts import get_objects_for_user
 from reversion.models import Version
 
+from vocabs.conditional import (
+    ConditionalDetailMixin,
+    conditional_response,
+    object_validators,
+    scheme_validators,
+    set_validators,
+)
+from vocabs.export_cache import cache_enabled, cache_path, cached_chunks
 from vocabs.filters import (
     SkosCollectionListFilter,
     SkosConceptListFilter,
@@ -36,15 +44,24 @@ from vocabs.forms import (
     SkosConceptSchemeForm,
     SkosConceptSchemeFormHelper,
 )
+from vocabs.hierarchy import child_nodes, highlight, sidebar_nodes, tree_html
 from vocabs.models import SkosCollection, SkosConcept, SkosConceptScheme
-from vocabs.rdf_utils import RDF_FORMATS, graph_construct_qs
+from vocabs.permissions import objects_for_user
+from vocabs.rdf_utils import (
+    DEFAULT_EXPORT_FORMAT,
+    RDF_CONTENT_TYPES,
+    RDF_FORMATS,
+    STREAMING_SERIALIZERS,
+    graph_construct_qs,
+    serialize_qs,
+)
 from vocabs.tables import SkosCollectionTable, SkosConceptSchemeTable, SkosConceptTable
 from vocabs.utils import delete_legacy_ids, delete_skos_notations
 
 
-class BaseDetailView(DetailView):
+class BaseDetailView(ConditionalDetailMixin, DetailView):
     def get_queryset(self, **kwargs):
-        qs = get_objects_for_user(
+        qs = objects_for_user(
             self.request.user,
             perms=[
                 "view_{}".format(self.model.__name__.lower()),
@@ -63,7 +80,7 @@ class BaseDetailView(DetailView):
 
 class BaseDeleteView(DeleteView):
     def get_queryset(self, **kwargs):
-        qs = get_objects_for_user(
+        qs = objects_for_user(
             self.request.user,
             perms=[
                 "view_{}".format(self.model.__name__.lower()),
@@ -94,16 +111,15 @@ class SkosConceptSchemeListView(GenericListView):
 
     def get_queryset(self, **kwargs):
         qs = super(SkosConceptSchemeListView, self).get_queryset()
-        allowed = get_objects_for_user(
+        return objects_for_user(
             self.request.user,
             perms=[
                 "view_{}".format(self.model.__name__.lower()),
                 "change_{}".format(self.model.__name__.lower()),
                 "delete_{}".format(self.model.__name__.lower()),
             ],
-            klass=self.model,
+            klass=qs,
         )
-        return qs.filter(id__in=allowed)
 
 
 class SkosConceptSchemeDetailView(BaseDetailView):
@@ -113,9 +129,34 @@ class SkosConceptSchemeDetailView(BaseDetailView):
     def get_context_data(self, **kwargs):
         context = super(SkosConceptSchemeDetailView, self).get_context_data(**kwargs)
         context["concepts"] = SkosConcept.objects.filter(scheme=self.kwargs.get("pk"))
+        if self.request.GET.get("tree") == "full":
+            context["tree_html"] = tree_html(self.object)
+        else:
+            context["tree_nodes"] = sidebar_nodes(self.object.pk)
         return context
 
 
+def concept_children(request, pk):
+    """
+    The top concepts of a concept scheme, or with `?parent=<id>` the narrower
+    concepts of one of its concepts, as JSON for the hierarchy in the sidebar
+    """
+    perms = [f"{action}_skosconceptscheme" for action in ("view", "change", "delete")]
+    concept_scheme = objects_for_user(request.user, perms=perms, klass=SkosConceptScheme).filter(pk=pk).first()
+    parent_id = request.GET.get("parent", "")
+    parent = None
+    if concept_scheme is not None and parent_id.isdigit():
+        parent = SkosConcept.objects.filter(pk=parent_id, scheme=concept_scheme).first()
+    # handler404 renders an HTML page, the hierarchy script expects JSON
+    if concept_scheme is None or (parent_id and parent is None):
+        return JsonResponse({"detail": "Not found."}, status=404)
+    etag, last_modified = object_validators(concept_scheme, request.user, "children", parent_id)
+    response = conditional_response(request, etag, last_modified)
+    if response is None:
+        response = JsonResponse({"children": child_nodes(concept_scheme.pk, parent)})
+    return set_validators(response, etag, last_modified)
+
+
 @login_required
 def delete_legacy_id_view(request, pk):
     obj = get_object_or_404(SkosConceptScheme, pk=pk)
@@ -281,16 +322,15 @@ class SkosCollectionListView(GenericListView):
 
     def get_queryset(self, **kwargs):
         qs = super(SkosCollectionListView, self).get_queryset()
-        allowed = get_objects_for_user(
+        return objects_for_user(
             self.request.user,
             perms=[
                 "view_{}".format(self.model.__name__.lower()),
                 "change_{}".format(self.model.__name__.lower()),
                 "delete_{}".format(self.model.__name__.lower()),
             ],
-            klass=self.model,
+            klass=qs,
         )
-        return qs.filter(id__in=allowed)
 
 
 class SkosCollectionDetailView(BaseDetailView):
@@ -436,16 +476,15 @@ class SkosConceptListView(GenericListView):
 
     def get_queryset(self, **kwargs):
         qs = super(SkosConceptListView, self).get_queryset()
-        allowed = get_objects_for_user(
+        return objects_for_user(
             self.request.user,
             perms=[
                 "view_{}".format(self.model.__name__.lower()),
                 "change_{}".format(self.model.__name__.lower()),
                 "delete_{}".format(self.model.__name__.lower()),
             ],
-            klass=self.model,
+            klass=qs.order_by("id"),
         )
-        return qs.filter(id__in=allowed).order_by("id")
 
 
 class SkosConceptDetailView(BaseDetailView):
@@ -455,6 +494,10 @@ class SkosConceptDetailView(BaseDetailView):
 
     def get_context_data(self, **kwargs):
         context = super(SkosConceptDetailView, self).get_context_data(**kwargs)
+        if self.request.GET.get("tree") == "full":
+            context["tree_html"] = highlight(tree_html(self.object.scheme), self.object.pk)
+        else:
+            context["tree_nodes"] = sidebar_nodes(self.object.scheme_id, self.object)
         return context
 
 
@@ -588,13 +631,43 @@ class SkosConceptDL(GenericListView):
     filter_class = SkosConceptListFilter
     formhelper_class = SkosConceptFormHelper
 
+    def get(self, request, *args, **kwargs):
+        scheme_id = request.GET.get("scheme", "")
+        if set(request.GET) - {"format"} == {"scheme"} and scheme_id.isdigit():
+            schemes = SkosConceptScheme.objects.filter(pk=scheme_id)
+        else:
+            # filtered downloads may hold concepts and collections of any scheme
+            schemes = SkosConceptScheme.objects.all()
+        etag, last_modified = scheme_validators(schemes, request.get_full_path())
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            response = super(SkosConceptDL, self).get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified, public=True)
+
+    def cached_scheme(self):
+        """The concept scheme if all its concepts are downloaded, these downloads are served from the export cache"""
+        scheme_id = self.request.GET.get("scheme", "")
+        if not cache_enabled() or set(self.request.GET) - {"format"} != {"scheme"} or not scheme_id.isdigit():
+            return None
+        return SkosConceptScheme.objects.filter(pk=scheme_id).first()
+
     def render_to_response(self, context):
         timestamp = datetime.datetime.fromtimestamp(time.time()).strftime("%Y-%m-%d-%H-%M-%S")
-        response = HttpResponse(content_type="application/xml; charset=utf-8")
         filename = "download_{}".format(timestamp)
-        get_format = self.request.GET.get("format", default="pretty-xml")
-        qs = self.get_queryset()
+        get_format = self.request.GET.get("format", default=DEFAULT_EXPORT_FORMAT)
+        content_type = f"{RDF_CONTENT_TYPES.get(get_format, 'application/xml')}; charset=utf-8"
+        concept_scheme = self.cached_scheme() if get_format in RDF_FORMATS else None
+        if concept_scheme is not None:
+            path = cache_path(concept_scheme, get_format)
+            if os.path.exists(path):
+                response = FileResponse(open(path, "rb"), content_type=content_type)
+            else:
+                response = StreamingHttpResponse(cached_chunks(concept_scheme, get_format), content_type=content_type)
+        elif get_format in STREAMING_SERIALIZERS:
+            response = StreamingHttpResponse(serialize_qs(self.get_queryset(), get_format), content_type=content_type)
+        else:
+            response = HttpResponse(content_type=content_type)
+            g = graph_construct_qs(self.get_queryset())
+            g.serialize(destination=response, format=get_format)
         response["Content-Disposition"] = f'attachment; filename="{filename}.{RDF_FORMATS[get_format]}"'
-        g = graph_construct_qs(qs)
-        g.serialize(destination=response, format=get_format)
         return response
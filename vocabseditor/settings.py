@@ -81,6 +81,7 @@ REST_FRAMEWORK = {
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "guardian.backends.ObjectPermissionBackend",
+    "vocabs.backends.SchemePermissionBackend",
 ]
 
 MIDDLEWARE = [
@@ -119,6 +120,7 @@ WSGI_APPLICATION = "vocabseditor.wsgi.application"
 AUTHENTICATION_BACKENDS = (
     "django.contrib.auth.backends.ModelBackend",  # this is default
     "guardian.backends.ObjectPermissionBackend",
+    "vocabs.backends.SchemePermissionBackend",
 )
 
 # Password validation
@@ -167,6 +169,8 @@ REDMINE_ID = os.environ.get("REDMINE_ID", "12305")
 PROJECT_NAME = os.environ.get("PROJECT_NAME", "vocabseditor")
 VOCABS_DEFAULT_PEFIX = os.environ.get("VOCABS_DEFAULT_PEFIX", "vocabseditor")
 VOCABS_SEPARATOR = os.environ.get("VOCABS_SEPARATOR", "/")
+# derive collection and concept permissions from the concept scheme, see collapse_object_permissions
+VOCABS_SCHEME_PERMISSIONS = bool(os.environ.get("VOCABS_SCHEME_PERMISSIONS"))
 BASE_URL = f"https://{PROJECT_NAME}.acdh.oeaw.ac.at"
 
 VOCABS_SETTINGS = {